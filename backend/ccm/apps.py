@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CcmConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'backend.ccm'
+
+    def ready(self):
+        # Register signal receivers
+        from backend.ccm import signals  # noqa: F401
@@ -0,0 +1,102 @@
+"""
+Drains the email outbox. The django-q schedule created by migration 0003_email_outbox_schedule runs
+send_outbox_emails every minute: due emails are claimed in batches, each batch is sent over one SMTP
+connection, and failed emails are retried with exponential backoff until EMAIL_OUTBOX_MAX_ATTEMPTS.
+"""
+
+import logging
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+
+from django.core.mail import get_connection
+from django.db import transaction
+from django.utils import timezone
+
+from backend.ccm.canvas_api.constants import (
+    EMAIL_OUTBOX_BATCH_SIZE, EMAIL_OUTBOX_LEASE_SECONDS, EMAIL_OUTBOX_MAX_ATTEMPTS,
+    EMAIL_OUTBOX_MAX_BATCHES_PER_RUN, EMAIL_OUTBOX_RETRY_BASE_SECONDS
+)
+from backend.ccm.canvas_api.email_users import build_email
+from backend.ccm.models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+def send_outbox_emails() -> dict[str, int]:
+    """
+    Scheduled task sending due outbox emails, batch by batch, until none are due or
+    EMAIL_OUTBOX_MAX_BATCHES_PER_RUN batches were sent.
+    """
+    counts = {'sent': 0, 'failed': 0}
+    for _ in range(EMAIL_OUTBOX_MAX_BATCHES_PER_RUN):
+        batch = claim_outbox_batch()
+        if not batch:
+            break
+        for status, count in send_outbox_batch(batch).items():
+            counts[status] += count
+    if counts['sent'] or counts['failed']:
+        logger.info(f"Email outbox: sent {counts['sent']}, failed {counts['failed']}")
+    return counts
+
+def claim_outbox_batch() -> list[EmailOutbox]:
+    """
+    Lease up to EMAIL_OUTBOX_BATCH_SIZE due emails by moving their next attempt past the lease, so a concurrent
+    drain skips them. If the worker dies while sending, the emails are due again when the lease expires.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.Status.PENDING, next_attempt_at__lte=now)
+            .order_by('next_attempt_at', 'pk')[:EMAIL_OUTBOX_BATCH_SIZE]
+        )
+        EmailOutbox.objects.filter(pk__in=[email.pk for email in batch]).update(
+            next_attempt_at=now + timedelta(seconds=EMAIL_OUTBOX_LEASE_SECONDS)
+        )
+    return batch
+
+def send_outbox_batch(batch: list[EmailOutbox]) -> dict[str, int]:
+    counts = {'sent': 0, 'failed': 0}
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Failed to open email connection for {len(batch)} outbox emails: {e}")
+        for email in batch:
+            record_outbox_failure(email, e)
+        counts['failed'] = len(batch)
+        return counts
+    try:
+        for email in batch:
+            attachment = (email.attachment_name, bytes(email.attachment_content), email.attachment_mime_type) if email.attachment_name else None
+            message = build_email(email.to_email, email.subject, email.body, attachment, connection)
+            try:
+                try:
+                    message.send()
+                except SMTPServerDisconnected:
+                    connection.close()
+                    connection.open()
+                    message.send()
+            except Exception as e:
+                logger.error(f"Failed to send outbox email {email.pk} to {email.to_email}: {e}")
+                record_outbox_failure(email, e)
+                counts['failed'] += 1
+                continue
+            EmailOutbox.objects.filter(pk=email.pk).update(
+                status=EmailOutbox.Status.SENT, attempts=email.attempts + 1, sent_at=timezone.now(), last_error=''
+            )
+            counts['sent'] += 1
+    finally:
+        connection.close()
+    return counts
+
+def record_outbox_failure(email: EmailOutbox, error: Exception) -> None:
+    attempts = email.attempts + 1
+    if attempts >= EMAIL_OUTBOX_MAX_ATTEMPTS:
+        logger.error(f"Giving up on outbox email {email.pk} to {email.to_email} after {attempts} attempts")
+        status, next_attempt_at = EmailOutbox.Status.FAILED, timezone.now()
+    else:
+        status = EmailOutbox.Status.PENDING
+        next_attempt_at = timezone.now() + timedelta(seconds=EMAIL_OUTBOX_RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+    EmailOutbox.objects.filter(pk=email.pk).update(
+        status=status, attempts=attempts, next_attempt_at=next_attempt_at, last_error=str(error)
+    )
@@ -1,26 +1,40 @@
 import logging
 import time
 import asyncio
-import csv
-import io
 from dataclasses import dataclass
-from typing import List
+from typing import Iterable, List
 from django.test import RequestFactory
 from django.contrib.auth import get_user_model
 from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.urls import reverse
+from django.utils import timezone
+from django_q.tasks import async_task
 from canvasapi import Canvas
 from canvasapi.exceptions import Unauthorized
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
 
-from backend.ccm.canvas_api.email_users import send_email
-from backend.ccm.canvas_api.enroll_users import enroll_user
+from backend.ccm.canvas_api.email_users import queue_email
+from backend.ccm.canvas_api.enroll_users import deduplicate_enrollments
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
+from backend.ccm.canvas_api.login_id_resolver import (
+    LoginIdResolution, enroll_resolving_login_id, load_login_id_resolution, save_login_id_resolution
+)
 from backend.ccm.canvas_api.constants import INSUFFICIENT_SCOPES_ON_ACCESS_TOKEN
 from django.contrib.auth.models import User
 from rest_framework.request import Request
 from asgiref.sync import async_to_sync
 from datetime import timedelta
+from urllib.parse import urlencode, urljoin
 from canvas_oauth.models import CanvasOAuth2Token
-from backend.ccm.canvas_api.constants import MAX_CONCURRENCY
+from backend.ccm.canvas_api.constants import (
+    CANVAS_RATE_LIMIT_MAX_CONCURRENCY, ENROLLMENT_FAILURE_LOG_SAMPLE_SIZE, ENROLLMENT_JOB_CHUNK_SIZE, ENROLLMENT_REPORT_LINK_MIN_BYTES
+)
+from backend.ccm.models import EnrollmentJob, EnrollmentJobRow
+from backend.ccm.background_tasks.enrollment_progress import record_enrollment_result
+from backend.ccm.background_tasks.enrollment_report import EnrollmentReport, enrollment_report_token, iter_report_rows
+from backend.ccm.background_tasks.enrollment_idempotency import release_enrollment_submission
 
 
 logger = logging.getLogger(__name__)
@@ -32,38 +46,156 @@ class EnrollmentUser:
     role: str
     sectionId: int
 
-async def enroll_user_async(canvas_api, section_id, login_id, role):
-      # Wrap the sync function in a coroutine for compatibility
-      return await asyncio.to_thread(enroll_user, canvas_api, section_id, login_id, role)
-
-async def sem_task(semaphore, canvas_api, enrollment_user: EnrollmentUser):
+async def sem_task(semaphore, client: AsyncCanvasClient, enrollment_user: EnrollmentUser, resolution: LoginIdResolution, job_id: int = None):
     async with semaphore:
-        return await enroll_user_async(canvas_api, enrollment_user.sectionId, enrollment_user.loginId.lower(), enrollment_user.role.lower())
+        succeeded = False
+        try:
+            result = await enroll_resolving_login_id(
+                client, resolution, enrollment_user.sectionId, enrollment_user.loginId.lower(), enrollment_user.role.lower()
+            )
+            succeeded = True
+            return result
+        finally:
+            if job_id is not None:
+                await record_enrollment_result(job_id, succeeded)
 
 @async_to_sync()
-async def gather_enrollments(enrollment_users, canvas_api):
-    max_concurrent = MAX_CONCURRENCY
+async def gather_enrollments(enrollment_users, canvas_api, job_id: int = None):
+    """
+    Enroll every user with its own POST sections/:id/enrollments call, concurrently over one HTTP/2 client,
+    by the Canvas user id of login ids cached or looked up for repeated rows, and by sis_login_id otherwise.
+    Canvas SIS imports are not used for large batches: enrollments.csv identifies users by SIS user id and
+    sections by SIS section id, while CCM has login ids and Canvas section ids (sections created in CCM have
+    no SIS id), so mapping them would cost one lookup per user, and imports need the account admin's token.
+    """
+    # The client's rate limiter sets the actual concurrency, the semaphore only caps it
+    max_concurrent = CANVAS_RATE_LIMIT_MAX_CONCURRENCY
     semaphore = asyncio.Semaphore(max_concurrent)
-    tasks = [sem_task(semaphore, canvas_api, user) for user in enrollment_users]
-    return await asyncio.gather(*tasks, return_exceptions=True)
+    # All enrollments share one async client so they reuse the same pooled Canvas connections
+    async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+        resolution = await load_login_id_resolution(client, (user.loginId.lower() for user in enrollment_users))
+        tasks = [sem_task(semaphore, client, user, resolution, job_id) for user in enrollment_users]
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+    await save_login_id_resolution(resolution)
+    return results
+
+def create_enrollment_job(user: User, course_id: int, canvas_callback_url: str, enrollment_params: List[dict], task_name: str = '', submission_key: str = '') -> EnrollmentJob:
+  """
+  Persist an enrollment request as a job with one row per user, split into chunks of ENROLLMENT_JOB_CHUNK_SIZE rows.
+  Duplicate rows are stored as skipped, so they never reach Canvas and are reported in the summary email.
+  """
+  enrollment_params, skipped_params = deduplicate_enrollments(enrollment_params)
+  if skipped_params:
+    logger.info(f"Skipping {len(skipped_params)} duplicate enrollment rows for course {course_id}")
+  with transaction.atomic():
+    job = EnrollmentJob.objects.create(
+      user=user, course_id=course_id, canvas_callback_url=canvas_callback_url, task_name=task_name, submission_key=submission_key
+    )
+    EnrollmentJobRow.objects.bulk_create([
+      EnrollmentJobRow(
+        job=job,
+        chunk=index // ENROLLMENT_JOB_CHUNK_SIZE,
+        section_id=param['sectionId'],
+        login_id=param['loginId'],
+        role=param['role']
+      )
+      for index, param in enumerate(enrollment_params)
+    ] + [
+      EnrollmentJobRow(
+        job=job,
+        chunk=0,
+        section_id=param['sectionId'],
+        login_id=param['loginId'],
+        role=param['role'],
+        status=EnrollmentJobRow.Status.SKIPPED,
+        error=param['error']
+      )
+      for param in skipped_params
+    ])
+  return job
 
 def enroll_um_users(task):
+  """
+  Start an enrollment job: every chunk but the first is queued to run in parallel on other workers, and the first runs here.
+  Tasks queued before jobs were persisted carry the enrollment parameters instead of a job_id, so the job is created from them.
+  """
   logger.debug(f"Enrolling users in section with task data: {task}")
+  job_id = task.get('job_id')
+  if job_id is None:
+    req_user: User = get_user_model().objects.get(pk=task.get('user_id'))
+    job_id = create_enrollment_job(req_user, task.get('course_id'), task.get('canvas_callback_url'), task.get('enrollment_params', [])).id
+
+  chunks = list(
+    EnrollmentJobRow.objects.filter(job_id=job_id, status__in=[EnrollmentJobRow.Status.PENDING, EnrollmentJobRow.Status.RUNNING])
+    .values_list('chunk', flat=True).distinct().order_by('chunk')
+  )
+  logger.info(f"Enrollment job {job_id} has {len(chunks)} unfinished chunks")
+  for chunk in chunks[1:]:
+    async_task(
+      'backend.ccm.background_tasks.enroll_um_users_task.enroll_um_users_chunk', job_id, chunk,
+      task_name=f'enrollment-job-{job_id}-chunk-{chunk}', cluster=settings.Q_ENROLLMENT_CLUSTER
+    )
+  if chunks:
+    enroll_um_users_chunk(job_id, chunks[0])
+  else:
+    finish_enrollment_job(job_id)
+
+def requeue_stalled_enrollment_job(job: EnrollmentJob) -> bool:
+  """
+  Queue an unfinished job again when none of its rows has progressed for longer than the Q_CLUSTER timeout,
+  so its tasks were lost or killed (a chunk task that runs longer is killed by the cluster).
+  Its unfinished rows are put back to pending and the job is started again, keeping its job_id for progress polling.
+  Returns whether the job was requeued.
+  """
+  stale_before = timezone.now() - timedelta(seconds=settings.Q_CLUSTER['timeout'])
+  with transaction.atomic():
+    # Lock the job so concurrent repeats of its request requeue it once
+    EnrollmentJob.objects.select_for_update().filter(pk=job.pk).first()
+    if EnrollmentJobRow.objects.filter(job=job, updated_at__gte=stale_before).exists():
+      return False
+    requeued_rows = EnrollmentJobRow.objects.filter(
+      job=job, status__in=[EnrollmentJobRow.Status.PENDING, EnrollmentJobRow.Status.RUNNING]
+    ).update(status=EnrollmentJobRow.Status.PENDING, updated_at=timezone.now())
+  logger.warning(f"Enrollment job {job.id} made no progress since {stale_before}, requeuing its {requeued_rows} unfinished rows")
+  async_task(
+    'backend.ccm.background_tasks.enroll_um_users_task.enroll_um_users',
+    task={'job_id': job.id}, task_name=f'{job.task_name}-requeued', cluster=settings.Q_ENROLLMENT_CLUSTER
+  )
+  return True
+
+def claim_chunk_rows(job_id: int, chunk: int) -> List[EnrollmentJobRow]:
+  """
+  Mark the unfinished rows of a chunk as running and return them. Rows left running by a worker that died or
+  timed out (older than the Q_CLUSTER timeout) are claimed again, rows running in a live task are not.
+  """
+  stale_before = timezone.now() - timedelta(seconds=settings.Q_CLUSTER['timeout'])
+  with transaction.atomic():
+    rows = list(
+      EnrollmentJobRow.objects.select_for_update()
+      .filter(job_id=job_id, chunk=chunk)
+      .filter(Q(status=EnrollmentJobRow.Status.PENDING) | Q(status=EnrollmentJobRow.Status.RUNNING, updated_at__lt=stale_before))
+      .order_by('pk')
+    )
+    EnrollmentJobRow.objects.filter(pk__in=[row.pk for row in rows]).update(status=EnrollmentJobRow.Status.RUNNING, updated_at=timezone.now())
+  return rows
 
-  enrollment_params: List[EnrollmentUser] = [EnrollmentUser(**item) for item in task.get('enrollment_params', [])]
-  req_user_id: int = task.get('user_id')
-  course_id: int = task.get('course_id')
-  canvas_callback_url: str = task.get('canvas_callback_url')
-  # Get the user model and retrieve the user instance and Canvas Token
-  req_user: User = get_user_model().objects.get(pk=req_user_id)
-  req_user_email: str = req_user.email.lower()  # Ensure email is lowercase for consistency
+def enroll_um_users_chunk(job_id: int, chunk: int):
+  rows = claim_chunk_rows(job_id, chunk)
+  if not rows:
+    logger.info(f"Enrollment job {job_id} chunk {chunk} has no rows left to process")
+    finish_enrollment_job(job_id)
+    return
+
+  job = EnrollmentJob.objects.select_related('user').get(pk=job_id)
+  req_user: User = job.user
   uniqname: str = req_user.username
+  enrollment_params: List[EnrollmentUser] = [EnrollmentUser(loginId=row.login_id, role=row.role, sectionId=row.section_id) for row in rows]
 
   # Create a request factory and build the request since this is a background task request won't have a user session
   factory = RequestFactory()
   request: Request = factory.get('/oauth/oauth-callback')
   request.user = req_user
-  request.build_absolute_uri = lambda path: canvas_callback_url
+  request.build_absolute_uri = lambda path: job.canvas_callback_url
   try:
       # Get the Canvas API instance using the credential manager
       canvas_api: Canvas = course_manager.get_canvasapi_instance(request)
@@ -71,102 +203,134 @@ def enroll_um_users(task):
       logger.error(f"Failed to get Canvas API instance for user {uniqname}: {e}")
       # Create a results list with the same exception for each enrollment param
       results = [e for _ in enrollment_params]
-      handle_enrollment_results(enrollment_params, results, request, uniqname, req_user_email, course_id)
-      return
-
-  loop_start_time = time.perf_counter()
-  logger.info(f"Starting enrollment for {len(enrollment_params)} users")
-  results = gather_enrollments(enrollment_params, canvas_api)
-  loop_elapsed = time.perf_counter() - loop_start_time
+  else:
+      loop_start_time = time.perf_counter()
+      logger.info(f"Starting enrollment for {len(enrollment_params)} users of job {job_id} chunk {chunk}")
+      results = gather_enrollments(enrollment_params, canvas_api, job_id)
+      loop_elapsed = time.perf_counter() - loop_start_time
+      logger.info(f"for adding users to course {job.course_id} to enroll {len(enrollment_params)} users took {timedelta(seconds=loop_elapsed)}")
 
-  handle_enrollment_results(enrollment_params,results,request,uniqname,req_user_email,course_id)
-  logger.info(f"for adding users to course {course_id} to enroll {len(enrollment_params)} users took {timedelta(seconds=loop_elapsed)}")
+  handle_enrollment_results(rows, results, request, uniqname)
+  finish_enrollment_job(job_id)
 
-def handle_enrollment_results(enrollment_params, results, request, uniqname, req_user_email, course_id):
-    failed_enrollments = []
+def handle_enrollment_results(rows: List[EnrollmentJobRow], results, request, uniqname):
     unauthorized_scope_found = False
-        # asyncio gather preserves the order of enrollment_params, so we can match them with results
-    for enroll_user, enrollment in zip(enrollment_params, results):
+    failed_count = 0
+    failed_sample = []
+    # asyncio gather preserves the order of enrollment_params, so we can match them with results
+    for row, enrollment in zip(rows, results):
         if isinstance(enrollment, Exception):
-            failed_enrollments.append({
-                'sectionId': enroll_user.sectionId,
-                'loginId': enroll_user.loginId,
-                'role': enroll_user.role,
-                'error': str(enrollment)
-            })
+            row.status = EnrollmentJobRow.Status.FAILED
+            row.error = str(enrollment)
+            failed_count += 1
+            if len(failed_sample) < ENROLLMENT_FAILURE_LOG_SAMPLE_SIZE:
+                failed_sample.append(f"{row.login_id} (role: {row.role}, section: {row.section_id}) - {row.error}")
             # Check for Unauthorized with insufficient scopes
             if (
                 isinstance(enrollment, Unauthorized) and
                 INSUFFICIENT_SCOPES_ON_ACCESS_TOKEN in str(enrollment).lower()
             ):
                 unauthorized_scope_found = True
+        else:
+            row.status = EnrollmentJobRow.Status.SUCCEEDED
+            row.error = ''
+        row.updated_at = timezone.now()
+    EnrollmentJobRow.objects.bulk_update(rows, ['status', 'error', 'updated_at'])
 
-    # Prepare failed list for future user notification (e.g., email)
-    if failed_enrollments:
-        failed_list = [
-            f"{fail['loginId']} (role: {fail['role']}, section: {fail['sectionId']}) - {fail['error']}"
-            for fail in failed_enrollments
-        ]
-        logger.error("Failed enrollments: " + "; ".join(failed_list))
+    if failed_count:
+        # Every failure is in the job's rows and the summary report, the log only gets a sample
+        logger.error(
+            f"{failed_count} of {len(rows)} enrollments failed"
+            + (f", first {len(failed_sample)}" if failed_count > len(failed_sample) else "")
+            + ": " + "; ".join(failed_sample)
+        )
 
     if unauthorized_scope_found:
         # This might happen when new scopes are added after the token was issued, but not going to be an issue with Prod release 
         logger.warning(f"Deleting CanvasOAuth2Token for user {uniqname} due to insufficient scopes on access token.")
         CanvasOAuth2Token.objects.filter(user=request.user).delete()
-    
-    email_enrollment_summary(
-        req_user_email=req_user_email,
-        course_id=course_id,
-        failed_enrollments=failed_enrollments,
-        total_enrollment_count=len(enrollment_params)
+
+def finish_enrollment_job(job_id: int):
+    """
+    Once no row of the job is pending or running, mark it completed and queue the summary email.
+    The completed_at update only succeeds for one of the chunk tasks finishing concurrently, so the email is queued once,
+    in the same transaction as the update.
+    """
+    unfinished = EnrollmentJobRow.objects.filter(
+        job_id=job_id, status__in=[EnrollmentJobRow.Status.PENDING, EnrollmentJobRow.Status.RUNNING]
     )
+    if unfinished.exists():
+        return
+    with transaction.atomic():
+        if not EnrollmentJob.objects.filter(pk=job_id, completed_at__isnull=True).update(completed_at=timezone.now()):
+            return
+
+        job = EnrollmentJob.objects.select_related('user').get(pk=job_id)
+        email_enrollment_summary(
+            req_user_email=job.user.email.lower(),  # Ensure email is lowercase for consistency
+            course_id=job.course_id,
+            failed_enrollments=iter_report_rows(job, EnrollmentJobRow.Status.FAILED),
+            total_enrollment_count=job.rows.exclude(status=EnrollmentJobRow.Status.SKIPPED).count(),
+            skipped_enrollments=iter_report_rows(job, EnrollmentJobRow.Status.SKIPPED),
+            dedup_key=f'enrollment-job-{job.id}-summary',
+            report_url=enrollment_report_url(job)
+        )
+    release_enrollment_submission(job)
 
-def email_enrollment_summary(req_user_email: str, course_id: int, failed_enrollments: List[str], total_enrollment_count: int) -> None:
+def enrollment_report_url(job: EnrollmentJob) -> str:
+    """ Absolute URL of the job's report download, on the host the job was requested from, signed to work without a session. """
+    path = reverse('enrollmentJobReport', kwargs={'course_id': job.course_id, 'job_id': job.id})
+    return f"{urljoin(job.canvas_callback_url, path)}?{urlencode({'token': enrollment_report_token(job)})}"
+
+def email_enrollment_summary(req_user_email: str, course_id: int, failed_enrollments: Iterable[dict], total_enrollment_count: int, skipped_enrollments: Iterable[dict] = None, dedup_key: str = None, report_url: str = None) -> None:
     """
-    Compose and send enrollment result email, with CSV attachment if there are failures.
+    Compose the enrollment result email and queue it in the email outbox. If there are failures or skipped duplicate rows,
+    the email attaches a CSV of them, or links to report_url when given and the CSV is ENROLLMENT_REPORT_LINK_MIN_BYTES or more.
+    The rows are streamed into the report, so they can be a generator.
     """
-    failed = len(failed_enrollments)
-    succeeded = total_enrollment_count - failed
     course_canvas_link = f'https://{settings.CANVAS_OAUTH_CANVAS_DOMAIN}/courses/{course_id}'
+    with EnrollmentReport() as report:
+        failed = skipped = 0
+        for item in failed_enrollments:
+            failed += 1
+            report.append(item)
+        for item in skipped_enrollments or []:
+            skipped += 1
+            report.append(item)
+        succeeded = total_enrollment_count - failed
+        if report.size < ENROLLMENT_REPORT_LINK_MIN_BYTES:
+            report_url = None
 
-    email_subject = f"For course {course_id}, {succeeded}/{total_enrollment_count} enrollments finished successfully" + (f" ({failed} failed)" if failed > 0 else "")
+        email_subject = (
+            f"For course {course_id}, {succeeded}/{total_enrollment_count} enrollments finished successfully"
+            + (f" ({failed} failed)" if failed > 0 else "")
+            + (f" ({skipped} duplicate rows skipped)" if skipped else "")
+        )
 
-    # Use HTML for the body, with course_canvas_link as a hyperlink
-    success_body = (
-        f"For Course <a href='{course_canvas_link}'>{course_id}</a> enrolling all users is success"
-    )
-    failure_body = (
-        f"For Course <a href='{course_canvas_link}'>{course_id}</a> enrolling users encountered failures. See attachment for error list."
-    )
-    body = success_body if succeeded == total_enrollment_count else failure_body
+        # Use HTML for the body, with course_canvas_link as a hyperlink
+        see_report = f"<a href='{report_url}'>Download the report</a>" if report_url else "See attachment"
+        success_body = (
+            f"For Course <a href='{course_canvas_link}'>{course_id}</a> enrolling all users is success"
+        )
+        failure_body = (
+            f"For Course <a href='{course_canvas_link}'>{course_id}</a> enrolling users encountered failures. {see_report} for error list."
+        )
+        body = success_body if succeeded == total_enrollment_count else failure_body
+        if skipped:
+            body += f"<br>{skipped} duplicate rows of the request were skipped. {see_report} for the skipped rows."
 
-    attachment = None
-    if failed_enrollments:
-        try:
-            output = io.StringIO()
-            fieldnames = ['sectionId', 'LoginId', 'role', 'ReasonForFailure']
-            writer = csv.DictWriter(output, fieldnames=fieldnames)
-            writer.writeheader()
-            for item in failed_enrollments:
-                row = {
-                    'sectionId': item.get('sectionId', ''),
-                    'LoginId': item.get('loginId', ''),
-                    'role': item.get('role', ''),
-                    'ReasonForFailure': item.get('error', '')
-                }
-                writer.writerow(row)
-            csv_content: str = output.getvalue()
-            filename: str = f'course_{course_id}_failures.csv'
-            mime_type: str = 'text/csv'
-            attachment: tuple = (filename, csv_content, mime_type)
-        except (ValueError, Exception) as e:
-            logger.error(f"Failed to create CSV attachment for course {course_id}: {e}")
-
-    logger.info(f"Sending enrollment summary email to {req_user_email}: {email_subject}")
-    send_email(
+        attachment = None
+        if report.row_count and not report_url:
+            try:
+                attachment = report.attachment(f'course_{course_id}_failures.csv')
+            except (ValueError, Exception) as e:
+                logger.error(f"Failed to create CSV attachment for course {course_id}: {e}")
+
+    logger.info(f"Queueing enrollment summary email to {req_user_email}: {email_subject}")
+    queue_email(
         to_email=req_user_email,
         subject=email_subject,
         body=body,
         attachment=attachment,
+        dedup_key=dedup_key,
     )
-    
\ No newline at end of file
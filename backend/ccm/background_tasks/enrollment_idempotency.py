@@ -0,0 +1,64 @@
+"""
+Idempotent submission of enrollment jobs. A request is keyed by a hash of the requesting user, the course and
+its normalized enrollment rows, and the key is held in Redis while the job runs, so a double click or a
+browser retry of the same upload gets the running job back instead of enqueuing a second one.
+When the cache is unavailable every submission creates a job.
+"""
+
+import hashlib
+import json
+import logging
+from typing import List
+
+from django.core.cache import cache
+
+from backend.ccm.canvas_api.constants import ENROLLMENT_JOB_PROGRESS_TIMEOUT_SECONDS
+from backend.ccm.canvas_api.enroll_users import process_login_id
+from backend.ccm.models import EnrollmentJob
+
+logger = logging.getLogger(__name__)
+
+def enrollment_submission_key(user_id: int, course_id: int, enrollment_params: List[dict]) -> str:
+    # Row order, letter case and repeated rows do not make a different submission
+    rows = sorted({
+        (int(param['sectionId']), process_login_id(param['loginId'].lower()), param['role'].lower())
+        for param in enrollment_params
+    })
+    payload = json.dumps([user_id, int(course_id), rows], separators=(',', ':'))
+    return f"ccm:enrollment_submission:{hashlib.sha256(payload.encode()).hexdigest()}"
+
+def get_running_enrollment_job(submission_key: str) -> EnrollmentJob | None:
+    try:
+        job_id = cache.get(submission_key)
+    except Exception as e:
+        logger.warning(f"Enrollment submission key unavailable, not checking for a running job: {e}")
+        return None
+    if job_id is None:
+        return None
+    return EnrollmentJob.objects.filter(pk=job_id, completed_at__isnull=True).first()
+
+def claim_enrollment_submission(submission_key: str, job: EnrollmentJob) -> EnrollmentJob:
+    """
+    Hold submission_key for job, returning job, or the running job that already holds the key
+    when an identical request got there first.
+    """
+    try:
+        if cache.add(submission_key, job.id, ENROLLMENT_JOB_PROGRESS_TIMEOUT_SECONDS):
+            return job
+        running_job = get_running_enrollment_job(submission_key)
+        if running_job is not None and running_job.pk != job.pk:
+            return running_job
+        # The key outlived its job, which has completed or been deleted
+        cache.set(submission_key, job.id, ENROLLMENT_JOB_PROGRESS_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.warning(f"Enrollment submission key unavailable, job {job.id} is not idempotent: {e}")
+    return job
+
+def release_enrollment_submission(job: EnrollmentJob) -> None:
+    if not job.submission_key:
+        return
+    try:
+        if cache.get(job.submission_key) == job.id:
+            cache.delete(job.submission_key)
+    except Exception as e:
+        logger.warning(f"Could not release the submission key of enrollment job {job.id}: {e}")
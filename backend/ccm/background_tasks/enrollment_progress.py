@@ -0,0 +1,56 @@
+"""
+Progress of enrollment jobs. Workers count every finished enrollment in Redis as it completes, while
+the EnrollmentJobRow statuses are only written when a chunk finishes, so a running job reports the
+larger of the two and a completed job reports its rows.
+"""
+
+import logging
+
+from django.core.cache import cache
+from django.db.models import Count
+
+from backend.ccm.canvas_api.constants import ENROLLMENT_JOB_PROGRESS_TIMEOUT_SECONDS
+from backend.ccm.models import EnrollmentJob, EnrollmentJobRow
+
+logger = logging.getLogger(__name__)
+
+def _counter_key(job_id: int, status: str) -> str:
+    return f"ccm:enrollment_job:{job_id}:{status}"
+
+async def record_enrollment_result(job_id: int, succeeded: bool) -> None:
+    status = EnrollmentJobRow.Status.SUCCEEDED if succeeded else EnrollmentJobRow.Status.FAILED
+    key = _counter_key(job_id, status)
+    try:
+        if not await cache.aadd(key, 1, ENROLLMENT_JOB_PROGRESS_TIMEOUT_SECONDS):
+            await cache.aincr(key)
+    except Exception as e:
+        logger.warning(f"Enrollment progress counter update failed for {key}: {e}")
+
+def get_enrollment_progress(job: EnrollmentJob) -> dict:
+    row_counts = dict(job.rows.values_list('status').annotate(count=Count('pk')).order_by())
+    skipped = row_counts.pop(EnrollmentJobRow.Status.SKIPPED, 0)
+    total = sum(row_counts.values())
+    succeeded = row_counts.get(EnrollmentJobRow.Status.SUCCEEDED, 0)
+    failed = row_counts.get(EnrollmentJobRow.Status.FAILED, 0)
+
+    if job.completed_at is None:
+        keys = {status: _counter_key(job.id, status) for status in (EnrollmentJobRow.Status.SUCCEEDED, EnrollmentJobRow.Status.FAILED)}
+        try:
+            counters = cache.get_many(keys.values())
+        except Exception as e:
+            logger.warning(f"Enrollment progress counters unavailable for job {job.id}: {e}")
+            counters = {}
+        # Rows of a resumed chunk are counted again, so the hot counters are capped at the job size
+        succeeded = min(total, max(succeeded, counters.get(keys[EnrollmentJobRow.Status.SUCCEEDED], 0)))
+        failed = min(total - succeeded, max(failed, counters.get(keys[EnrollmentJobRow.Status.FAILED], 0)))
+
+    return {
+        'job_id': job.id,
+        'course_id': job.course_id,
+        'completed': job.completed_at is not None,
+        'total': total,
+        'processed': succeeded + failed,
+        'succeeded': succeeded,
+        'failed': failed,
+        'skipped': skipped,
+    }
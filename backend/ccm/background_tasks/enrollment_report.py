@@ -0,0 +1,112 @@
+"""
+CSV report of the failed and skipped rows of an enrollment job, written row by row as they are read.
+The report is kept in memory up to ENROLLMENT_REPORT_SPOOL_MAX_BYTES and spilled to a temporary file past
+that, and reports larger than ENROLLMENT_REPORT_COMPRESS_MIN_BYTES are attached gzip compressed.
+The report of a job is also downloadable: it is generated on the first download and, once the job
+has completed, stored compressed on the job for the next ones. Download links sent by email carry a short-lived
+token signed for the job and its owner, since a link opened from a mail client may have no session.
+"""
+
+import csv
+import gzip
+import io
+import tempfile
+from typing import Iterator
+
+from django.core import signing
+
+from backend.ccm.canvas_api.constants import (
+    ENROLLMENT_JOB_CHUNK_SIZE, ENROLLMENT_REPORT_COMPRESS_MIN_BYTES, ENROLLMENT_REPORT_LINK_MAX_AGE_SECONDS,
+    ENROLLMENT_REPORT_SPOOL_MAX_BYTES
+)
+from backend.ccm.models import EnrollmentJob, EnrollmentJobRow
+
+class EnrollmentReport:
+    fieldnames = ['sectionId', 'LoginId', 'role', 'ReasonForFailure']
+
+    def __init__(self):
+        self._file = tempfile.SpooledTemporaryFile(max_size=ENROLLMENT_REPORT_SPOOL_MAX_BYTES, mode='w+', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, fieldnames=self.fieldnames)
+        self._writer.writeheader()
+        self.row_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        self._file.close()
+
+    def append(self, item: dict) -> None:
+        self._writer.writerow({
+            'sectionId': item.get('sectionId', ''),
+            'LoginId': item.get('loginId', ''),
+            'role': item.get('role', ''),
+            'ReasonForFailure': item.get('error', '')
+        })
+        self.row_count += 1
+
+    @property
+    def size(self) -> int:
+        """ Bytes of CSV written so far. """
+        return self._file.tell()
+
+    def attachment(self, filename: str) -> tuple:
+        """ The report as an email attachment (filename, content, mime_type), compressed when it is large. """
+        size = self.size
+        if size < ENROLLMENT_REPORT_COMPRESS_MIN_BYTES:
+            self._file.seek(0)
+            content = self._file.read()
+            self._file.seek(size)
+            return (filename, content, 'text/csv')
+        return (f'{filename}.gz', self.compressed(filename), 'application/gzip')
+
+    def compressed(self, filename: str = '') -> bytes:
+        """ The report compressed with gzip. """
+        size = self._file.tell()
+        self._file.seek(0)
+        compressed = io.BytesIO()
+        with gzip.GzipFile(filename=filename, mode='wb', fileobj=compressed) as gzip_file:
+            for chunk in iter(lambda: self._file.read(64 * 1024), ''):
+                gzip_file.write(chunk.encode('utf-8'))
+        self._file.seek(size)
+        return compressed.getvalue()
+
+REPORT_TOKEN_SALT = 'backend.ccm.enrollment_report'
+
+def enrollment_report_token(job: EnrollmentJob) -> str:
+    """ Signed token authenticating the job's owner for the download of its report, for ENROLLMENT_REPORT_LINK_MAX_AGE_SECONDS. """
+    return signing.dumps([job.id, job.user_id], salt=REPORT_TOKEN_SALT)
+
+def enrollment_report_token_grant(token: str) -> tuple[int, int] | None:
+    """ The (job id, user id) a report token was signed for, or None when the token is invalid or expired. """
+    try:
+        job_id, user_id = signing.loads(token, salt=REPORT_TOKEN_SALT, max_age=ENROLLMENT_REPORT_LINK_MAX_AGE_SECONDS)
+        return int(job_id), int(user_id)
+    except (signing.BadSignature, TypeError, ValueError):
+        return None
+
+def iter_report_rows(job: EnrollmentJob, status: str) -> Iterator[dict]:
+    """ Stream the rows of job with status from the database, without loading them all. """
+    rows = job.rows.filter(status=status).order_by('pk').values_list('section_id', 'login_id', 'role', 'error')
+    for section_id, login_id, role, error in rows.iterator(chunk_size=ENROLLMENT_JOB_CHUNK_SIZE):
+        yield {'sectionId': section_id, 'loginId': login_id, 'role': role, 'error': error}
+
+def get_enrollment_job_report(job: EnrollmentJob) -> bytes:
+    """
+    The gzip compressed CSV report of the failed and skipped rows of job. The report of a completed job
+    is generated once and stored on the job, the report of a running job reflects its rows so far.
+    """
+    if job.report is not None:
+        return bytes(job.report)
+    filename = f'course_{job.course_id}_enrollment_report.csv'
+    with EnrollmentReport() as report:
+        for status in (EnrollmentJobRow.Status.FAILED, EnrollmentJobRow.Status.SKIPPED):
+            for item in iter_report_rows(job, status):
+                report.append(item)
+        content = report.compressed(filename)
+    if job.completed_at is not None:
+        EnrollmentJob.objects.filter(pk=job.pk).update(report=content)
+    return content
@@ -2,14 +2,13 @@ import asyncio
 import logging
 
 from asgiref.sync import async_to_sync
-from django.core.mail import get_connection
 from django.conf import settings
 
-from backend.ccm.canvas_api.email_users import send_email
+from backend.ccm.canvas_api.email_users import send_email_batch
 from backend.ccm.utils import timeit
 
 logger = logging.getLogger(__name__)
-from backend.ccm.canvas_api.constants import MAX_CONCURRENCY
+from backend.ccm.canvas_api.constants import EMAIL_BULK_MAX_CONNECTIONS
 
 external_user_email_subject: str = "Guest invitation for University of Michigan Invited Canvas Guest Login"
 guest_account_creation_link: str = settings.GUEST_ACCOUNT_CREATION_LINK
@@ -18,22 +17,25 @@ guest_account_creation_link: str = settings.GUEST_ACCOUNT_CREATION_LINK
 def sending_emails(task_params: list[str]):
     """
     Background task starting point to send email to non-UMich users.
+    Returns the sent and failed recipients, which django-q records as the task result.
     """
     logger.info(f"Sending email to {len(task_params)} non-UMich users.: {task_params}")
-    gather_email_send(task_params)
+    failures = gather_email_send(task_params) or {}
+    sent = [email_id for email_id in task_params if email_id not in failures]
+    logger.info(f"Sent {len(sent)} of {len(task_params)} invitation emails, failed: {failures}")
+    return {'sent': sent, 'failed': failures}
 
 @async_to_sync()
-async def gather_email_send(email_ids):
-    connection = get_connection()
-    logger.info(f"Opened email connection with id: {id(connection)}")
-    tasks = [sem_email_task(email_id, connection) for email_id in email_ids]
-    return await asyncio.gather(*tasks, return_exceptions=True)
-
-
-async def sem_email_task(email_id, connection):
-    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
-    async with semaphore:
-        return await asyncio.to_thread(send_email, email_id, external_user_email_subject, email_body(), None, connection)
+async def gather_email_send(email_ids) -> dict[str, str]:
+    """
+    Split the recipients into at most EMAIL_BULK_MAX_CONNECTIONS batches, each sent sequentially over its own SMTP connection.
+    """
+    batch_count = min(EMAIL_BULK_MAX_CONNECTIONS, len(email_ids))
+    batches = [email_ids[index::batch_count] for index in range(batch_count)]
+    results = await asyncio.gather(*(
+        asyncio.to_thread(send_email_batch, batch, external_user_email_subject, email_body()) for batch in batches
+    ))
+    return {email_id: error for failures in results for email_id, error in failures.items()}
 
 def email_body() -> str:
   """
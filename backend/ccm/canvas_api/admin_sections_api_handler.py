@@ -1,6 +1,7 @@
-import asyncio, time
+import asyncio, json, threading, time
 from http import HTTPStatus
 import logging
+from typing import AsyncIterator
 from rest_framework import authentication, permissions
 from rest_framework.views import APIView
 from rest_framework_tracking.mixins import LoggingMixin
@@ -9,20 +10,46 @@ from rest_framework.request import Request
 from asgiref.sync import async_to_sync
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
-from itertools import islice
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
 from datetime import timedelta
 
 from canvasapi.exceptions import CanvasException
 from canvasapi.account import Account
-from canvasapi.course import Course
+from canvasapi import Canvas
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
-from backend.ccm.canvas_api.constants import MAX_CONCURRENCY, MAX_SEARCH_COURSES, CANVAS_ROOT_ACCOUNT_ID
-from backend.ccm.canvas_api.exceptions import CanvasErrorHandler, HTTPAPIError
+from backend.ccm.canvas_api.section_cache import get_course_section_rows
+from backend.ccm.canvas_api.constants import ADMIN_ACCOUNTS_CACHE_TIMEOUT_SECONDS, CANVAS_RATE_LIMIT_MAX_CONCURRENCY, MAX_CONCURRENCY, MAX_SEARCH_COURSES, CANVAS_ROOT_ACCOUNT_ID
+from backend.ccm.canvas_api.exceptions import CanvasAccessTokenException, CanvasErrorHandler, HTTPAPIError
 from backend.ccm.canvas_api.canvasapi_serializer import AdminSectionsQuerySerializer, CanvasObjectROSerializer
 from backend.ccm.utils import timeit
 
 logger = logging.getLogger(__name__)
 
+class CourseSearchBudget:
+    """
+    Course count shared by the concurrent account fetches of one admin search. Once the combined
+    total reaches the limit the budget is exhausted, and every account fetch stops paginating.
+    """
+    def __init__(self, limit: int = MAX_SEARCH_COURSES):
+        self.limit = limit
+        self.count = 0
+        self._lock = threading.Lock()
+        self._exhausted = threading.Event()
+
+    @property
+    def exhausted(self) -> bool:
+        return self._exhausted.is_set()
+
+    def take(self) -> bool:
+        """ Count one more course, returning False once the combined total has reached the limit. """
+        with self._lock:
+            self.count += 1
+            if self.count >= self.limit:
+                self._exhausted.set()
+        return not self.exhausted
+
 class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
     """
     API handler for "merge-able" sections data for users with admin access
@@ -65,6 +92,20 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
                 location=OpenApiParameter.QUERY,
                 required=False,
                 description="Course name to filter courses. Provide either this or instructor_name."
+            ),
+            OpenApiParameter(
+                name="refresh_accounts",
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Re-read the user's accessible accounts from Canvas instead of the cached account tree."
+            ),
+            OpenApiParameter(
+                name="stream",
+                type=OpenApiTypes.BOOL,
+                location=OpenApiParameter.QUERY,
+                required=False,
+                description="Stream the courses as newline-delimited JSON (application/x-ndjson), one line per course as soon as its sections are fetched. A course whose sections could not be fetched is sent as an error line ({statusCode, errors})."
             )
         ],
     )
@@ -81,6 +122,8 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
         term_id = validated_data.get('term_id')
         instructor_name = validated_data.get('instructor_name')
         course_name = validated_data.get('course_name')
+        refresh_accounts = validated_data.get('refresh_accounts')
+        stream = validated_data.get('stream')
         
         # Prepare query parameters for course search
         coursesQueryParams = {
@@ -98,15 +141,14 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
         canvas_api = self.credential_manager.get_canvasapi_instance(request)
         try:
             # 1. Get all accessible accounts
-            accessible_account_ids, account_instance_map = self._get_accessible_accounts(canvas_api, request.user.username, course_name, instructor_name)
+            accessible_account_ids, account_instance_map = self._get_accessible_accounts(canvas_api, request.user.username, course_name, instructor_name, refresh_accounts)
             if not accessible_account_ids:
                 logger.info(f"No accessible accounts found for admin user {request.user.username} with id {request.user.id}")
                 return Response([], status=HTTPStatus.OK) # Return empty list if no accounts are accessible
             
             #2. Get courses by account, by search parameters and term_id
-            course_instance_map = {}
             start_time_course: float = time.perf_counter()
-            courses_success, courses_response = self._get_courses(coursesQueryParams, course_instance_map, accessible_account_ids, account_instance_map)
+            courses_success, courses_response = self._get_courses(coursesQueryParams, accessible_account_ids, account_instance_map)
             logger.info(f"getting courses from all accounts: {accessible_account_ids} took {timedelta(seconds=(time.perf_counter() - start_time_course))} seconds")
             
             if not courses_success:
@@ -119,8 +161,14 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
                 return Response(self.canvas_error.to_dict(), status=self.canvas_error.to_dict().get('statusCode'))
             
             #3. Attach sections to course results
+            if stream:
+                # The async iterator is consumed by the ASGI handler, so no worker thread waits on the section fetches
+                return StreamingHttpResponse(
+                    self._stream_courses_with_sections(courses_response, canvas_api),
+                    content_type='application/x-ndjson'
+                )
             start_time_sections: float = time.perf_counter()
-            sections_success, sections_response = self._attach_sections_to_courses(courses_response, course_instance_map)
+            sections_success, sections_response = self._attach_sections_to_courses(courses_response, canvas_api)
             logger.info(f"getting sections to courses {len(courses_response)} took {timedelta(seconds=(time.perf_counter() - start_time_sections))} seconds")
             
             if not sections_success:
@@ -137,7 +185,18 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
         return str(coursesQueryParams.get('by_teachers') or coursesQueryParams.get('search_term') or 'No input search term provided')
 
     @timeit
-    def _get_accessible_accounts(self, canvas_api, username, course_name, instructor_name) -> tuple[list[dict], dict[int, Account]]:
+    def _get_accessible_accounts(self, canvas_api, username, course_name, instructor_name, refresh_accounts=False) -> tuple[list[dict], dict[int, Account]]:
+        # Use the user's cached accessible account ids unless a refresh was requested
+        cache_key = self._accounts_cache_key(username)
+        if not refresh_accounts:
+            cached_account_ids = self._get_cached_account_ids(cache_key)
+            if cached_account_ids is not None:
+                logger.info(f"Using cached accessible account IDs for user {username}: {cached_account_ids}")
+                # Account objects with just the ID avoid re-fetching them, only get_courses() is called on them
+                return cached_account_ids, {
+                    account_id: Account(canvas_api._Canvas__requester, {'id': account_id}) for account_id in cached_account_ids
+                }
+
         # Retrieve all user accounts, filter to root accounts and subaccounts of unlisted accounts
         logger.info(f"Retrieving accessible accounts for user {username}")
         try:
@@ -153,24 +212,49 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
             # If the canonical root account id 1 is accessible, prefer it and ignore others
             if CANVAS_ROOT_ACCOUNT_ID in accessible_account_ids:
                 logger.info(f"Root account id {CANVAS_ROOT_ACCOUNT_ID} is accessible; restricting search to account {CANVAS_ROOT_ACCOUNT_ID} only")
-                return [CANVAS_ROOT_ACCOUNT_ID], account_instance_map
-            return accessible_account_ids, account_instance_map
+                accessible_account_ids = [CANVAS_ROOT_ACCOUNT_ID]
         except (CanvasException, Exception) as e:
             failed_input = f"username {username}, course_name {course_name}, instructor_name {instructor_name}"
             raise HTTPAPIError(failed_input, e)
+
+        self._cache_account_ids(cache_key, accessible_account_ids)
+        return accessible_account_ids, account_instance_map
+
+    @staticmethod
+    def _accounts_cache_key(username: str) -> str:
+        return f"ccm:admin_accounts:{username}"
+
+    def _get_cached_account_ids(self, cache_key: str) -> list[int] | None:
+        try:
+            return cache.get(cache_key)
+        except Exception as e:
+            logger.warning(f"Account cache read failed for {cache_key}: {e}")
+            return None
+
+    def _cache_account_ids(self, cache_key: str, account_ids: list[int]) -> None:
+        if not account_ids:
+            # An admin grant may arrive right after this crawl, so "no accounts" is looked up again next search
+            return
+        try:
+            cache.set(cache_key, account_ids, ADMIN_ACCOUNTS_CACHE_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Account cache write failed for {cache_key}: {e}")
         
     @async_to_sync
     async def _get_courses(
             self, 
             coursesQueryParams: dict,
-            course_instance_map: dict[int, Course],
             accessible_account_ids: list[int], 
             account_instance_map: dict[int, Account]
         ) -> tuple[bool, list[dict] | list[HTTPAPIError]]:
-        """ Fetch courses from all accessible accounts based on coursesQueryParams, guarded by a semaphore for concurrency control."""
+        """
+        Fetch courses from all accessible accounts based on coursesQueryParams, guarded by a semaphore for concurrency control.
+        All accounts draw from one CourseSearchBudget, so the search stops as soon as the combined total reaches MAX_SEARCH_COURSES.
+        """
         max_concurrent = MAX_CONCURRENCY 
         semaphore = asyncio.Semaphore(max_concurrent)
         errors = []
+        budget = CourseSearchBudget()
 
         filtered_courses_data = []
         tasks = [self._run_with_semaphore(
@@ -178,9 +262,9 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
             errors,
             self._get_courses_by_account_sync,
             filtered_courses_data,
-            course_instance_map,
             coursesQueryParams,
-            account_instance_map[account_id]
+            account_instance_map[account_id],
+            budget
         ) for account_id in accessible_account_ids]
         await asyncio.gather(*tasks, return_exceptions=True)
 
@@ -207,22 +291,30 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
     def _get_courses_by_account_sync(
             self, 
             filtered_courses_data: list, 
-            course_instance_map: dict[int, Course],
             coursesQueryParams: dict, 
-            account: Account):
-        """ Synchronous helper to fetch and append courses from a given account. """
+            account: Account,
+            budget: CourseSearchBudget):
+        """ Synchronous helper to fetch and append courses from a given account, drawing each course from the shared budget. """
         try:
             # set the local id you requested
             start_time: float = time.perf_counter()
+            if budget.exhausted:
+                logger.debug(f"Skipping courses for account: {account.id}, the course search limit was already reached")
+                return
             logger.debug(f"Retrieving courses for account: {account.id} at {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime())}")
-            account_courses = list(islice(account.get_courses(**coursesQueryParams), MAX_SEARCH_COURSES))
+            account_courses = []
+            # Pages are requested lazily, so leaving the loop stops the pagination of this account
+            for course in account.get_courses(**coursesQueryParams):
+                if budget.exhausted:
+                    # Another account crossed the limit and reports the error
+                    logger.debug(f"Stopped retrieving courses for account: {account.id}, the course search limit was reached")
+                    return
+                account_courses.append(course)
+                # Combined number of courses cannot exceed maxiumum
+                if not budget.take():
+                    raise Exception(self.COURSE_LIMIT_ERROR_MESSAGE)
             logger.debug(f"Retrieved courses {len(account_courses)} courses from account id {account.id}")
 
-            # Number of courses cannot exceed maxiumum
-            if len(account_courses) >= MAX_SEARCH_COURSES:
-                raise Exception(self.COURSE_LIMIT_ERROR_MESSAGE)
-
-            course_instance_map.update({course.id: course for course in account_courses})
             serializer = CanvasObjectROSerializer(account_courses, allowed_fields=self.courses_allowed_fields, many=True)
             filtered_courses_data.extend(serializer.data)
             logger.info(f"getting courses from account: {account.id} took {timedelta(seconds=(time.perf_counter() - start_time))} seconds")
@@ -233,33 +325,75 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
     async def _attach_sections_to_courses(
             self, 
             courses_data:list[dict], 
-            course_instance_map:dict[int, Course]
+            canvas_api: Canvas
         ) -> tuple[bool, list[dict] | list[HTTPAPIError]]:
-        max_concurrent = MAX_CONCURRENCY 
+        max_concurrent = CANVAS_RATE_LIMIT_MAX_CONCURRENCY
         semaphore = asyncio.Semaphore(max_concurrent)
         errors = []
 
-        tasks = [self._run_with_semaphore(
-            semaphore,
-            errors,
-            self._attach_section_sync,
-            course,
-            course_instance_map.get(course.get('id'))
-        ) for course in courses_data]
-        await asyncio.gather(*tasks, return_exceptions=True)
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            tasks = [self._run_with_semaphore(
+                semaphore,
+                errors,
+                self._attach_section,
+                client,
+                course
+            ) for course in courses_data]
+            await asyncio.gather(*tasks, return_exceptions=True)
 
         success = len(errors) == 0
         return success, courses_data if success else errors
         
-    def _attach_section_sync(
+    async def _stream_courses_with_sections(
+            self,
+            courses_data: list[dict],
+            canvas_api: Canvas
+        ) -> AsyncIterator[str]:
+        """
+        Yield each course with its sections as one NDJSON line in the order the section fetches complete.
+        A failed course yields a CanvasErrorHandler error line instead, and the remaining courses keep streaming.
+        """
+        semaphore = asyncio.Semaphore(CANVAS_RATE_LIMIT_MAX_CONCURRENCY)
+        start_time: float = time.perf_counter()
+
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            async def attach(course: dict) -> dict:
+                async with semaphore:
+                    await self._attach_section(client, course)
+                return course
+
+            tasks = [asyncio.ensure_future(attach(course)) for course in courses_data]
+            try:
+                for next_done in asyncio.as_completed(tasks):
+                    try:
+                        line = await next_done
+                    except HTTPAPIError as e:
+                        line = self._stream_error_line(e)
+                    yield json.dumps(line) + '\n'
+            finally:
+                # The client disconnected or the stream failed, stop fetching sections nobody will read
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"streaming sections of {len(courses_data)} courses took {timedelta(seconds=(time.perf_counter() - start_time))} seconds")
+
+    @staticmethod
+    def _stream_error_line(error: HTTPAPIError) -> dict:
+        """ Error line for a course in the stream, the response status has already been sent so it is only reported in the body. """
+        try:
+            error_handler = CanvasErrorHandler()
+            error_handler.handle_canvas_api_exceptions(error)
+            return error_handler.to_dict()
+        except CanvasAccessTokenException as token_error:
+            return token_error.to_dict()
+
+    async def _attach_section(
             self, 
-            course: dict, 
-            course_instance: Course):
-        """ Synchronous helper to fetch and attach sections to a course. """
+            client: AsyncCanvasClient, 
+            course: dict):
+        """ Attach the section rows of a course, projected onto sections_allowed_fields, from the section cache or Canvas. """
         try:
-            sections = course_instance.get_sections(include=['total_students'], per_page=100)
-            section_serializer = CanvasObjectROSerializer(sections, allowed_fields=self.sections_allowed_fields, many=True)
-            course['sections'] = section_serializer.data
+            course['sections'] = await get_course_section_rows(client, course.get('id'), self.sections_allowed_fields)
             logger.debug(f"Attached {len(course['sections'])} sections to course_id {course.get('id')}")
         except (CanvasException, Exception) as e:
             failed_input = f"course id {course.get('id')}"
@@ -272,9 +406,11 @@ class CanvasAdminSectionsAPIHandler(LoggingMixin, APIView):
             sync_func: callable, 
             *args, 
             **kwargs):
-        """ Run a synchronous function within a semaphore to limit concurrency, capturing errors. """
+        """ Run a function within a semaphore to limit concurrency, capturing errors. Coroutine functions are awaited directly, synchronous ones run in a worker thread. """
         async with semaphore:
             try:
+                if asyncio.iscoroutinefunction(sync_func):
+                    return await sync_func(*args, **kwargs)
                 return await asyncio.to_thread(sync_func,*args, **kwargs)
             except Exception as e:
                 errors.append(e if isinstance(e, HTTPAPIError) else HTTPAPIError(str(args), e))
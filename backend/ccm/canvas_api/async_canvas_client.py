@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import random
+from datetime import datetime
+from typing import AsyncIterator
+from urllib.parse import urlencode
+
+import httpx
+from canvasapi import Canvas
+from canvasapi.exceptions import (
+    BadRequest, CanvasException, Conflict, Forbidden, InvalidAccessToken, RateLimitExceeded,
+    ResourceDoesNotExist, Unauthorized, UnprocessableEntity
+)
+from canvasapi.util import combine_kwargs
+
+from backend.ccm.canvas_api.canvasapi_serializer import CanvasObjectROSerializer
+from backend.ccm.canvas_api.constants import (
+    CANVAS_API_TIMEOUT_SECONDS, CANVAS_RATE_LIMIT_MAX_RETRIES, CANVAS_RATE_LIMIT_RETRY_BASE_SECONDS
+)
+from backend.ccm.canvas_api.canvas_credential_manager import CanvasClientRegistry, canvas_client_registry
+from backend.ccm.canvas_api.canvas_throttle import CanvasThrottle, canvas_throttle
+from backend.ccm.canvas_api.rate_limiter import AdaptiveConcurrencyLimiter, get_rate_limiter
+
+logger = logging.getLogger(__name__)
+
+class AsyncCanvasClient:
+    """
+    Asyncio client for the Canvas REST API sending through a pooled (HTTP/2 capable) httpx client.
+    Concurrent calls are awaited directly instead of occupying a thread each via asyncio.to_thread().
+    Clients built with from_canvas() share the long-lived httpx client that canvas_client_registry keeps for
+    the running event loop, so requests reuse warm connections; the access token goes in each request's headers.
+    Errors are raised as the same canvasapi exceptions the canvasapi Requester raises, so callers keep
+    wrapping them in HTTPAPIError and CanvasErrorHandler maps them to status codes unchanged.
+
+    Every call takes a slot of the AdaptiveConcurrencyLimiter shared by the access token, which follows
+    X-Rate-Limit-Remaining, and calls throttled by Canvas are retried with backoff before RateLimitExceeded is raised.
+    Each call also draws from the CanvasThrottle bucket the token shares with the other web and qcluster workers,
+    through a ThrottleLease whose unused turns are given back when the client closes.
+
+    Usage:
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            response = await client.request("POST", f"sections/{section_id}/enrollments", enrollment={...})
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        access_token: str,
+        timeout: float = CANVAS_API_TIMEOUT_SECONDS,
+        transport: httpx.AsyncBaseTransport | None = None,
+        http_client: httpx.AsyncClient | None = None,
+        rate_limiter: AdaptiveConcurrencyLimiter | None = None,
+        max_retries: int = CANVAS_RATE_LIMIT_MAX_RETRIES,
+        throttle: CanvasThrottle = canvas_throttle
+    ):
+        self.base_url = f"{base_url}/api/v1/"
+        self.access_token = access_token
+        self.timeout = timeout
+        self.rate_limiter = rate_limiter or get_rate_limiter(access_token)
+        self.max_retries = max_retries
+        self.throttle_lease = throttle.lease(access_token)
+        self._headers = {"Authorization": f"Bearer {access_token}"}
+        # Without a shared client (e.g. over a test transport) the client has one of its own, closed with it
+        self._owns_http_client = http_client is None
+        self._client = http_client or CanvasClientRegistry.build_http_client(transport)
+
+    @classmethod
+    def from_canvas(cls, canvas_api: Canvas, **kwargs) -> 'AsyncCanvasClient':
+        """
+        Build a client with the same Canvas URL and access token as a canvasapi Canvas instance,
+        sending through the pooled httpx client of the running event loop.
+        """
+        requester = canvas_api._Canvas__requester
+        return cls(requester.original_url, requester.access_token, http_client=canvas_client_registry.get_http_client(), **kwargs)
+
+    async def __aenter__(self) -> 'AsyncCanvasClient':
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.aclose()
+
+    async def aclose(self) -> None:
+        await self.throttle_lease.close()
+        if self._owns_http_client:
+            await self._client.aclose()
+
+    async def request(self, method: str, endpoint: str, **kwargs) -> httpx.Response:
+        """
+        Send a request to a Canvas API endpoint (relative to /api/v1/ or an absolute URL).
+        Keyword arguments are flattened the same way canvasapi does (e.g. enrollment={'type': ...}
+        becomes enrollment[type]) and sent as query params for GET/DELETE or as form data otherwise.
+        """
+        params = self._prepare_params(combine_kwargs(**kwargs))
+        for attempt in range(self.max_retries + 1):
+            await self.throttle_lease.acquire()
+            async with self.rate_limiter.slot():
+                response = await self._send(method, endpoint, params)
+            if not self._is_throttled(response):
+                self.rate_limiter.on_response(self._rate_limit_remaining(response))
+                break
+            self.rate_limiter.on_throttled()
+            if attempt == self.max_retries:
+                break
+            # Throttled calls are rejected before Canvas processes them, so retrying is safe for any method
+            delay = CANVAS_RATE_LIMIT_RETRY_BASE_SECONDS * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning(f"Canvas throttled {method} {endpoint}, retry {attempt + 1} of {self.max_retries} in {delay:.1f} seconds")
+            await asyncio.sleep(delay)
+        self._raise_for_status(response)
+        return response
+
+    async def _send(self, method: str, endpoint: str, params: list[tuple]) -> httpx.Response:
+        logger.debug(f"Request: {method} {endpoint}")
+        # Relative endpoints resolve against /api/v1/, absolute pagination URLs are kept as they are
+        url = httpx.URL(self.base_url).join(endpoint)
+        if method in ("GET", "DELETE"):
+            # params=None keeps the query string of absolute pagination URLs, an empty list would drop it
+            response = await self._client.request(method, url, params=params or None, headers=self._headers, timeout=self.timeout)
+        else:
+            response = await self._client.request(
+                method,
+                url,
+                content=urlencode(params),
+                headers={**self._headers, "Content-Type": "application/x-www-form-urlencoded"},
+                timeout=self.timeout
+            )
+        # X-Request-Cost is what the call took from Canvas's bucket, the measure CANVAS_THROTTLE_RATE_PER_SECOND is sized by
+        logger.debug(f"Response: {method} {endpoint} {response.status_code} cost {response.headers.get('X-Request-Cost', 'unknown')}")
+        return response
+
+    async def get_paginated(self, endpoint: str, **kwargs) -> AsyncIterator[dict]:
+        """
+        Yield the raw JSON elements of a paginated Canvas list endpoint, following the Link header.
+        """
+        kwargs.setdefault("per_page", 100)
+        response = await self.request("GET", endpoint, **kwargs)
+        while True:
+            for element in response.json():
+                if element is not None:
+                    yield element
+            next_link = response.links.get("next")
+            if not next_link:
+                break
+            response = await self.request("GET", next_link["url"])
+
+    @staticmethod
+    def _prepare_params(params: list[tuple]) -> list[tuple]:
+        """Mirror canvasapi Requester value handling: lowercase booleans, ISO datetimes and drop None values."""
+        prepared = []
+        for key, value in params:
+            if value is None:
+                continue
+            if isinstance(value, bool):
+                value = str(value).lower()
+            elif isinstance(value, datetime):
+                value = value.isoformat()
+            prepared.append((key, value))
+        return prepared
+
+    @staticmethod
+    def _is_throttled(response: httpx.Response) -> bool:
+        """Canvas throttles with 403 Forbidden (Rate Limit Exceeded); 429 is handled the same way."""
+        return response.status_code == 429 or (response.status_code == 403 and "Rate Limit Exceeded" in response.text)
+
+    @staticmethod
+    def _rate_limit_remaining(response: httpx.Response) -> float | None:
+        try:
+            return float(response.headers["X-Rate-Limit-Remaining"])
+        except (KeyError, ValueError):
+            return None
+
+    @staticmethod
+    def _raise_for_status(response: httpx.Response) -> None:
+        """
+        Raise the canvasapi exception matching the response status, as canvasapi Requester.request does,
+        except that a throttled 403 raises RateLimitExceeded rather than Forbidden.
+        """
+        status_code = response.status_code
+        if AsyncCanvasClient._is_throttled(response):
+            raise RateLimitExceeded(
+                "Rate Limit Exceeded. X-Rate-Limit-Remaining: {}".format(
+                    response.headers.get("X-Rate-Limit-Remaining", "Unknown")
+                )
+            )
+        elif status_code == 400:
+            raise BadRequest(response.text)
+        elif status_code == 401:
+            if "WWW-Authenticate" in response.headers:
+                raise InvalidAccessToken(response.json())
+            else:
+                raise Unauthorized(response.json())
+        elif status_code == 403:
+            raise Forbidden(response.text)
+        elif status_code == 404:
+            raise ResourceDoesNotExist("Not Found")
+        elif status_code == 409:
+            raise Conflict(response.text)
+        elif status_code == 422:
+            raise UnprocessableEntity(response.text)
+        elif status_code > 400:
+            raise CanvasException(f"Encountered an error: status code {status_code}")
+
+async def get_paginated_rows(client: AsyncCanvasClient, endpoint: str, allowed_fields: set[str], **kwargs) -> list[dict]:
+    """
+    Read a paginated Canvas list endpoint as raw JSON and project each element onto allowed_fields
+    as it arrives, without building canvasapi objects for read-only responses.
+    """
+    serializer = CanvasObjectROSerializer(allowed_fields=allowed_fields)
+    return [serializer.to_representation(element) async for element in client.get_paginated(endpoint, **kwargs)]
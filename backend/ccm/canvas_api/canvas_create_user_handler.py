@@ -9,13 +9,14 @@ from rest_framework.request import Request
 from rest_framework.response import Response
 from typing import TypedDict, List
 from canvasapi import Canvas
-from canvasapi.account import Account
+from canvasapi.user import User
 from asgiref.sync import async_to_sync
 from canvasapi.exceptions import CanvasException
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
 from backend.ccm.canvas_api.canvasapi_serializer import CanvasObjectROSerializer, ExternalUsersRequestSerializer
 from .exceptions import CanvasErrorHandler, HTTPAPIError, ExternalUserCreationAndInvitationErrorHandler
-from backend.ccm.canvas_api.constants import CANVAS_ROOT_ACCOUNT_ID, MAX_CONCURRENCY
+from backend.ccm.canvas_api.constants import CANVAS_ROOT_ACCOUNT_ID, CANVAS_RATE_LIMIT_MAX_CONCURRENCY
 from django_q.tasks import async_task
 from backend.ccm.utils import timeit
 
@@ -123,29 +124,31 @@ class CanvasCreateUserHandler(LoggingMixin, APIView):
 
     @async_to_sync
     async def create_users(self, users: List[ExternalUserDict]):
-        tasks = [self.create_user_concurrent_action(user) for user in users]
-        return await asyncio.gather(*tasks, return_exceptions=True)
+        # One admin client and one semaphore shared by every user so the concurrency limit actually applies
+        canvas_api: Canvas = self.credential_manager.get_canvasapi_admin_instance()
+        semaphore = asyncio.Semaphore(CANVAS_RATE_LIMIT_MAX_CONCURRENCY)
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            tasks = [self.create_user_concurrent_action(semaphore, client, user) for user in users]
+            return await asyncio.gather(*tasks, return_exceptions=True)
 
-    async def create_user_concurrent_action(self, user: ExternalUserDict):
-        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+    async def create_user_concurrent_action(self, semaphore: asyncio.Semaphore, client: AsyncCanvasClient, user: ExternalUserDict):
         try:
             async with semaphore:
-                return await asyncio.to_thread(self.create_user_sync, user)
+                return await self.create_user(client, user)
         except Exception as e:
             logger.error(f"Error in create_user {user['email']}: {e}")
             return e
         
-    def create_user_sync(self, user: ExternalUserDict):
-        canvas_api: Canvas = self.credential_manager.get_canvasapi_admin_instance()
-
+    async def create_user(self, client: AsyncCanvasClient, user: ExternalUserDict):
         loginId: str = user['email'].replace('@', '+')  # Create a unique login ID
         fullName: str = f'{user["givenName"]} {user["surname"]}'
         sortableName: str = f'{user["surname"]} {user["givenName"]}'
         email: str = user['email']
 
         try:
-          account = Account(canvas_api._Canvas__requester, {'id': CANVAS_ROOT_ACCOUNT_ID})
-          created_user = account.create_user(
+          response = await client.request(
+              "POST",
+              f"accounts/{CANVAS_ROOT_ACCOUNT_ID}/users",
               user={
                   'name': fullName,
                   'sortable_name': sortableName,
@@ -162,6 +165,7 @@ class CanvasCreateUserHandler(LoggingMixin, APIView):
               },
               force_validations=False
           )
+          created_user = User(None, response.json())
           append_fields = {'login_id': loginId, 'email': email}
           serializer = CanvasObjectROSerializer(created_user, allowed_fields=self.allowed_fields, append_fields=append_fields)
           return serializer.data
@@ -1,20 +1,129 @@
+import asyncio
 import logging
+import threading
+import time
+from collections import OrderedDict
+import httpx
 from django.conf import settings
 from canvas_oauth.oauth import get_oauth_token
 from rest_framework.request import Request
 from canvas_oauth.exceptions import InvalidOAuthReturnError
 
 from canvasapi import Canvas
-from .exceptions import CanvasAccessTokenException 
+from .canvas_throttle import ThrottledHTTPAdapter
+from .exceptions import CanvasAccessTokenException
+from .constants import (
+  ASYNC_CANVAS_MAX_CONNECTIONS, CANVAS_API_TIMEOUT_SECONDS, CANVAS_CLIENT_IDLE_TIMEOUT_SECONDS, CANVAS_CLIENT_REGISTRY_MAX_SIZE,
+  MAX_CONCURRENCY
+)
 
 logger = logging.getLogger(__name__)
 
+class CanvasClientRegistry:
+  """
+  Process-wide pool of Canvas connections, shared by the sync canvasapi calls and AsyncCanvasClient.
+
+  The Canvas calls on hot paths (enrollments, section reads, user creation) go through AsyncCanvasClient,
+  which sends through the httpx.AsyncClient kept here for the running event loop, so every request served by
+  the ASGI loop shares one HTTP/2 connection pool whatever the token (auth is sent per request). httpx
+  connections are bound to the loop that opened them, so a client is only reused on its own loop; those of
+  closed loops (async_to_sync in qcluster workers runs each task on a new one) are dropped.
+
+  canvasapi Canvas instances are kept by access token for the remaining canvasapi paths (section merge
+  and unmerge, account and course lookups), reusing one requests.Session per token. Entries idle
+  longer than idle_timeout are evicted, as are the least recently used ones past max_size.
+  """
+
+  def __init__(self, idle_timeout: float = CANVAS_CLIENT_IDLE_TIMEOUT_SECONDS, max_size: int = CANVAS_CLIENT_REGISTRY_MAX_SIZE):
+    self.idle_timeout = idle_timeout
+    self.max_size = max_size
+    # access token -> (Canvas instance, last used time), ordered from least to most recently used
+    self._clients: OrderedDict[str, tuple[Canvas, float]] = OrderedDict()
+    self._http_clients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
+    self._lock = threading.Lock()
+
+  def get(self, canvas_url: str, access_token: str) -> Canvas:
+    now = time.monotonic()
+    with self._lock:
+      self._evict_idle(now)
+      entry = self._clients.pop(access_token, None)
+      canvas = entry[0] if entry else self._build(canvas_url, access_token)
+      self._clients[access_token] = (canvas, now)
+      while len(self._clients) > self.max_size:
+        _, (lru_canvas, _) = self._clients.popitem(last=False)
+        self._close(lru_canvas)
+    return canvas
+
+  def get_http_client(self) -> httpx.AsyncClient:
+    """Return the pooled httpx.AsyncClient of the running event loop, building it on first use."""
+    loop = asyncio.get_running_loop()
+    with self._lock:
+      for closed_loop in [other for other in self._http_clients if other.is_closed()]:
+        # Its connections cannot be closed without the loop, dropping the client lets them be collected
+        del self._http_clients[closed_loop]
+      http_client = self._http_clients.get(loop)
+      if http_client is None or http_client.is_closed:
+        http_client = self._http_clients[loop] = self.build_http_client()
+    return http_client
+
+  @staticmethod
+  def build_http_client(transport: httpx.AsyncBaseTransport | None = None) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+      http2=True,
+      limits=httpx.Limits(max_connections=ASYNC_CANVAS_MAX_CONNECTIONS, max_keepalive_connections=ASYNC_CANVAS_MAX_CONNECTIONS),
+      timeout=CANVAS_API_TIMEOUT_SECONDS,
+      transport=transport,
+    )
+
+  def invalidate(self, access_token: str) -> None:
+    """Drop the Canvas instance for a token, e.g. when its CanvasOAuth2Token row is deleted."""
+    with self._lock:
+      entry = self._clients.pop(access_token, None)
+    if entry:
+      self._close(entry[0])
+      logger.debug("Evicted pooled Canvas client for a deleted or invalid token")
+
+  def clear(self) -> None:
+    with self._lock:
+      entries = list(self._clients.values())
+      self._clients.clear()
+      self._http_clients.clear()
+    for canvas, _ in entries:
+      self._close(canvas)
+
+  def __len__(self) -> int:
+    return len(self._clients)
+
+  def _evict_idle(self, now: float) -> None:
+    while self._clients:
+      token, (canvas, last_used) = next(iter(self._clients.items()))
+      if now - last_used <= self.idle_timeout:
+        break
+      del self._clients[token]
+      self._close(canvas)
+
+  @staticmethod
+  def _build(canvas_url: str, access_token: str) -> Canvas:
+    canvas = Canvas(canvas_url, access_token)
+    # Size the keep-alive pool for the section merge and unmerge fan-outs so connections are reused,
+    # and draw every call from the token's budget shared with the other web and qcluster workers
+    adapter = ThrottledHTTPAdapter(access_token, pool_connections=1, pool_maxsize=MAX_CONCURRENCY)
+    canvas._Canvas__requester._session.mount('https://', adapter)
+    return canvas
+
+  @staticmethod
+  def _close(canvas: Canvas) -> None:
+    # Closing only releases pooled connections; a caller still holding the instance transparently reconnects
+    canvas._Canvas__requester._session.close()
+
+canvas_client_registry = CanvasClientRegistry()
+
 class CanvasCredentialManager:
 
   def __init__(self):
     super().__init__()
     self.canvasURL = f"https://{settings.CANVAS_OAUTH_CANVAS_DOMAIN}"
-  
+
   def get_canvasapi_instance(self, request: Request) -> Canvas:
     try:
       access_token = get_oauth_token(request)
@@ -22,11 +131,9 @@ class CanvasCredentialManager:
       # This issue occurred during non-prod Canvas sync when the API key was deleted, but the token remained in CCM databases. Expired token will trigger the usecase.
       logger.error(f"InvalidOAuthReturnError for user: {request.user}. Remove invalid refresh_token and prompt for reauthentication.")
       raise CanvasAccessTokenException()
-    return Canvas(self.canvasURL, access_token)
-  
+    return canvas_client_registry.get(self.canvasURL, access_token)
+
   # This token only used when getting and creating user in canvas
   def get_canvasapi_admin_instance(self) -> Canvas:
     admin_token = settings.CANVAS_ADMIN_API_TOKEN
-    return Canvas(self.canvasURL, admin_token)
-  
-  
\ No newline at end of file
+    return canvas_client_registry.get(self.canvasURL, admin_token)
@@ -0,0 +1,214 @@
+"""
+Token bucket in Redis (the default cache) limiting the rate of Canvas calls per access token across every
+gunicorn and qcluster worker, so concurrent users and background tasks share one predictable budget.
+
+Calls reserve tokens with a single Lua script: the bucket refills at CANVAS_THROTTLE_RATE_PER_SECOND up to
+CANVAS_THROTTLE_BURST, and calls arriving at an empty bucket go into debt and are told how long to wait for
+their turn. The debt never exceeds CANVAS_THROTTLE_MAX_WAIT_SECONDS of refill: past it, a reservation is refused
+and retried once the bucket has paid some of it back. Each AsyncCanvasClient reserves its turns through a
+ThrottleLease sized to the calls waiting for one, and gives back the turns it did not use when it closes.
+When the cache is not Redis or Redis is unavailable, calls are not throttled.
+"""
+
+import asyncio
+import hashlib
+import heapq
+import logging
+import time
+
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+
+from backend.ccm.canvas_api.constants import (
+    CANVAS_THROTTLE_BURST, CANVAS_THROTTLE_MAX_WAIT_SECONDS, CANVAS_THROTTLE_RATE_PER_SECOND, CANVAS_THROTTLE_RESERVE_BATCH_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+# KEYS[1]: bucket key; ARGV: refill rate per second, capacity, largest debt, tokens wanted.
+# Returns the number of tokens reserved and the tokens the bucket held before, or 0 and the seconds to wait before retrying.
+RESERVE_TOKENS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local max_debt = tonumber(ARGV[3])
+local count = tonumber(ARGV[4])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local granted = math.min(count, math.floor(tokens + max_debt))
+if granted < 1 then
+  return {0, tostring((1 - max_debt - tokens) / rate)}
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens - granted), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens + granted) / rate * 1000) + 1000)
+return {granted, tostring(tokens)}
+"""
+
+# KEYS[1]: bucket key; ARGV: refill rate per second, capacity, tokens returned.
+# Returns the tokens the bucket holds after taking them back; a bucket that expired is already full.
+RETURN_TOKENS_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local capacity = tonumber(ARGV[2])
+local count = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+if not bucket[1] then
+  return tostring(capacity)
+end
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local tokens = math.min(capacity, tonumber(bucket[1]) + math.max(0, now - tonumber(bucket[2])) * rate + count)
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate * 1000) + 1000)
+return tostring(tokens)
+"""
+
+class CanvasThrottle:
+
+    def __init__(
+        self,
+        rate: float = CANVAS_THROTTLE_RATE_PER_SECOND,
+        burst: int = CANVAS_THROTTLE_BURST,
+        max_wait: float = CANVAS_THROTTLE_MAX_WAIT_SECONDS,
+        batch_size: int = CANVAS_THROTTLE_RESERVE_BATCH_SIZE
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.max_wait = max_wait
+        self.batch_size = batch_size
+        self._script = None
+        self._return_script = None
+
+    @staticmethod
+    def _bucket_key(access_token: str) -> str:
+        token_hash = hashlib.sha256(str(access_token).encode()).hexdigest()[:32]
+        return f"ccm:canvas_throttle:{token_hash}"
+
+    @staticmethod
+    def _get_client():
+        return getattr(getattr(cache, '_cache', None), 'get_client', None)
+
+    def reserve(self, access_token: str, count: int = 1) -> tuple[list[float], float]:
+        """
+        Take up to count tokens from the bucket of access_token, without putting it more than max_wait into debt.
+        Returns the seconds to wait before making each reserved call, or no calls and the seconds to wait before trying again.
+        """
+        get_client = self._get_client()
+        if get_client is None:
+            return [0.0] * count, 0
+        try:
+            client = get_client(write=True)
+            if self._script is None:
+                self._script = client.register_script(RESERVE_TOKENS_SCRIPT)
+            granted, value = self._script(
+                keys=[self._bucket_key(access_token)], args=[self.rate, self.burst, self.max_wait * self.rate, count], client=client
+            )
+            granted, value = int(granted), float(value)
+        except Exception as e:
+            logger.warning(f"Canvas throttle unavailable, calling Canvas without it: {e}")
+            return [0.0] * count, 0
+        if not granted:
+            return [], value
+        # The i-th token is due once the bucket has refilled enough to hold it
+        return [max(0.0, (i - value) / self.rate) for i in range(1, granted + 1)], 0
+
+    def give_back(self, access_token: str, count: int) -> None:
+        """ Return count reserved tokens that were not used to the bucket of access_token. """
+        get_client = self._get_client()
+        if get_client is None:
+            return
+        try:
+            client = get_client(write=True)
+            if self._return_script is None:
+                self._return_script = client.register_script(RETURN_TOKENS_SCRIPT)
+            self._return_script(keys=[self._bucket_key(access_token)], args=[self.rate, self.burst, count], client=client)
+        except Exception as e:
+            logger.warning(f"Canvas throttle unavailable, unused turns not returned: {e}")
+
+    def lease(self, access_token: str) -> 'ThrottleLease':
+        return ThrottleLease(self, access_token)
+
+    def acquire_sync(self, access_token: str) -> None:
+        waits, retry_after = self.reserve(access_token)
+        while not waits:
+            logger.debug(f"Canvas throttle: budget {self.max_wait} seconds in debt, retrying in {retry_after:.2f} seconds")
+            time.sleep(retry_after)
+            waits, retry_after = self.reserve(access_token)
+        if waits[0] > 0:
+            logger.debug(f"Canvas throttle: waiting {waits[0]:.2f} seconds for the token's budget")
+            time.sleep(waits[0])
+
+class ThrottleLease:
+    """
+    Turns of a token's bucket reserved for the calls of one AsyncCanvasClient. One reservation is made at a time,
+    for as many turns as calls are waiting, up to a batch that starts at one and doubles with each reservation
+    (to the throttle's batch_size), so a client making one or two calls reserves no more turns than it needs.
+    The turns left when the client closes are given back to the bucket for the other workers.
+    """
+
+    def __init__(self, throttle: CanvasThrottle, access_token: str):
+        self.throttle = throttle
+        self.access_token = access_token
+        # Monotonic due times of the reserved turns not taken yet
+        self._turns: list[float] = []
+        self._waiting = 0
+        self._batch = 1
+        self._reserving: asyncio.Task | None = None
+
+    async def acquire(self) -> None:
+        if self.throttle._get_client() is None:
+            return
+        self._waiting += 1
+        try:
+            while not self._turns:
+                if self._reserving is None:
+                    self._reserving = asyncio.ensure_future(self._reserve())
+                # Shielded so a cancelled call does not cancel the reservation the other waiters share
+                await asyncio.shield(self._reserving)
+            due = heapq.heappop(self._turns)
+        finally:
+            self._waiting -= 1
+        wait = due - time.monotonic()
+        if wait > 0:
+            logger.debug(f"Canvas throttle: waiting {wait:.2f} seconds for the token's budget")
+            await asyncio.sleep(wait)
+
+    async def _reserve(self) -> None:
+        try:
+            # The cache client is synchronous, so the Redis round trip runs in a worker thread
+            count = max(1, min(self._waiting, self._batch))
+            waits, retry_after = await asyncio.to_thread(self.throttle.reserve, self.access_token, count)
+            if waits:
+                now = time.monotonic()
+                for wait in waits:
+                    heapq.heappush(self._turns, now + wait)
+                self._batch = min(self.throttle.batch_size, self._batch * 2)
+            else:
+                logger.debug(f"Canvas throttle: budget {self.throttle.max_wait} seconds in debt, retrying in {retry_after:.2f} seconds")
+                await asyncio.sleep(retry_after)
+        finally:
+            self._reserving = None
+
+    async def close(self) -> None:
+        unused = len(self._turns)
+        self._turns.clear()
+        if unused:
+            await asyncio.to_thread(self.throttle.give_back, self.access_token, unused)
+
+canvas_throttle = CanvasThrottle()
+
+class ThrottledHTTPAdapter(HTTPAdapter):
+    """
+    Adapter for the requests.Session of a canvasapi Canvas instance that acquires from the shared
+    throttle before every call, covering canvasapi calls made in to_thread fan-outs and background tasks.
+    """
+
+    def __init__(self, access_token: str, *args, **kwargs):
+        self.access_token = access_token
+        super().__init__(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        canvas_throttle.acquire_sync(self.access_token)
+        return super().send(request, *args, **kwargs)
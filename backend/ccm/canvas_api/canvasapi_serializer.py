@@ -1,3 +1,6 @@
+from functools import lru_cache
+
+from canvasapi.canvas_object import CanvasObject
 from rest_framework import serializers
 from .constants import ALLOWED_ROLES, MAX_ALLOWED_ENROLLMENTS
 
@@ -22,6 +25,7 @@ class SectionUsersSerializer(serializers.Serializer):
 class RoleValidationMixin:
     # Accept all roles from ClientEnrollmentType (case-insensitive)
     ALLOWED_ROLES = set(ALLOWED_ROLES)
+    CONFLICTING_ROLES_ERROR = 'conflictingRoles'
 
     def validate_roles(self, items, item_type='user'):
         errors = []
@@ -37,6 +41,29 @@ class RoleValidationMixin:
         if errors:
             raise serializers.ValidationError(errors)
 
+    def validate_unique_roles(self, items):
+        """
+        Reject a user listed in the same section with different roles, after the same login ID processing as enrollment,
+        since only one of the rows could be meant. Rows repeating the same role are left to deduplication.
+        """
+        # enroll_users imports this module, so process_login_id is imported when validating
+        from .enroll_users import process_login_id
+        roles = {}
+        errors = []
+        for item in items:
+            key = (item.get('sectionId'), process_login_id(item['loginId'].lower()))
+            role = item['role'].lower()
+            first_role = roles.setdefault(key, role)
+            if first_role != role:
+                errors.append({
+                    **({'sectionId': item['sectionId']} if 'sectionId' in item else {}),
+                    'loginId': item['loginId'],
+                    'role': item['role'],
+                    'error': f"Conflicting role '{role}', the user is also listed with role '{first_role}' in this section."
+                })
+        if errors:
+            raise serializers.ValidationError({self.CONFLICTING_ROLES_ERROR: errors})
+
 class SingleSectionEnrollRequestSerializer(serializers.Serializer, RoleValidationMixin):
     users = SectionUsersSerializer(many=True)
 
@@ -47,6 +74,7 @@ class SingleSectionEnrollRequestSerializer(serializers.Serializer, RoleValidatio
                 'users': f'Cannot enroll more than {MAX_ALLOWED_ENROLLMENTS} users in a single request.'
             })
         self.validate_roles(users, item_type='user')
+        self.validate_unique_roles(users)
         return data
 
 class MultiSectionEnrollSerializer(serializers.Serializer):
@@ -59,12 +87,15 @@ class MultiSectionEnrollRequestSerializer(serializers.Serializer, RoleValidation
 
     def validate(self, data):
         self.validate_roles(data.get('enrollments', []), item_type='enrollment')
+        self.validate_unique_roles(data.get('enrollments', []))
         return data
     
 class AdminSectionsQuerySerializer(serializers.Serializer):
     term_id = serializers.CharField(required=True)
     instructor_name = serializers.CharField(required=False, allow_null=True)
     course_name = serializers.CharField(required=False, allow_null=True)
+    refresh_accounts = serializers.BooleanField(required=False, default=False)
+    stream = serializers.BooleanField(required=False, default=False)
 
     def validate(self, data):
         # XOR: Only one of instructor_name or course_name must be provided, not both or neither
@@ -91,11 +122,25 @@ class CrosslistSectionsSerializer(serializers.Serializer):
             raise serializers.ValidationError("Duplicate section IDs are not allowed.")
         return data
 
+_MISSING = object()
+
+@lru_cache(maxsize=256)
+def _compile_field_accessors(cls: type, fields: frozenset) -> tuple[tuple[str, bool], ...]:
+    """
+    Build the accessor list used to project a CanvasObject subclass onto fields, in the same sorted
+    order dir() yields. Each entry is (field, defined_on_class); class-level attributes (properties etc.)
+    are read with getattr, everything else straight from the instance __dict__ populated from Canvas JSON.
+    """
+    return tuple((field, hasattr(cls, field)) for field in sorted(fields) if not field.startswith('_'))
+
 class CanvasObjectROSerializer(serializers.BaseSerializer):
     """
     Serializer for generic Canvas objects from the Canvas API
     Adapted from the Django REST Framework documentation:
     https://www.django-rest-framework.org/api-guide/serializers/#creating-new-base-classes
+
+    When allowed_fields is given, CanvasObject instances and raw Canvas JSON dicts are projected
+    directly onto those fields instead of walking every attribute of the object.
     """
     def __init__(self, *args, allowed_fields=None, append_fields=None, **kwargs):
         super().__init__(*args, **kwargs)
@@ -116,6 +161,15 @@ class CanvasObjectROSerializer(serializers.BaseSerializer):
             # Fallback for other types
             return str(value)
 
+    def convert_attribute_value(self, value):
+        if hasattr(value, '__dict__') and isinstance(value, object):
+            # Try JSON serializing nested CanvasObjects by getting their dict
+            return self.convert_canvas_object_to_primitives(value)
+        elif isinstance(value, list) and not any(isinstance(item, (str, int, bool, float, type(None))) for item in value):
+            # If the list contains CanvasObjects, convert them to primitives
+            return [self.convert_canvas_object_to_primitives(item) for item in value]
+        return self.retrieve_primitive(value)
+
     def convert_canvas_object_to_primitives(self, instance):
         data = {}
         for attr in dir(instance):
@@ -124,21 +178,43 @@ class CanvasObjectROSerializer(serializers.BaseSerializer):
                 continue  # skip private/internal attrs
             if callable(value):
                 continue  # skip methods
-            elif hasattr(value, '__dict__') and isinstance(value, object):
-                # Try JSON serializing nested CanvasObjects by getting their dict
-                data[attr] = self.convert_canvas_object_to_primitives(value)
-            elif isinstance(value, list) and not any(isinstance(item, (str, int, bool, float, type(None))) for item in value):
-                # If the list contains CanvasObjects, convert them to primitives
-                data[attr] = [self.convert_canvas_object_to_primitives(item) for item in value]
-            else:
-                data[attr] = self.retrieve_primitive(value)
+            data[attr] = self.convert_attribute_value(value)
+        return data
+
+    def project_canvas_object(self, instance: CanvasObject):
+        """
+        Read only allowed_fields from a CanvasObject; equivalent to converting the whole object and filtering.
+        """
+        data = {}
+        instance_dict = instance.__dict__
+        for field, defined_on_class in _compile_field_accessors(type(instance), frozenset(self.allowed_fields)):
+            value = getattr(instance, field, _MISSING) if defined_on_class else instance_dict.get(field, _MISSING)
+            if value is _MISSING or callable(value):
+                continue
+            data[field] = self.convert_attribute_value(value)
         return data
 
+    def project_raw_json(self, instance: dict):
+        """
+        Read only allowed_fields from a raw Canvas JSON dict, in the same order as project_canvas_object.
+        Flat fields match project_canvas_object; nested JSON (e.g. a list of dicts) is kept as Canvas returned it,
+        where converting a CanvasObject turns each nested dict into {}. Read-only endpoints only allow flat fields.
+        """
+        return {
+            field: self.retrieve_primitive(instance[field])
+            for field in sorted(self.allowed_fields) if field in instance
+        }
+
     def to_representation(self, instance):
-        data = self.convert_canvas_object_to_primitives(instance)
-        # Filter out fields not in allowed_fields
-        if self.allowed_fields:
-            data = {key: value for key, value in data.items() if key in self.allowed_fields}
+        if self.allowed_fields and isinstance(instance, dict):
+            data = self.project_raw_json(instance)
+        elif self.allowed_fields and isinstance(instance, CanvasObject):
+            data = self.project_canvas_object(instance)
+        else:
+            data = self.convert_canvas_object_to_primitives(instance)
+            # Filter out fields not in allowed_fields
+            if self.allowed_fields:
+                data = {key: value for key, value in data.items() if key in self.allowed_fields}
         
         # Append fields from append_fields if provided
         if self.append_fields:
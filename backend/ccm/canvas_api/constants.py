@@ -12,6 +12,21 @@ ALLOWED_ROLES = (
 
 # Maximum number of enrollments allowed in a single section enrollment request
 MAX_ALLOWED_ENROLLMENTS = 5000
+# Enrollment requests with at most this many users are enrolled during the request instead of queued as a job
+ENROLLMENT_INLINE_MAX_USERS = 25
+# Enrollment jobs are persisted and processed in chunks of this many users, each chunk in its own django-q task
+ENROLLMENT_JOB_CHUNK_SIZE = 250
+# The failure report of an enrollment job is kept in memory up to the spool size and in a temporary file past it,
+# and attached gzip compressed from the compress size. Logs list at most the sample size of a chunk's failures
+ENROLLMENT_REPORT_SPOOL_MAX_BYTES = 1024 * 1024
+ENROLLMENT_REPORT_COMPRESS_MIN_BYTES = 256 * 1024
+ENROLLMENT_FAILURE_LOG_SAMPLE_SIZE = 10
+# Reports from the link size up are linked from the summary email instead of attached. The link carries a token signed
+# for the job's owner, accepted in place of their session for the max age; after that the owner downloads it logged in
+ENROLLMENT_REPORT_LINK_MIN_BYTES = 2 * 1024 * 1024
+ENROLLMENT_REPORT_LINK_MAX_AGE_SECONDS = 24 * 60 * 60
+# Redis counters of finished enrollments per job, read by the job progress endpoint while the job runs
+ENROLLMENT_JOB_PROGRESS_TIMEOUT_SECONDS = 24 * 60 * 60
 
 MAX_SEARCH_COURSES = 400
 
@@ -23,4 +38,56 @@ ROLE_TO_ENROLLMENT_TYPE = {
 
 MAX_CONCURRENCY = 10
 CANVAS_ROOT_ACCOUNT_ID = 1
+# Bulk emails are split into at most this many batches, each sent over its own SMTP connection
+EMAIL_BULK_MAX_CONNECTIONS = 5
+# The email outbox is drained every minute by a django-q schedule, in batches sent over one SMTP connection.
+# A claimed batch is leased so concurrent drains skip it, and failed emails are retried after base * 2**attempts seconds
+EMAIL_OUTBOX_BATCH_SIZE = 50
+EMAIL_OUTBOX_MAX_BATCHES_PER_RUN = 20
+EMAIL_OUTBOX_LEASE_SECONDS = 10 * 60
+EMAIL_OUTBOX_MAX_ATTEMPTS = 5
+EMAIL_OUTBOX_RETRY_BASE_SECONDS = 60
 
+
+# Connection pool size of the httpx client each event loop shares for AsyncCanvasClient calls, and the request timeout
+ASYNC_CANVAS_MAX_CONNECTIONS = 100
+CANVAS_API_TIMEOUT_SECONDS = 60
+
+# Adaptive concurrency of Canvas calls per access token: starts at MAX_CONCURRENCY, grows while X-Rate-Limit-Remaining
+# stays above the low watermark (Canvas buckets hold 700) and is halved, at most once per cooldown, when it drains or a call is throttled
+CANVAS_RATE_LIMIT_MIN_CONCURRENCY = 2
+CANVAS_RATE_LIMIT_MAX_CONCURRENCY = 50
+CANVAS_RATE_LIMIT_LOW_WATERMARK = 300
+CANVAS_RATE_LIMIT_DECREASE_FACTOR = 0.5
+CANVAS_RATE_LIMIT_DECREASE_COOLDOWN_SECONDS = 1
+# Throttled calls are retried after an exponential backoff (base * 2**attempt, with jitter)
+CANVAS_RATE_LIMIT_MAX_RETRIES = 5
+CANVAS_RATE_LIMIT_RETRY_BASE_SECONDS = 1
+
+# Redis token bucket per access token shared by all web and qcluster workers: sustained Canvas calls per second,
+# burst size, and the longest a call waits for its turn. Canvas refills each token's own bucket by 10 cost units a second
+# and charges each call the CPU and database seconds it took, reported in X-Request-Cost (logged with each response at
+# debug level). 50 calls a second is what Canvas sustains for calls costing 0.2 or less, the budget set for the enrollment POSTs
+# and section GETs that make up the fan-outs, and stays above what the 10 concurrent enrollment calls (a few hundred ms
+# each) reached before the bucket existed. If the logged costs run higher, lower the rate to 10 / cost. Canvas's own
+# X-Rate-Limit-Remaining still drives the adaptive limiter; this bucket only keeps workers from overrunning it together
+CANVAS_THROTTLE_RATE_PER_SECOND = 50
+CANVAS_THROTTLE_BURST = 100
+CANVAS_THROTTLE_MAX_WAIT_SECONDS = 30
+# Largest number of turns an AsyncCanvasClient reserves per Redis round trip; reservations start at one turn and double
+CANVAS_THROTTLE_RESERVE_BATCH_SIZE = 10
+
+# Pooled canvasapi clients per access token: evicted after this many idle seconds, and least recently used past the max size
+CANVAS_CLIENT_IDLE_TIMEOUT_SECONDS = 300
+CANVAS_CLIENT_REGISTRY_MAX_SIZE = 256
+
+# Read-through cache of course section rows, invalidated on section create, merge and unmerge
+COURSE_SECTIONS_CACHE_TIMEOUT_SECONDS = 120
+
+# Cached Canvas user ids of login ids learned from enrollments; kept short so a reassigned login id is not enrolled as its former user
+CANVAS_USER_ID_CACHE_TIMEOUT_SECONDS = 10 * 60
+# Uncached login ids listed in more than one row are looked up in concurrent batches of this many before enrolling
+LOGIN_ID_RESOLUTION_BATCH_SIZE = 50
+
+# Cached accessible account ids of an admin user; the account hierarchy rarely changes, refresh_accounts=true forces a re-crawl
+ADMIN_ACCOUNTS_CACHE_TIMEOUT_SECONDS = 24 * 60 * 60
@@ -8,7 +8,6 @@ from rest_framework.request import Request
 
 from canvasapi.exceptions import CanvasException
 from canvasapi import Canvas
-from canvasapi.course import Course
 from canvasapi.section import Section
 from drf_spectacular.utils import extend_schema
 from asgiref.sync import async_to_sync
@@ -17,6 +16,8 @@ from backend.ccm.canvas_api.constants import MAX_CONCURRENCY
 from .exceptions import CanvasErrorHandler, HTTPAPIError
 
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
+from backend.ccm.canvas_api.section_cache import get_cached_section_course_ids, get_course_section_rows, invalidate_course_sections
 
 from rest_framework_tracking.mixins import LoggingMixin
 
@@ -48,21 +49,21 @@ class CanvasCourseSectionAPIHandler(LoggingMixin, APIView):
             # Call the Canvas API package to get section details.
         try:
             logger.info(f"Retrieving sections for course_id: {course_id}")
-            # Create a course object with just the ID to avoid unnecessary API call
-            # Skips the get_course() call and directly uses get_sections()
-            course = Course(canvas_api._Canvas__requester, {'id': course_id})
-            # Get list of sections, including total_students info
-            sections = course.get_sections(include=['total_students'], per_page=per_page)
-            
-            serializer = CanvasObjectROSerializer(sections, allowed_fields=self.course_section_allowed_fields, many=True)
+            # Read the raw section JSON straight into response rows, including total_students info, through the section cache
+            sections = self.get_section_rows(canvas_api, course_id, per_page)
             logger.info(f"Section data retrieved with filtered fields: {self.course_section_allowed_fields}")
-            logger.debug(f"Section data in response: {serializer.data}")
+            logger.debug(f"Section data in response: {sections}")
 
-            return Response(serializer.data, status=HTTPStatus.OK)
+            return Response(sections, status=HTTPStatus.OK)
         except (CanvasException, Exception) as e:
             self.canvas_error.handle_canvas_api_exceptions(HTTPAPIError(str(course_id), e))
             return Response(self.canvas_error.to_dict(), status=self.canvas_error.to_dict().get('statusCode'))
     
+    @async_to_sync
+    async def get_section_rows(self, canvas_api: Canvas, course_id: int, per_page: int) -> list[dict]:
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            return await get_course_section_rows(client, course_id, self.course_section_allowed_fields, per_page=per_page)
+
     @extend_schema(
         operation_id="create_course_sections",
         summary="create Course sections",
@@ -78,13 +79,9 @@ class CanvasCourseSectionAPIHandler(LoggingMixin, APIView):
         sections: list = serializer.validated_data['sections']
         logger.info(f"Creating {sections} sections for course_id: {course_id}")
         canvas_api: Canvas = self.credential_manager.get_canvasapi_instance(request)
-        
-        # Create a Course object with just the ID to avoid unnecessary API call
-        # If the course doesn't exist, the section creation will fail with proper error
-        course = Course(canvas_api._Canvas__requester, {'id': course_id})
            
         start_time: float = time.perf_counter()
-        results = self.create_sections(course, sections)
+        results = self.create_sections(canvas_api, course_id, sections)
         end_time: float = time.perf_counter()
         logger.info(f"Time taken to create {len(sections)} sections: {end_time - start_time:.2f} seconds")
 
@@ -93,6 +90,8 @@ class CanvasCourseSectionAPIHandler(LoggingMixin, APIView):
         err_res = [res for res in results if isinstance(res, HTTPAPIError)]
 
         logger.info(f"{len(success_res)}/{len(sections)} sections successfully created")
+        if success_res:
+            invalidate_course_sections([course_id])
         logger.debug(f"Errors while creating the section: {err_res}")
         
         if not err_res:
@@ -102,39 +101,31 @@ class CanvasCourseSectionAPIHandler(LoggingMixin, APIView):
         self.canvas_error.handle_canvas_api_exceptions(err_res)
         return Response(self.canvas_error.to_dict(), status=self.canvas_error.to_dict().get('statusCode'))
 
-    async def sem_task(self, semaphore, course, name):
+    async def sem_task(self, semaphore, client: AsyncCanvasClient, course_id: int, name: str):
         async with semaphore:
-            return await self.create_section(course, name)
+            return await self.create_section(client, course_id, name)
 
     @async_to_sync
-    async def create_sections(self, course: Course, section_names: list):
-        """Creates multiple sections concurrently, guarded by a semaphore."""
+    async def create_sections(self, canvas_api: Canvas, course_id: int, section_names: list):
+        """Creates multiple sections concurrently on the async Canvas client, guarded by a semaphore."""
         max_concurrent = MAX_CONCURRENCY  # Set your desired concurrency limit here
         semaphore = asyncio.Semaphore(max_concurrent)
-        tasks = [self.sem_task(semaphore, course, name) for name in section_names]
-        return await asyncio.gather(*tasks, return_exceptions=True)
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            tasks = [self.sem_task(semaphore, client, course_id, name) for name in section_names]
+            return await asyncio.gather(*tasks, return_exceptions=True)
 
-    def create_section_sync(self, course: Course, section_name: str):
-        """Creates a section synchronously with automatic retry handling."""
+    async def create_section(self, client: AsyncCanvasClient, course_id: int, section_name: str):
+        """Creates a section, returning its serialized row or the HTTPAPIError it failed with."""
         try:
-            logger.info(f"Creating section: {section_name} for course_id: {course.id} at {time.strftime('%H:%M:%S')}")
-            section = course.create_course_section(course_section={"name": section_name})
-            
-            # Serialize the section and add total_students manually
+            logger.info(f"Creating section: {section_name} for course_id: {course_id} at {time.strftime('%H:%M:%S')}")
+            response = await client.request("POST", f"courses/{course_id}/sections", course_section={"name": section_name})
+
+            # Serialize the section JSON and add total_students manually
             append_fields = {"total_students": 0}  # Default value for total_students
-            serializer = CanvasObjectROSerializer(section, allowed_fields=self.course_section_allowed_fields, append_fields=append_fields)
-            serialized_data = serializer.data
-            return serialized_data
-        
+            serializer = CanvasObjectROSerializer(response.json(), allowed_fields=self.course_section_allowed_fields, append_fields=append_fields)
+            return serializer.data
         except (CanvasException, Exception) as e:
-            raise HTTPAPIError(section_name, e)
-
-    async def create_section(self, course: Course, section_name: str):
-        """Async wrapper to call create_section_sync using asyncio.to_thread()."""
-        try:
-            return await asyncio.to_thread(self.create_section_sync, course, section_name)
-        except Exception as e:
-            return e if isinstance(e, HTTPAPIError) else HTTPAPIError(section_name, e)
+            return HTTPAPIError(section_name, e)
 
 @extend_schema(
         operation_id="merge_course_sections",
@@ -169,8 +160,11 @@ class CanvasMergeSectionsToCourseView(LoggingMixin, APIView):
         logger.info(f"Merging {len(section_ids)} sections into course_id: {course_id}")
         canvas_api: Canvas = self.credential_manager.get_canvasapi_instance(request)
 
+        # Sections leave the course they are currently in and join course_id, so both lose their cached section rows
+        affected_course_ids = get_cached_section_course_ids(section_ids) | {course_id}
         try:
             merge_success, merge_response = self._merge_sections(canvas_api, course_id, section_ids)
+            invalidate_course_sections(affected_course_ids)
 
             if not merge_success:
                 self.canvas_error.handle_canvas_api_exceptions(merge_response)
@@ -251,8 +245,13 @@ class CanvasUnmergeSectionsView(LoggingMixin, APIView):
         logger.info(f"Unmerging {len(section_ids)} section(s)")
         canvas_api: Canvas = self.credential_manager.get_canvasapi_instance(request)
 
+        # Sections leave the course they are merged into and return to their original course, read from the response
+        affected_course_ids = get_cached_section_course_ids(section_ids)
         try:
             unmerge_success, unmerge_response = self._unmerge_sections(canvas_api, section_ids)
+            if unmerge_success:
+                affected_course_ids |= {getattr(section, 'course_id', None) for section in unmerge_response}
+            invalidate_course_sections(affected_course_ids)
 
             if not unmerge_success:
                 self.canvas_error.handle_canvas_api_exceptions(unmerge_response)
@@ -311,11 +310,14 @@ async def api_task_with_semaphore(
     *args, 
     **kwargs):
     """ 
-    Run a synchronous function within a semaphore to limit concurrency,
-    capturing errors in a separate list.
+    Run a function within a semaphore to limit concurrency, capturing errors in a separate list.
+    Coroutine functions (e.g. calls on AsyncCanvasClient) are awaited directly; synchronous
+    functions are run in a worker thread.
     """
     async with semaphore:
         try:
+            if asyncio.iscoroutinefunction(sync_func):
+                return await sync_func(*args, **kwargs)
             return await asyncio.to_thread(sync_func, *args, **kwargs)
         except Exception as e:
             errors.append(e if isinstance(e, HTTPAPIError) else HTTPAPIError(str(args), e))
\ No newline at end of file
@@ -1,47 +1,106 @@
 import logging
-from smtplib import SMTPException
+from smtplib import SMTPServerDisconnected
 from django.conf import settings
-from django.core.mail import EmailMessage
+from django.core.mail import EmailMessage, get_connection
 from django.core.mail.backends.base import BaseEmailBackend
 
+from backend.ccm.models import EmailOutbox
+
 logger = logging.getLogger(__name__)
 
-def send_email(
+def build_email(
     to_email: str,
     subject: str,
     body: str,
     attachment: tuple = None,
     connection: BaseEmailBackend = None
-) -> None:
+) -> EmailMessage:
     """
-    Send an email to the user. If attachment is provided, add it to the email.
+    Build the HTML email to one recipient, prefixing the subject when EMAIL_DEBUG is set.
     - to_email: Recipient email address
     - subject: Email subject
     - body: Email body as HTML
     - attachment: tuple (filename, content, mime_type) or None
-    - connection: Django email backend connection for SMTP reuse. If not provided, the default connection is used.
-                  For sending bulk emails, it is recommended to pass a single connection explicitly to improve efficiency.
+    - connection: Django email backend connection to send it over. If not provided, the default connection is used.
+    Emails are sent through the outbox with queue_email, or in bulk with send_email_batch.
+    """
+    # Prefix subject if EMAIL_DEBUG is True
+    email_subject = subject
+    if getattr(settings, 'EMAIL_DEBUG', False):
+        email_subject = f"Test Email - {subject}"
+    email = EmailMessage(
+        subject=email_subject,
+        body=body,
+        from_email=settings.EMAIL_FROM,
+        to=[to_email],
+        reply_to=[settings.EMAIL_TO_REPLY],
+        connection=connection
+    )
+    email.content_subtype = "html"
+    # Add headers to suppress automatic replies (out-of-office, vacation, etc.)
+    headers = getattr(settings, 'EMAIL_EXTRA_HEADERS', {}) or {}
+    email.extra_headers = headers if isinstance(headers, dict) else {}
+    if attachment:
+        filename, content, mime_type = attachment
+        email.attach(filename, content, mime_type)
+    return email
+
+def send_email_batch(to_emails: list[str], subject: str, body: str) -> dict[str, str]:
     """
+    Send the same email to each recipient, one message at a time over a single SMTP session opened for the batch.
+    A connection is not thread-safe, so concurrent batches must each call this with their own recipients.
+    If the server drops the session, it is reopened once and the message is sent again.
+
+    :return: Error message by recipient, for the recipients whose email failed.
+    """
+    failures: dict[str, str] = {}
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as e:
+        logger.error(f"Failed to open email connection for {len(to_emails)} recipients: {e}")
+        return {to_email: str(e) for to_email in to_emails}
     try:
-        # Prefix subject if EMAIL_DEBUG is True
-        email_subject = subject
-        if getattr(settings, 'EMAIL_DEBUG', False):
-            email_subject = f"Test Email - {subject}"
-        email = EmailMessage(
-            subject=email_subject,
-            body=body,
-            from_email=settings.EMAIL_FROM,
-            to=[to_email],
-            reply_to=[settings.EMAIL_TO_REPLY],
-            connection=connection
-        )
-        email.content_subtype = "html"
-        # Add headers to suppress automatic replies (out-of-office, vacation, etc.)
-        headers = getattr(settings, 'EMAIL_EXTRA_HEADERS', {}) or {}
-        email.extra_headers = headers if isinstance(headers, dict) else {}
-        if attachment:
-            filename, content, mime_type = attachment
-            email.attach(filename, content, mime_type)
-        email.send()
-    except (SMTPException, Exception) as e:
-        logger.error(f"Failed to send enrollment email to {to_email}: {e}")
\ No newline at end of file
+        for to_email in to_emails:
+            email = build_email(to_email, subject, body, connection=connection)
+            try:
+                try:
+                    email.send()
+                except SMTPServerDisconnected:
+                    connection.close()
+                    connection.open()
+                    email.send()
+            except Exception as e:
+                logger.error(f"Failed to send email to {to_email}: {e}")
+                failures[to_email] = str(e)
+    finally:
+        connection.close()
+    return failures
+
+def queue_email(
+    to_email: str,
+    subject: str,
+    body: str,
+    attachment: tuple = None,
+    dedup_key: str = None
+) -> EmailOutbox:
+    """
+    Queue an email in the outbox, to be sent by the send_outbox_emails schedule, with the arguments of build_email.
+    The row is written in the caller's transaction, so it is only sent if that transaction commits.
+    - dedup_key: An email with the same key is only queued once.
+    """
+    filename, content, mime_type = attachment or ('', '', '')
+    fields = {
+        'to_email': to_email,
+        'subject': subject,
+        'body': body,
+        'attachment_name': filename,
+        'attachment_content': content.encode('utf-8') if isinstance(content, str) else content,
+        'attachment_mime_type': mime_type,
+    }
+    if dedup_key is None:
+        return EmailOutbox.objects.create(**fields)
+    email, created = EmailOutbox.objects.get_or_create(dedup_key=dedup_key, defaults=fields)
+    if not created:
+        logger.info(f"Email with dedup key {dedup_key} is already queued as {email.pk}")
+    return email
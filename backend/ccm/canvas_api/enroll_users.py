@@ -1,14 +1,14 @@
 import logging
-from canvasapi.section import Section
 from canvasapi.enrollment import Enrollment
-from canvasapi import Canvas
-from canvasapi.exceptions import CanvasException
 from backend.ccm.canvas_api.canvasapi_serializer import CanvasObjectROSerializer
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
 
 from django.conf import settings
 from .constants import ROLE_TO_ENROLLMENT_TYPE
 logger = logging.getLogger(__name__)
 
+ENROLLMENT_ALLOWED_FIELDS = ['id', 'course_id', 'course_section_id', 'user_id', 'type']
+
 def process_login_id(login_id: str) -> str:
     """
     Process the login ID to strip the domain and handle special cases. Handles both UMich and Non-UMich email doimains along
@@ -24,36 +24,58 @@ def process_login_id(login_id: str) -> str:
     else:
         return login_id
 
-def enroll_user(canvasapi: Canvas, section_id: int, login_id: str, role: str):
+def deduplicate_enrollments(enrollment_params: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Collapse enrollment rows naming the same user (after lowercasing and process_login_id) with the same role in the same section.
+    The first row is kept; later rows are skipped, with the reason in 'error'. Rows asking for conflicting roles are
+    rejected by the enroll request serializers before they get here.
+
+    :return: The rows to enroll, and the skipped rows.
+    """
+    seen: set[tuple] = set()
+    kept, skipped = [], []
+    for param in enrollment_params:
+        key = (int(param['sectionId']), process_login_id(param['loginId'].lower()), param['role'].lower())
+        if key in seen:
+            skipped.append({**param, 'error': 'Duplicate of an earlier row'})
+        else:
+            seen.add(key)
+            kept.append(param)
+    return kept, skipped
+
+async def enroll_user_async(client: AsyncCanvasClient, section_id: int, login_id: str, role: str, user_id: int | None = None):
     """
-    Enroll a user in a specific section using Canvas API.
+    Enroll a user in a specific section by awaiting the Canvas API directly on the shared async client.
 
-    :param canvasapi: Instance of Canvas API client.
+    :param client: AsyncCanvasClient shared by all concurrent enrollments of a request or task.
     :param section_id: ID of the section to enroll the user in.
     :param login_id: Login ID of the user to enroll.
     :param role: Role of the user to enroll (e.g., "student", "teacher").
-    :return: Response from the Canvas API.
-    """
-    try:
-        section = Section(canvasapi._Canvas__requester, {'id': section_id})
-        enrollment_params = {
-            "enrollment[user_id]": f"sis_login_id:{process_login_id(login_id)}",
-            "enrollment[enrollment_state]": "active",
-            "notify": False
-        }
-        if role in ROLE_TO_ENROLLMENT_TYPE:
-            enrollment_params["enrollment[type]"] = ROLE_TO_ENROLLMENT_TYPE[role]
-        elif role in settings.CUSTOM_CANVAS_ROLES:
-            enrollment_params["enrollment[role_id]"] = settings.CUSTOM_CANVAS_ROLES[role]
-        
-        response = section._requester.request(
-            "POST",
-            f"sections/{section_id}/enrollments",
-            _kwargs=list(enrollment_params.items())
-        )
-        allowed_fields = ['id', 'course_id', 'course_section_id', 'user_id', 'type']
-        enrollment_result = Enrollment(section._requester, response.json())
-        serializer = CanvasObjectROSerializer(enrollment_result, allowed_fields=allowed_fields)
-        return serializer.data
-    except (CanvasException, Exception) as e:
-        raise
+    :param user_id: Canvas user ID of login_id when it was resolved beforehand, so Canvas does not look up the login again.
+    :return: The enrollment's allowed fields. Canvas errors are raised as canvasapi exceptions.
+    """
+    enrollment_params = build_enrollment_params(login_id, role, user_id)
+    response = await client.request(
+        "POST",
+        f"sections/{section_id}/enrollments",
+        **enrollment_params
+    )
+    enrollment_result = Enrollment(None, response.json())
+    serializer = CanvasObjectROSerializer(enrollment_result, allowed_fields=ENROLLMENT_ALLOWED_FIELDS)
+    return serializer.data
+
+def build_enrollment_params(login_id: str, role: str, user_id: int | None = None) -> dict:
+    """
+    Build the Canvas form parameters to enroll login_id (or its Canvas user_id when known) with the given role,
+    mapping the role to a base enrollment type or to a custom Canvas role id.
+    """
+    enrollment_params = {
+        "enrollment[user_id]": user_id if user_id is not None else f"sis_login_id:{process_login_id(login_id)}",
+        "enrollment[enrollment_state]": "active",
+        "notify": False
+    }
+    if role in ROLE_TO_ENROLLMENT_TYPE:
+        enrollment_params["enrollment[type]"] = ROLE_TO_ENROLLMENT_TYPE[role]
+    elif role in settings.CUSTOM_CANVAS_ROLES:
+        enrollment_params["enrollment[role_id]"] = settings.CUSTOM_CANVAS_ROLES[role]
+    return enrollment_params
@@ -0,0 +1,101 @@
+import gzip
+import logging
+from http import HTTPStatus
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.views import APIView
+from rest_framework import authentication, exceptions, permissions
+from rest_framework.response import Response
+from rest_framework.request import Request
+from rest_framework_tracking.mixins import LoggingMixin
+from drf_spectacular.utils import extend_schema
+
+from canvasapi.exceptions import ResourceDoesNotExist
+
+from backend.ccm.background_tasks.enrollment_progress import get_enrollment_progress
+from backend.ccm.background_tasks.enrollment_report import enrollment_report_token_grant, get_enrollment_job_report
+from backend.ccm.models import EnrollmentJob
+from .exceptions import CanvasErrorHandler, HTTPAPIError
+
+logger = logging.getLogger(__name__)
+
+class EnrollmentJobProgressAPIHandler(LoggingMixin, APIView):
+    """
+    API handler reporting the progress of a bulk enrollment job started by the enroll endpoints.
+    """
+    logging_methods = ['GET']
+    authentication_classes = [authentication.SessionAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def __init__(self):
+        self.canvas_error = CanvasErrorHandler()
+        super().__init__()
+
+    @extend_schema(
+        operation_id="get_enrollment_job_progress",
+        description="Get the total, processed, succeeded and failed enrollment counts of an enrollment job by the job_id returned when it was created.",
+    )
+    def get(self, request: Request, course_id: int, job_id: int) -> Response:
+        # Users only see their own jobs, anything else is reported as not found
+        job = EnrollmentJob.objects.defer('report').filter(pk=job_id, course_id=course_id, user=request.user).first()
+        if job is None:
+            logger.info(f"Enrollment job {job_id} not found in course {course_id} for user {request.user.username}")
+            self.canvas_error.handle_canvas_api_exceptions(HTTPAPIError(str(job_id), ResourceDoesNotExist("Enrollment job not found")))
+            return Response(self.canvas_error.to_dict(), status=self.canvas_error.to_dict().get('statusCode'))
+        return Response(get_enrollment_progress(job), status=HTTPStatus.OK)
+
+class EnrollmentReportTokenAuthentication(authentication.BaseAuthentication):
+    """
+    Authenticates a request carrying a valid report token as the owner of the job it was signed for,
+    so the link in a summary email works without a session for ENROLLMENT_REPORT_LINK_MAX_AGE_SECONDS.
+    request.auth is the id of that job, the only one the token grants.
+    """
+    def authenticate(self, request):
+        token = request.query_params.get('token')
+        if not token:
+            return None
+        grant = enrollment_report_token_grant(token)
+        if grant is None:
+            raise exceptions.AuthenticationFailed("Invalid or expired report link")
+        job_id, user_id = grant
+        user = get_user_model().objects.filter(pk=user_id, is_active=True).first()
+        if user is None:
+            raise exceptions.AuthenticationFailed("Invalid or expired report link")
+        return user, job_id
+
+class EnrollmentJobReportAPIHandler(APIView):
+    """
+    API handler downloading the CSV report of the failed and skipped rows of an enrollment job, linked from its summary email.
+    Not logged by LoggingMixin, whose records would keep the report and the login ids in it.
+    """
+    authentication_classes = [authentication.SessionAuthentication, EnrollmentReportTokenAuthentication]
+    permission_classes = [permissions.IsAuthenticated]
+
+    def __init__(self):
+        self.canvas_error = CanvasErrorHandler()
+        super().__init__()
+
+    @extend_schema(
+        operation_id="get_enrollment_job_report",
+        description="Download the CSV report of the failed and skipped enrollments of an enrollment job by the job_id returned when it was created.",
+    )
+    def get(self, request: Request, course_id: int, job_id: int) -> Response:
+        # Only the owner of the job downloads its report, and a report token only grants the job it was signed for
+        job = None
+        if request.auth is None or request.auth == job_id:
+            job = EnrollmentJob.objects.filter(pk=job_id, course_id=course_id, user=request.user).first()
+        if job is None:
+            logger.info(f"Enrollment job {job_id} not found in course {course_id} for user {request.user.username}")
+            self.canvas_error.handle_canvas_api_exceptions(HTTPAPIError(str(job_id), ResourceDoesNotExist("Enrollment job not found")))
+            return Response(self.canvas_error.to_dict(), status=self.canvas_error.to_dict().get('statusCode'))
+
+        report = get_enrollment_job_report(job)
+        # The report is stored compressed, it is only decompressed for clients that do not accept gzip
+        accepts_gzip = 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', '')
+        response = HttpResponse(report if accepts_gzip else gzip.decompress(report), content_type='text/csv')
+        if accepts_gzip:
+            response['Content-Encoding'] = 'gzip'
+        patch_vary_headers(response, ['Accept-Encoding'])
+        response['Content-Disposition'] = f'attachment; filename="course_{course_id}_enrollment_report.csv"'
+        return response
@@ -45,11 +45,11 @@ class CanvasErrorHandler():
     def __init__(self) -> None:
         self.errors = []
     
-    def handle_serializer_errors(self, serializer_errors: dict, input: str):
+    def handle_serializer_errors(self, serializer_errors: dict, input: str, status_code: int = HTTPStatus.INTERNAL_SERVER_ERROR.value):
       logger.error(f"Serializer error: {serializer_errors} occured during the API call.")
       # Create a SerializerError instance and pass it to CanvasHTTPError
       self.errors.append({
-                "canvasStatusCode": HTTPStatus.INTERNAL_SERVER_ERROR.value,
+                "canvasStatusCode": status_code,
                 "message": str(serializer_errors),
                 "failedInput": input
             })
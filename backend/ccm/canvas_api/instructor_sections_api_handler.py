@@ -10,11 +10,12 @@ from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
 
 from canvasapi.exceptions import CanvasException
-from canvasapi.course import Course
 from asgiref.sync import async_to_sync
-from backend.ccm.canvas_api.constants import MAX_CONCURRENCY
+from backend.ccm.canvas_api.constants import CANVAS_RATE_LIMIT_MAX_CONCURRENCY
 
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
+from backend.ccm.canvas_api.section_cache import get_course_section_rows
 from backend.ccm.canvas_api.canvasapi_serializer import CanvasObjectROSerializer, InstructorSectionsQuerySerializer
 from backend.ccm.canvas_api.exceptions import CanvasErrorHandler, HTTPAPIError
 from backend.ccm.utils import timeit
@@ -60,8 +61,7 @@ class CanvasInstructorSectionsAPIHandler(LoggingMixin, APIView):
 
         canvas_api = self.credential_manager.get_canvasapi_instance(request)
         try:
-            filtered_courses, course_instance_map = self._get_filtered_teacher_courses(canvas_api, term_id)
-            success,response_data = self._attach_sections_to_courses(filtered_courses, course_instance_map)
+            success,response_data = self._get_term_courses_with_sections(canvas_api, term_id)
             
             if not success: # Errors occurred during section fetching
                 self.canvas_error.handle_canvas_api_exceptions(response_data)
@@ -73,51 +73,60 @@ class CanvasInstructorSectionsAPIHandler(LoggingMixin, APIView):
             logger.error(f"Error retrieving instructor sections for user id {request.user.id}")
             return Response(self.canvas_error.to_dict(), status=self.canvas_error.to_dict().get('statusCode'))
 
-    def _get_filtered_teacher_courses(self, canvas_api: Canvas, term_id: str) -> tuple[list[dict], dict[int, Course]]:
-        """Fetch and filter teacher courses by term_id and a map of the course instances. Returns (filtered_courses, course_instance_map)."""
+    @async_to_sync
+    async def _get_term_courses_with_sections(self, canvas_api: Canvas, term_id: str) -> tuple[bool, list[dict] | list[HTTPAPIError]]:
+        """ Fetch the teacher courses in term_id and attach their sections, sharing one client for all requests."""
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            filtered_courses = await self._get_filtered_teacher_courses(client, term_id)
+            return await self._attach_sections_to_courses(filtered_courses, client)
+
+    async def _get_filtered_teacher_courses(self, client: AsyncCanvasClient, term_id: str) -> list[dict]:
+        """
+        Fetch teacher courses in a single pass and filter them by term_id as each page arrives.
+        The Canvas courses endpoint has no term filter, so pages of 100 keep the walk over historic courses short.
+        """
         logger.info(f"Retrieving instructor courses for term_id: {term_id}")
         try:
-            courses = canvas_api.get_courses(enrollment_type='teacher')
-            course_instance_map: dict[int, Course] = {course.id: course for course in list(courses)}
-            serializer = CanvasObjectROSerializer(courses, allowed_fields=self.courses_allowed_fields, many=True)
-            filtered_courses: list[dict] = [course for course in serializer.data if course.get('enrollment_term_id') == int(term_id)]
+            serializer = CanvasObjectROSerializer(allowed_fields=self.courses_allowed_fields)
+            filtered_courses: list[dict] = [
+                serializer.to_representation(course)
+                async for course in client.get_paginated('courses', enrollment_type='teacher', per_page=100)
+                if course.get('enrollment_term_id') == int(term_id)
+            ]
             logger.info(f"Filtered to {len(filtered_courses)} courses for term_id {term_id}")
-            return filtered_courses, course_instance_map
+            return filtered_courses
         except (CanvasException, Exception) as e:
             failed_input = f"term_id {term_id}"
             raise HTTPAPIError(failed_input, e)
 
-    @async_to_sync
-    async def _attach_sections_to_courses(self, courses_data:list[dict] , course_instance_map:dict[int, Course]) -> tuple[bool, list[dict] | list[HTTPAPIError]]:
+    async def _attach_sections_to_courses(self, courses_data:list[dict] , client: AsyncCanvasClient) -> tuple[bool, list[dict] | list[HTTPAPIError]]:
         """ Attach sections to each course in courses_data, guarded by a semaphore for concurrency control."""
-        max_concurrent = MAX_CONCURRENCY 
+        max_concurrent = CANVAS_RATE_LIMIT_MAX_CONCURRENCY
         semaphore = asyncio.Semaphore(max_concurrent)
         errors = []
         tasks = [self._attach_section_semaphore_task(
             semaphore,
             errors,
-            course, 
-            course_instance_map.get(course.get('id'))
+            client,
+            course
         ) for course in courses_data]
         await asyncio.gather(*tasks, return_exceptions=True)
         
         success = len(errors) == 0 # boolean to indicate if errors occurred
         return success, courses_data if success else errors
     
-    async def _attach_section_semaphore_task(self, semaphore: asyncio.Semaphore, errors:list, course: dict, course_instance: Course):
+    async def _attach_section_semaphore_task(self, semaphore: asyncio.Semaphore, errors:list, client: AsyncCanvasClient, course: dict):
         """ For a given course, fetch and attach sections using a semaphore to limit concurrency. """
         async with semaphore:
             try:
-                return await asyncio.to_thread(self._attach_section_sync, course, course_instance)
+                return await self._attach_section(client, course)
             except Exception as e:
                 errors.append(e if isinstance(e, HTTPAPIError) else HTTPAPIError(f"course id {course.get('id')}", e))
     
-    def _attach_section_sync(self, course: dict, course_instance: Course):
-        """ Synchronous helper to fetch and attach sections to a course. """
+    async def _attach_section(self, client: AsyncCanvasClient, course: dict):
+        """ Attach the section rows of a course, projected onto sections_allowed_fields, from the section cache or Canvas. """
         try:
-            sections = course_instance.get_sections(include=['total_students'], per_page=100)
-            section_serializer = CanvasObjectROSerializer(sections, allowed_fields=self.sections_allowed_fields, many=True)
-            course['sections'] = section_serializer.data
+            course['sections'] = await get_course_section_rows(client, course.get('id'), self.sections_allowed_fields)
             logger.info(f"Attached {len(course['sections'])} sections to course_id {course.get('id')}")
         except (CanvasException, Exception) as e:
             failed_input = f"course id {course.get('id')}"
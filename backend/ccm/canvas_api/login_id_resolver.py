@@ -0,0 +1,102 @@
+"""
+Resolution of enrollment login IDs to numeric Canvas user IDs, with extra calls only where they are reused.
+
+Users are enrolled by sis_login_id unless their Canvas user ID is in a short-lived Redis cache, which is filled
+from the user_id of each successful enrollment. Only login IDs listed in more than one row of a request or job
+chunk are looked up before enrolling, with GET users/sis_login_id:<login ID> on the enrolling user's client in
+bounded concurrent batches: the lookup replaces the sis_login_id resolution of each of their rows, and a login ID
+Canvas does not know fails all its rows locally. A single-row login ID is enrolled straight by sis_login_id, since
+a lookup would double its calls, and a repeated one whose lookup failed otherwise (e.g. a user the instructor
+cannot see yet) is too.
+"""
+
+import asyncio
+import logging
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from canvasapi.exceptions import ResourceDoesNotExist
+from django.core.cache import cache
+
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
+from backend.ccm.canvas_api.constants import CANVAS_USER_ID_CACHE_TIMEOUT_SECONDS, LOGIN_ID_RESOLUTION_BATCH_SIZE
+from backend.ccm.canvas_api.enroll_users import enroll_user_async, process_login_id
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class LoginIdResolution:
+    user_ids: dict[str, int] = field(default_factory=dict)
+    unknown_login_ids: set[str] = field(default_factory=set)
+    # Canvas user IDs looked up or learned from enrollments for this job, to be cached for later ones
+    learned_user_ids: dict[str, int] = field(default_factory=dict)
+
+    def user_id(self, login_id: str) -> int | None:
+        """
+        Canvas user ID of a login ID, or None when it is not known and has to be enrolled by sis_login_id.
+        Raises ResourceDoesNotExist, as the enrollment POST would, for login IDs Canvas does not know.
+        """
+        processed_login_id = process_login_id(login_id)
+        if processed_login_id in self.unknown_login_ids:
+            raise ResourceDoesNotExist(f"User not found: sis_login_id:{processed_login_id}")
+        return self.user_ids.get(processed_login_id) or self.learned_user_ids.get(processed_login_id)
+
+def _user_id_key(processed_login_id: str) -> str:
+    return f"ccm:canvas_user_id:{processed_login_id}"
+
+async def load_login_id_resolution(client: AsyncCanvasClient, login_ids: Iterable[str]) -> LoginIdResolution:
+    """
+    Start a job's resolution from the cached Canvas user IDs of its login IDs, and look up the uncached
+    login IDs of more than one row.
+    """
+    resolution = LoginIdResolution()
+    row_counts = Counter(process_login_id(login_id) for login_id in login_ids)
+    keys = {_user_id_key(login_id): login_id for login_id in row_counts}
+    try:
+        cached = await cache.aget_many(keys.keys())
+        resolution.user_ids = {keys[key]: user_id for key, user_id in cached.items()}
+    except Exception as e:
+        logger.warning(f"Canvas user ID cache read failed: {e}")
+    repeated = sorted(login_id for login_id, count in row_counts.items() if count > 1 and login_id not in resolution.user_ids)
+    for start in range(0, len(repeated), LOGIN_ID_RESOLUTION_BATCH_SIZE):
+        batch = repeated[start:start + LOGIN_ID_RESOLUTION_BATCH_SIZE]
+        await asyncio.gather(*[_look_up_login_id(client, resolution, login_id) for login_id in batch])
+    return resolution
+
+async def _look_up_login_id(client: AsyncCanvasClient, resolution: LoginIdResolution, processed_login_id: str) -> None:
+    try:
+        response = await client.request("GET", f"users/sis_login_id:{processed_login_id}")
+        resolution.learned_user_ids[processed_login_id] = int(response.json()['id'])
+    except ResourceDoesNotExist:
+        resolution.unknown_login_ids.add(processed_login_id)
+    except Exception as e:
+        # The enrollment POSTs by sis_login_id report what is wrong with this user
+        logger.debug(f"Could not look up login ID {processed_login_id}: {e}")
+
+async def save_login_id_resolution(resolution: LoginIdResolution) -> None:
+    """ Cache the Canvas user IDs learned for the job. Unknown login IDs are not cached, external users are created right before they are enrolled. """
+    if not resolution.learned_user_ids:
+        return
+    try:
+        await cache.aset_many(
+            {_user_id_key(login_id): user_id for login_id, user_id in resolution.learned_user_ids.items()},
+            CANVAS_USER_ID_CACHE_TIMEOUT_SECONDS
+        )
+    except Exception as e:
+        logger.warning(f"Canvas user ID cache write failed: {e}")
+    logger.info(
+        f"Learned {len(resolution.learned_user_ids)} Canvas user IDs "
+        f"({len(resolution.user_ids)} were cached, {len(resolution.unknown_login_ids)} login IDs unknown)"
+    )
+
+async def enroll_resolving_login_id(client: AsyncCanvasClient, resolution: LoginIdResolution, section_id: int, login_id: str, role: str):
+    """
+    Enroll a user through the job's resolution: by Canvas user ID when it is known, else by sis_login_id.
+    Same result and canvasapi exceptions as enroll_user_async; unknown login IDs raise without calling Canvas.
+    """
+    user_id = resolution.user_id(login_id)
+    enrollment = await enroll_user_async(client, section_id, login_id, role, user_id)
+    if user_id is None and enrollment.get('user_id') is not None:
+        resolution.learned_user_ids[process_login_id(login_id)] = int(enrollment['user_id'])
+    return enrollment
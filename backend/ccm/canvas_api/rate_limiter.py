@@ -0,0 +1,147 @@
+"""
+Adaptive (AIMD) concurrency limit for Canvas API calls, shared by every request made with the same access token.
+
+Canvas throttles each token with a leaky bucket and reports what is left in X-Rate-Limit-Remaining.
+While the bucket stays above CANVAS_RATE_LIMIT_LOW_WATERMARK the limit grows additively (about one more
+concurrent call per round of responses, up to CANVAS_RATE_LIMIT_MAX_CONCURRENCY). When the bucket drains
+below it, or Canvas throttles a call, the limit is cut multiplicatively (at most once per cooldown, so one
+burst of responses does not collapse it to the minimum).
+
+Limiters are process-wide and used from the event loops of several async_to_sync calls at once,
+so their state is guarded by a threading.Lock and waiters are woken on their own loop.
+"""
+
+import asyncio
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from backend.ccm.canvas_api.constants import (
+    CANVAS_CLIENT_REGISTRY_MAX_SIZE, CANVAS_RATE_LIMIT_DECREASE_COOLDOWN_SECONDS, CANVAS_RATE_LIMIT_DECREASE_FACTOR,
+    CANVAS_RATE_LIMIT_LOW_WATERMARK, CANVAS_RATE_LIMIT_MAX_CONCURRENCY, CANVAS_RATE_LIMIT_MIN_CONCURRENCY, MAX_CONCURRENCY
+)
+
+logger = logging.getLogger(__name__)
+
+class AdaptiveConcurrencyLimiter:
+
+    def __init__(
+        self,
+        initial_limit: int = MAX_CONCURRENCY,
+        min_limit: int = CANVAS_RATE_LIMIT_MIN_CONCURRENCY,
+        max_limit: int = CANVAS_RATE_LIMIT_MAX_CONCURRENCY,
+        low_watermark: float = CANVAS_RATE_LIMIT_LOW_WATERMARK,
+        decrease_factor: float = CANVAS_RATE_LIMIT_DECREASE_FACTOR,
+        decrease_cooldown: float = CANVAS_RATE_LIMIT_DECREASE_COOLDOWN_SECONDS
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.low_watermark = low_watermark
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+        self.in_flight = 0
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+        self._waiters: deque[tuple[asyncio.AbstractEventLoop, asyncio.Future]] = deque()
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """ Hold one of the concurrent call slots for the duration of the block. """
+        await self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self) -> None:
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            if not self._waiters and self.in_flight < int(self.limit):
+                self.in_flight += 1
+                return
+            waiter = (loop, loop.create_future())
+            self._waiters.append(waiter)
+        try:
+            await waiter[1]
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    granted = False
+                else:
+                    # Handed a slot by _wake_waiters(); _grant() gives it back unless it already ran
+                    granted = waiter[1].done() and not waiter[1].cancelled()
+            if granted:
+                self.release()
+            raise
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._wake_waiters()
+
+    def on_response(self, rate_limit_remaining: float | None) -> None:
+        """ Adjust the limit from the X-Rate-Limit-Remaining of a successful (not throttled) response. """
+        with self._lock:
+            if rate_limit_remaining is not None and rate_limit_remaining < self.low_watermark:
+                self._decrease()
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake_waiters()
+
+    def on_throttled(self) -> None:
+        with self._lock:
+            self._decrease()
+
+    def _decrease(self) -> None:
+        now = time.monotonic()
+        if now - self._last_decrease < self.decrease_cooldown:
+            return
+        self._last_decrease = now
+        self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+        logger.info(f"Canvas rate limit bucket draining, concurrency limit lowered to {int(self.limit)}")
+
+    def _wake_waiters(self) -> None:
+        while self._waiters and self.in_flight < int(self.limit):
+            loop, future = self._waiters.popleft()
+            self.in_flight += 1
+            try:
+                loop.call_soon_threadsafe(self._grant, future)
+            except RuntimeError:
+                # The waiter's event loop is already closed
+                self.in_flight -= 1
+
+    def _grant(self, future: asyncio.Future) -> None:
+        if future.done():
+            # The waiter was cancelled after being handed a slot
+            self.release()
+        else:
+            future.set_result(None)
+
+_limiters: OrderedDict[str, AdaptiveConcurrencyLimiter] = OrderedDict()
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(access_token: str) -> AdaptiveConcurrencyLimiter:
+    """
+    Return the limiter shared by all Canvas calls made with access_token, keyed by a hash of the token.
+    Least recently used limiters with no calls in flight are dropped past CANVAS_CLIENT_REGISTRY_MAX_SIZE.
+    """
+    key = hashlib.sha256(str(access_token).encode()).hexdigest()
+    with _limiters_lock:
+        limiter = _limiters.pop(key, None) or AdaptiveConcurrencyLimiter()
+        _limiters[key] = limiter
+        if len(_limiters) > CANVAS_CLIENT_REGISTRY_MAX_SIZE:
+            for idle_key in [k for k, v in _limiters.items() if v.in_flight == 0 and k != key]:
+                del _limiters[idle_key]
+                if len(_limiters) <= CANVAS_CLIENT_REGISTRY_MAX_SIZE:
+                    break
+    return limiter
+
+def clear_rate_limiters() -> None:
+    with _limiters_lock:
+        _limiters.clear()
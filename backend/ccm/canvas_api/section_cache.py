@@ -0,0 +1,82 @@
+"""
+Read-through cache (settings.CACHES, i.e. Redis) of the section rows returned by courses/:id/sections.
+
+Rows are cached per access token, so a user only ever sees sections Canvas returned for their own token.
+Each course has a generation counter that is part of the row keys; bumping it on section create, merge
+and unmerge invalidates the cached rows for every user at once. Cache failures are logged and fall back
+to Canvas rather than failing the request.
+"""
+
+import hashlib
+import logging
+from typing import Iterable
+
+from django.core.cache import cache
+
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient, get_paginated_rows
+from backend.ccm.canvas_api.constants import COURSE_SECTIONS_CACHE_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+def _generation_key(course_id: int) -> str:
+    return f"ccm:course_sections:{course_id}:generation"
+
+def _section_course_key(section_id: int) -> str:
+    return f"ccm:section_course:{section_id}"
+
+def _rows_key(course_id: int, generation: int, access_token: str, allowed_fields: set[str]) -> str:
+    token_hash = hashlib.sha256(str(access_token).encode()).hexdigest()[:32]
+    return f"ccm:course_sections:{course_id}:{generation}:{token_hash}:{','.join(sorted(allowed_fields))}"
+
+async def get_course_section_rows(client: AsyncCanvasClient, course_id: int, allowed_fields: set[str], **kwargs) -> list[dict]:
+    """
+    Return the section rows of a course projected onto allowed_fields, including total_students,
+    from the cache when present and otherwise from Canvas.
+    """
+    rows_key = None
+    try:
+        generation = await cache.aget(_generation_key(course_id), 0)
+        rows_key = _rows_key(course_id, generation, client.access_token, allowed_fields)
+        rows = await cache.aget(rows_key)
+        if rows is not None:
+            logger.debug(f"Section cache hit for course_id {course_id}")
+            return rows
+    except Exception as e:
+        logger.warning(f"Section cache read failed for course_id {course_id}: {e}")
+
+    rows = await get_paginated_rows(client, f"courses/{course_id}/sections", allowed_fields, include=['total_students'], **kwargs)
+    if rows_key:
+        # Remember which course each section belongs to, so unmerge can invalidate the course it leaves
+        entries = {_section_course_key(row['id']): course_id for row in rows if 'id' in row}
+        entries[rows_key] = rows
+        try:
+            await cache.aset_many(entries, COURSE_SECTIONS_CACHE_TIMEOUT_SECONDS)
+        except Exception as e:
+            logger.warning(f"Section cache write failed for course_id {course_id}: {e}")
+    return rows
+
+def get_cached_section_course_ids(section_ids: Iterable[int]) -> set[int]:
+    """
+    Return the ids of the courses whose cached section rows include any of section_ids.
+    """
+    try:
+        return set(cache.get_many([_section_course_key(section_id) for section_id in section_ids]).values())
+    except Exception as e:
+        logger.warning(f"Section cache lookup failed for section_ids {section_ids}: {e}")
+        return set()
+
+def invalidate_course_sections(course_ids: Iterable[int | None]) -> None:
+    """
+    Drop the cached section rows of each course, for every user.
+    """
+    for course_id in {course_id for course_id in course_ids if course_id is not None}:
+        generation_key = _generation_key(course_id)
+        try:
+            try:
+                cache.incr(generation_key)
+            except ValueError:
+                # Generation keys never expire, so a missing key means nothing was cached for the course yet
+                cache.add(generation_key, 1, timeout=None)
+            logger.debug(f"Invalidated section cache for course_id {course_id}")
+        except Exception as e:
+            logger.error(f"Section cache invalidation failed for course_id {course_id}: {e}")
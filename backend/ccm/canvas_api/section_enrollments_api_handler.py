@@ -3,6 +3,7 @@ from http import HTTPStatus
 import time
 import asyncio
 from datetime import datetime
+from django.conf import settings
 from django.urls import reverse
 from rest_framework.views import APIView
 from rest_framework import authentication, permissions
@@ -13,17 +14,23 @@ from asgiref.sync import async_to_sync
 
 from canvasapi.exceptions import CanvasException
 from canvasapi import Canvas
-from canvasapi.section import Section
 
-from backend.ccm.background_tasks.enroll_um_users_task import EnrollmentUser
-from backend.ccm.canvas_api.canvasapi_serializer import CanvasObjectROSerializer, MultiSectionEnrollRequestSerializer, SingleSectionEnrollRequestSerializer
-from backend.ccm.canvas_api.constants import MAX_CONCURRENCY
+from backend.ccm.background_tasks.enroll_um_users_task import EnrollmentUser, create_enrollment_job, requeue_stalled_enrollment_job
+from backend.ccm.background_tasks.enrollment_idempotency import (
+    claim_enrollment_submission, enrollment_submission_key, get_running_enrollment_job, release_enrollment_submission
+)
+from backend.ccm.canvas_api.canvasapi_serializer import MultiSectionEnrollRequestSerializer, SingleSectionEnrollRequestSerializer
+from backend.ccm.canvas_api.constants import CANVAS_RATE_LIMIT_MAX_CONCURRENCY, ENROLLMENT_INLINE_MAX_USERS
 
 from .exceptions import CanvasErrorHandler, HTTPAPIError
 from backend.ccm.utils import timeit
 
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
-from backend.ccm.canvas_api.enroll_users import enroll_user
+from backend.ccm.canvas_api.enroll_users import deduplicate_enrollments
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
+from backend.ccm.canvas_api.login_id_resolver import (
+    LoginIdResolution, enroll_resolving_login_id, load_login_id_resolution, save_login_id_resolution
+)
 
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from drf_spectacular.types import OpenApiTypes
@@ -72,22 +79,7 @@ class CanvasSectionEnrollmentsAPIHandler(LoggingMixin, APIView):
         canvas_api: Canvas = self.credential_manager.get_canvasapi_instance(request)
         section_ids = [int(section_id) for section_id in section_ids_param.split(',')]
         logger.info("Retrieving section enrollment data with section_ids: %s", section_ids)
-        unique_login_ids = set()  # Use a set to store unique login IDs
-        api_errors = []
-        for section_id in section_ids:
-            try:
-                requested_section = Section(canvas_api._Canvas__requester, {'id': section_id})
-                enrollments = requested_section.get_enrollments(include=['user'], per_page=100)
-                allowed_fields = {"user"}
-                serializer = CanvasObjectROSerializer(enrollments,allowed_fields=allowed_fields, many=True)
-                # Add login IDs to the set
-                for enrollment in serializer.data:
-                    unique_login_ids.add(enrollment['user']['login_id'])
-                logger.debug(f"Retrieved section and enrollments with section_id: {section_id}")
-            except (CanvasException, Exception) as e:
-                api_errors.append(HTTPAPIError(str(section_id), e))
-                logger.error(f"Error retrieving enrollments for section_id {section_id}: {e}")
-                continue
+        unique_login_ids, api_errors = self.get_enrolled_login_ids(canvas_api, section_ids)
         
         time_end = time.perf_counter()
         logger.info(f"Time taken to get enrollments: {time_end - time_start:.2f} seconds")
@@ -99,28 +91,142 @@ class CanvasSectionEnrollmentsAPIHandler(LoggingMixin, APIView):
     
         return Response(list(unique_login_ids), status=HTTPStatus.OK)
 
+    @async_to_sync
+    async def get_enrolled_login_ids(self, canvas_api: Canvas, section_ids: list[int]) -> tuple[set[str], list[HTTPAPIError]]:
+        """
+        Read the raw enrollment JSON of all sections concurrently, keeping only the user login IDs.
+        """
+        unique_login_ids = set()  # Use a set to store unique login IDs
+        semaphore = asyncio.Semaphore(CANVAS_RATE_LIMIT_MAX_CONCURRENCY)
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            tasks = [self.add_section_login_ids(semaphore, client, section_id, unique_login_ids) for section_id in section_ids]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        api_errors = [result for result in results if isinstance(result, HTTPAPIError)]
+        return unique_login_ids, api_errors
+
+    async def add_section_login_ids(self, semaphore: asyncio.Semaphore, client: AsyncCanvasClient, section_id: int, unique_login_ids: set[str]) -> HTTPAPIError | None:
+        """
+        Page through a section's enrollments, adding each login ID to unique_login_ids as it arrives.
+        """
+        async with semaphore:
+            try:
+                async for enrollment in client.get_paginated(f"sections/{section_id}/enrollments", include=['user']):
+                    unique_login_ids.add(enrollment['user']['login_id'])
+                logger.debug(f"Retrieved section and enrollments with section_id: {section_id}")
+            except (CanvasException, Exception) as e:
+                logger.error(f"Error retrieving enrollments for section_id {section_id}: {e}")
+                return HTTPAPIError(str(section_id), e)
+
+def enroll_request_error_status(serializer: SingleSectionEnrollRequestSerializer | MultiSectionEnrollRequestSerializer) -> int:
+    """ Conflicting roles for a user are a mistake in the request, other validation errors keep their status. """
+    if serializer.CONFLICTING_ROLES_ERROR in serializer.errors:
+        return HTTPStatus.BAD_REQUEST.value
+    return HTTPStatus.INTERNAL_SERVER_ERROR.value
+
 # Mixin for shared enrollment task logic
 class EnrollmentTaskMixin:
+    def dispatch_enrollments(self, request, course_id, enrollment_params, section_id=None, multi_section=False):
+        """
+        Enroll small requests right away and queue larger ones as enrollment jobs, by the number of users to enroll.
+        Inline enrollments return their results instead of a job_id, and send no summary email.
+        """
+        unique_params, _ = deduplicate_enrollments(enrollment_params)
+        if len(unique_params) <= ENROLLMENT_INLINE_MAX_USERS:
+            logger.info(f"Enrolling {len(unique_params)} users in course {course_id} inline")
+            return self.enroll_inline(request, enrollment_params)
+        return self.create_enrollment_task(request, course_id, enrollment_params, section_id=section_id, multi_section=multi_section)
+
+    def enroll_inline(self, request, enrollment_params):
+        """
+        Enroll the users within the request. Returns the enrollments with 201 when every row succeeded,
+        otherwise the Canvas error of each failed row with the error status; both report the duplicate rows that were skipped.
+        """
+        enrollment_params, skipped_params = deduplicate_enrollments(enrollment_params)
+        if skipped_params:
+            logger.info(f"Skipping {len(skipped_params)} duplicate enrollment rows: {skipped_params}")
+        canvas_api: Canvas = self.credential_manager.get_canvasapi_instance(request)
+        results = self.gather_enrollments(enrollment_params, canvas_api)
+        success_res = []
+        err_res = []
+        # asyncio gather preserves the order of enrollment_params, so we can match them with results
+        for param, result in zip(enrollment_params, results):
+            if isinstance(result, HTTPAPIError):
+                err_res.append(result)
+            elif isinstance(result, Exception):
+                err_res.append(HTTPAPIError(str(param), result))
+            else:
+                success_res.append(result)
+        if not err_res:
+            return Response({"enrollments": success_res, "skipped": skipped_params}, status=HTTPStatus.CREATED)
+        logger.error(f"{len(err_res)} of {len(enrollment_params)} inline enrollments failed")
+        self.canvas_error.handle_canvas_api_exceptions(err_res)
+        error_response = self.canvas_error.to_dict()
+        error_response['skipped'] = skipped_params
+        return Response(error_response, status=error_response.get('statusCode'))
+
+    @async_to_sync()
+    async def gather_enrollments(self, enrollment_users, canvas_api):
+        semaphore = asyncio.Semaphore(CANVAS_RATE_LIMIT_MAX_CONCURRENCY)
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            resolution = await load_login_id_resolution(client, (user['loginId'].lower() for user in enrollment_users))
+            tasks = [self.sem_task(semaphore, client, user, resolution) for user in enrollment_users]
+            results = await asyncio.gather(*tasks, return_exceptions=True)
+        await save_login_id_resolution(resolution)
+        return results
+
+    async def sem_task(self, semaphore, client: AsyncCanvasClient, enrollment_user: EnrollmentUser, resolution: LoginIdResolution):
+        section_id = enrollment_user['sectionId']
+        login_id = enrollment_user['loginId'].lower()
+        role = enrollment_user['role'].lower()
+        async with semaphore:
+            return await enroll_resolving_login_id(client, resolution, section_id, login_id, role)
+
     def create_enrollment_task(self, request, course_id, enrollment_params, section_id=None, multi_section=False):
         """
-        Helper to create async enrollment task and handle errors.
+        Helper to persist the enrollment job, create its async task and handle errors.
+        The job is identified by its job_id, which exists before the task is queued, so a repeat answered while the
+        first request is still queueing it gets a usable id.
+        A repeat of a request whose job is still running returns that job instead of creating another,
+        and queues the job again when it has stalled.
         Returns a Response object.
         """
+        submission_key = enrollment_submission_key(request.user.id, course_id, enrollment_params)
+        running_job = get_running_enrollment_job(submission_key)
+        if running_job is not None:
+            requeue_stalled_enrollment_job(running_job)
+            logger.info(f"Enrollment request repeats running job {running_job.id}")
+            return Response({"job_id": running_job.id}, status=HTTPStatus.OK)
+
         timestamp = datetime.now().strftime('%Y/%m/%d-%H:%M:%S-%f')
         if multi_section:
             task_name = f'c{course_id}-multisections-{len(enrollment_params)}-{timestamp}'
         else:
             task_name = f'c{course_id}-s{section_id}-{len(enrollment_params)}-{timestamp}'
-        task_payload = {
-            'enrollment_params': enrollment_params,
-            'course_id': course_id,
-            'user_id': request.user.id,
-            'canvas_callback_url': request.build_absolute_uri(reverse('canvas-oauth-callback')),
-        }
+        job = create_enrollment_job(
+            request.user,
+            course_id,
+            request.build_absolute_uri(reverse('canvas-oauth-callback')),
+            enrollment_params,
+            task_name=task_name,
+            submission_key=submission_key
+        )
+        running_job = claim_enrollment_submission(submission_key, job)
+        if running_job != job:
+            # An identical request created its job while this one was being stored
+            job.delete()
+            return Response({"job_id": running_job.id}, status=HTTPStatus.OK)
         try:
-            task_id = async_task('backend.ccm.background_tasks.enroll_um_users_task.enroll_um_users', task=task_payload, task_name=task_name)
-            return Response({"task_id": task_id}, status=HTTPStatus.OK)
+            task_id = async_task(
+                'backend.ccm.background_tasks.enroll_um_users_task.enroll_um_users',
+                task={'job_id': job.id}, task_name=task_name, cluster=settings.Q_ENROLLMENT_CLUSTER
+            )
+            job.task_id = task_id
+            job.save(update_fields=['task_id'])
+            logger.info(f"Queued enrollment job {job.id} as task {task_id}")
+            return Response({"job_id": job.id}, status=HTTPStatus.OK)
         except Exception as e:
+            release_enrollment_submission(job)
+            job.delete()
             self.canvas_error.django_q_task_error(e, str(request.data))
             error_response = self.canvas_error.to_dict()
             return Response(error_response, status=error_response.get('statusCode'))
@@ -141,7 +247,7 @@ class SingleSectionEnrollmentView(EnrollmentTaskMixin, LoggingMixin, APIView):
         serializer: SingleSectionEnrollRequestSerializer = SingleSectionEnrollRequestSerializer(data=request.data)
         
         if not serializer.is_valid():
-            self.canvas_error.handle_serializer_errors(serializer.errors, str(request.data))
+            self.canvas_error.handle_serializer_errors(serializer.errors, str(request.data), enroll_request_error_status(serializer))
             error_response = self.canvas_error.to_dict()
             return Response(error_response, status=error_response.get('statusCode'))
         
@@ -152,35 +258,11 @@ class SingleSectionEnrollmentView(EnrollmentTaskMixin, LoggingMixin, APIView):
         
         if not course_id:
             logger.info(f"Starting enrollment for create external user enroll flow {len(enrollment_params)} users")
-            canvas_api: Canvas = self.credential_manager.get_canvasapi_instance(request)
-            results = self.gather_enrollments(enrollment_params, canvas_api)
-            success_res = [result for result in results if isinstance(result, dict)]
-            err_res = [res for res in results if isinstance(res, HTTPAPIError)]
-            if not err_res:
-                return Response(success_res, status=HTTPStatus.CREATED)
-            self.canvas_error.handle_canvas_api_exceptions(err_res)
-            return Response(self.canvas_error.to_dict(), status=self.canvas_error.to_dict().get('statusCode'))
+            return self.enroll_inline(request, enrollment_params)
 
         else:
             logger.info(f"Enroll users in course {course_id}, section {section_id}")
-            return self.create_enrollment_task(request, course_id, enrollment_params, section_id=section_id, multi_section=False)
-    
-    @async_to_sync()
-    async def gather_enrollments(self, enrollment_users, canvas_api):
-        semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
-        tasks = [self.sem_task(semaphore, canvas_api, user) for user in enrollment_users]
-        return await asyncio.gather(*tasks, return_exceptions=True)
-
-    async def sem_task(self, semaphore, canvas_api, enrollment_user: EnrollmentUser):
-        section_id = enrollment_user['sectionId']
-        login_id = enrollment_user['loginId'].lower()
-        role = enrollment_user['role'].lower()
-        async with semaphore:
-            return await self.enroll_user_async(canvas_api, section_id, login_id, role)
-
-    async def enroll_user_async(self, canvas_api, section_id, login_id, role):
-      # Wrap the sync function in a coroutine for compatibility
-      return await asyncio.to_thread(enroll_user, canvas_api, section_id, login_id, role)
+            return self.dispatch_enrollments(request, course_id, enrollment_params, section_id=section_id, multi_section=False)
 
 class MultiSectionEnrollmentView(EnrollmentTaskMixin, LoggingMixin, APIView):
     authentication_classes = [authentication.SessionAuthentication]
@@ -202,9 +284,9 @@ class MultiSectionEnrollmentView(EnrollmentTaskMixin, LoggingMixin, APIView):
         serializer: MultiSectionEnrollRequestSerializer = MultiSectionEnrollRequestSerializer(data=request.data)
         
         if not serializer.is_valid():
-            self.canvas_error.handle_serializer_errors(serializer.errors, str(request.data))
+            self.canvas_error.handle_serializer_errors(serializer.errors, str(request.data), enroll_request_error_status(serializer))
             error_response = self.canvas_error.to_dict()
             return Response(error_response, status=error_response.get('statusCode'))
         
         enrollment_params = serializer.validated_data.get('enrollments', {})
-        return self.create_enrollment_task(request, course_id, enrollment_params, multi_section=True)
+        return self.dispatch_enrollments(request, course_id, enrollment_params, multi_section=True)
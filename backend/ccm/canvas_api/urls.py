@@ -7,6 +7,7 @@ from backend.ccm.canvas_api.course_section_api_handler import CanvasMergeSection
 from backend.ccm.canvas_api.section_enrollments_api_handler import CanvasSectionEnrollmentsAPIHandler, SingleSectionEnrollmentView, MultiSectionEnrollmentView
 from backend.ccm.canvas_api.instructor_sections_api_handler import CanvasInstructorSectionsAPIHandler
 from backend.ccm.canvas_api.canvas_create_user_handler import CanvasCreateUserHandler
+from backend.ccm.canvas_api.enrollment_job_api_handler import EnrollmentJobProgressAPIHandler, EnrollmentJobReportAPIHandler
 
 urlpatterns = [
   path('course/<int:course_id>', CanvasCourseAPIHandler.as_view() , name='course'),
@@ -14,6 +15,8 @@ urlpatterns = [
   path('sections/students', CanvasSectionEnrollmentsAPIHandler.as_view() , name='sectionEnrollments'),
   path('course/<int:course_id>/sections/<int:section_id>/enroll', SingleSectionEnrollmentView.as_view(), name='singleSectionEnrollments'),
   path('course/<int:course_id>/sections/enroll', MultiSectionEnrollmentView.as_view(), name='multipleSectionEnrollments'),
+  path('course/<int:course_id>/enrollment-jobs/<int:job_id>', EnrollmentJobProgressAPIHandler.as_view(), name='enrollmentJobProgress'),
+  path('course/<int:course_id>/enrollment-jobs/<int:job_id>/report', EnrollmentJobReportAPIHandler.as_view(), name='enrollmentJobReport'),
   path('instructor/sections', CanvasInstructorSectionsAPIHandler.as_view(), name='instructorSections'),
   path('admin/sections/', CanvasAdminSectionsAPIHandler.as_view(), name='adminSections'),
   path('admin/user/<str:login_id>', CanvasUserHandler.as_view(), name='checkUser'),
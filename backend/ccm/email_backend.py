@@ -0,0 +1,95 @@
+"""
+SMTP email backend that keeps sessions open for the lifetime of the process.
+
+Django's SMTP backend connects, runs STARTTLS and logs in for every email sent without an open
+connection, and quits when the call is done. This backend returns the session to a process-wide pool on close
+instead, and the next send takes it from the pool after a NOOP health check, so summary and invitation emails
+sent by the same qcluster worker share warm sessions. Sessions idle for longer than EMAIL_POOL_IDLE_TIMEOUT
+seconds are closed rather than reused, since servers drop idle sessions. The default outlasts the one minute
+between email outbox drains, so each drain reuses the sessions of the previous one.
+
+Enable with EMAIL_BACKEND=backend.ccm.email_backend.PooledSMTPEmailBackend.
+"""
+
+import atexit
+import logging
+import threading
+import time
+from smtplib import SMTP
+
+from django.conf import settings
+from django.core.mail.backends.smtp import EmailBackend
+
+logger = logging.getLogger(__name__)
+
+class SMTPConnectionPool:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._idle: dict[tuple, list[tuple[SMTP, float]]] = {}
+
+    @staticmethod
+    def _quit(connection: SMTP) -> None:
+        try:
+            connection.quit()
+        except Exception:
+            connection.close()
+
+    def checkout(self, key: tuple) -> SMTP | None:
+        """ Take the most recently used healthy session for key, or None when there is none. """
+        idle_timeout = getattr(settings, 'EMAIL_POOL_IDLE_TIMEOUT', 300)
+        while True:
+            with self._lock:
+                sessions = self._idle.get(key)
+                if not sessions:
+                    return None
+                connection, returned_at = sessions.pop()
+            if time.monotonic() - returned_at > idle_timeout:
+                self._quit(connection)
+                continue
+            try:
+                if connection.noop()[0] == 250:
+                    return connection
+            except Exception as e:
+                logger.debug(f"Pooled SMTP session failed its health check: {e}")
+            self._quit(connection)
+
+    def checkin(self, key: tuple, connection: SMTP) -> bool:
+        """ Keep the session for reuse, returning False when the pool for key is full. """
+        max_idle = getattr(settings, 'EMAIL_POOL_MAX_IDLE_CONNECTIONS', 5)
+        with self._lock:
+            sessions = self._idle.setdefault(key, [])
+            if len(sessions) >= max_idle:
+                return False
+            sessions.append((connection, time.monotonic()))
+        return True
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for sessions in idle.values():
+            for connection, _ in sessions:
+                self._quit(connection)
+
+smtp_connection_pool = SMTPConnectionPool()
+atexit.register(smtp_connection_pool.close_all)
+
+class PooledSMTPEmailBackend(EmailBackend):
+
+    def _pool_key(self) -> tuple:
+        return (self.host, self.port, self.username, self.use_tls, self.use_ssl)
+
+    def open(self):
+        if self.connection:
+            return False
+        self.connection = smtp_connection_pool.checkout(self._pool_key())
+        if self.connection is not None:
+            return True
+        return super().open()
+
+    def close(self):
+        if self.connection is not None and self._partial_connection is None:
+            if smtp_connection_pool.checkin(self._pool_key(), self.connection):
+                self.connection = None
+                return
+        super().close()
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def create_email_outbox_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+    Schedule.objects.update_or_create(
+        name='send-outbox-emails',
+        defaults={
+            'func': 'backend.ccm.background_tasks.email_outbox_task.send_outbox_emails',
+            'schedule_type': 'I',
+            'minutes': 1,
+            'repeats': -1,
+            # Without a cluster the schedulers of both clusters would run it, the enrollment cluster only runs enrollment jobs
+            'cluster': settings.Q_CLUSTER['name'],
+        },
+    )
+
+
+def delete_email_outbox_schedule(apps, schema_editor):
+    Schedule = apps.get_model('django_q', 'Schedule')
+    Schedule.objects.filter(name='send-outbox-emails').delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ccm', '0002_enrollment_jobs_and_email_outbox'),
+        ('django_q', '0019_alter_task_options_alter_ormq_key_alter_ormq_lock_and_more'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_email_outbox_schedule, delete_email_outbox_schedule),
+    ]
@@ -1,3 +1,85 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
-# Create your models here.
+
+class EnrollmentJob(models.Model):
+    """
+    A bulk enrollment request, processed in chunks of EnrollmentJobRow by django-q tasks.
+    completed_at is set once every row has finished and the summary email has been queued in the email outbox.
+    submission_key is the Redis key that makes repeated identical requests return this job while it runs.
+    report is the gzip compressed CSV of the failed and skipped rows, generated on its first download after completion.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='enrollment_jobs')
+    course_id = models.BigIntegerField()
+    canvas_callback_url = models.CharField(max_length=2048)
+    task_name = models.CharField(max_length=255, blank=True)
+    task_id = models.CharField(max_length=32, blank=True, db_index=True)
+    submission_key = models.CharField(max_length=128, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    report = models.BinaryField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Enrollment job {self.pk} for course {self.course_id}'
+
+
+class EnrollmentJobRow(models.Model):
+    """
+    One user to enroll in a section. Rows are claimed chunk by chunk, so a retried chunk task
+    only processes rows that are still pending or whose previous run was abandoned.
+    Duplicate rows of the request are stored as skipped and never sent to Canvas.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        RUNNING = 'running'
+        SUCCEEDED = 'succeeded'
+        FAILED = 'failed'
+        SKIPPED = 'skipped'
+
+    job = models.ForeignKey(EnrollmentJob, on_delete=models.CASCADE, related_name='rows')
+    chunk = models.PositiveIntegerField()
+    section_id = models.BigIntegerField()
+    login_id = models.CharField(max_length=255)
+    role = models.CharField(max_length=50)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['job', 'chunk', 'status'])]
+
+    def __str__(self):
+        return f'{self.login_id} ({self.role}) in section {self.section_id}: {self.status}'
+
+
+class EmailOutbox(models.Model):
+    """
+    An email waiting to be sent. Callers insert rows, in their own transaction, instead of talking to SMTP,
+    and the send_outbox_emails schedule sends due rows in batches, retrying failures with backoff.
+    Rows with the same dedup_key are queued once.
+    """
+    class Status(models.TextChoices):
+        PENDING = 'pending'
+        SENT = 'sent'
+        FAILED = 'failed'
+
+    to_email = models.CharField(max_length=254)
+    subject = models.CharField(max_length=998)
+    body = models.TextField()
+    attachment_name = models.CharField(max_length=255, blank=True)
+    attachment_content = models.BinaryField(blank=True, default=b'')
+    attachment_mime_type = models.CharField(max_length=100, blank=True)
+    dedup_key = models.CharField(max_length=255, null=True, blank=True, unique=True)
+    status = models.CharField(max_length=16, choices=Status.choices, default=Status.PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'])]
+
+    def __str__(self):
+        return f'Email to {self.to_email}: {self.status}'
@@ -0,0 +1,12 @@
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from canvas_oauth.models import CanvasOAuth2Token
+
+from backend.ccm.canvas_api.canvas_credential_manager import canvas_client_registry
+
+@receiver(post_delete, sender=CanvasOAuth2Token)
+def evict_canvas_client_for_deleted_token(sender, instance: CanvasOAuth2Token, **kwargs):
+    """
+    Tokens are deleted when Canvas rejects them, so drop the pooled Canvas client built with that token.
+    """
+    canvas_client_registry.invalidate(instance.access_token)
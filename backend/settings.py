@@ -325,6 +325,9 @@ SPECTACULAR_SETTINGS = {
 DRF_TRACKING_ADMIN_LOG_READONLY = True
 
 # https://django-q2.readthedocs.io/en/master/configure.html
+# Enrollment batches run in their own queue, served by a separate qcluster, so a large enrollment job
+# does not hold up small interactive tasks like invitation emails in the default queue
+Q_ENROLLMENT_CLUSTER = os.getenv('Q_ENROLLMENT_CLUSTER', 'CCM_Enrollments')
 Q_CLUSTER = {
     'name': 'CCM_Cluster',
     'workers': int(os.getenv('Q_CLUSTER_WORKERS', 4)),
@@ -332,8 +335,18 @@ Q_CLUSTER = {
     'retry': int(os.getenv('Q_CLUSTER_RETRY', 30 * 60)),      # 30 minutes in seconds
     'bulk': int(os.getenv('Q_CLUSTER_BULK', 5)),
     'max_attempts': int(os.getenv('Q_CLUSTER_MAX_ATTEMPTS', 1)),
-    'orm': 'default'
+    'ALT_CLUSTERS': {
+        Q_ENROLLMENT_CLUSTER: {
+            'workers': int(os.getenv('Q_ENROLLMENT_CLUSTER_WORKERS', 4)),
+        },
+    },
 }
+# The Redis broker does not poll the database, but it does not redeliver the tasks of a worker that died,
+# so an interrupted enrollment chunk is only resumed when its job is dispatched again
+if os.getenv('Q_CLUSTER_BROKER', 'orm').lower() == 'redis':
+    Q_CLUSTER['redis'] = os.getenv('Q_CLUSTER_REDIS_LOCATION', CACHES['default']['LOCATION'])
+else:
+    Q_CLUSTER['orm'] = 'default'
 
 # Custom Canvas Roles
 DEFAULT_CUSTOM_CANVAS_ROLES = {'assistant': 34, 'librarian': 21}
@@ -349,6 +362,9 @@ EMAIL_PORT = int(os.getenv('EMAIL_PORT', 587))
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 EMAIL_USE_TLS = True
+# Idle SMTP sessions kept per process by backend.ccm.email_backend.PooledSMTPEmailBackend, and seconds before an idle one is closed
+EMAIL_POOL_MAX_IDLE_CONNECTIONS = int(os.getenv('EMAIL_POOL_MAX_IDLE_CONNECTIONS', 5))
+EMAIL_POOL_IDLE_TIMEOUT = int(os.getenv('EMAIL_POOL_IDLE_TIMEOUT', 300))
 
 EMAIL_FROM = os.getenv('EMAIL_FROM', 'canvas-ccm-system@umich.edu')
 EMAIL_TO_REPLY = os.getenv('EMAIL_TO_REPLY', '4help@umich.edu')
@@ -1,5 +1,7 @@
 
+import json
 from unittest.mock import patch, MagicMock
+from django.core.cache import cache
 from django.test import RequestFactory
 from django.urls import reverse
 from rest_framework.test import APITestCase
@@ -15,44 +17,39 @@ from backend.ccm.canvas_api.exceptions import HTTPAPIError
 from backend.ccm.canvas_api.admin_sections_api_handler import CanvasAdminSectionsAPIHandler
 from canvasapi.exceptions import ResourceDoesNotExist
 
-def make_mock_section(section_data={}):
-    """
-    Returns a MagicMock representing a Canvas Section, or raises an exception if specified.
-    section_data: dict of section fields (id, name, course_id, ...)
-    raise_exception: Exception to raise when accessed (simulates CanvasException)
-    """
-    mock_section = MagicMock()
-    if section_data:
-        for k, v in section_data.items():
-            setattr(mock_section, k, v)
-        # For serializer compatibility, support dict-like access
-        mock_section.__getitem__.side_effect = section_data.__getitem__
-        mock_section.get.side_effect = section_data.get
-    return mock_section
+# Raw section JSON (or the exception to raise) served by the fake AsyncCanvasClient, keyed by endpoint
+MOCK_SECTION_ROWS = {}
 
 def make_mock_course(id, name, enrollment_term_id, sections=[], raise_exception=False):
     """
-    Returns a MagicMock representing a Canvas Course, with a get_sections method.
-    sections: list of MagicMock sections or dicts (will be wrapped)
-    raise_exception: Exception to raise when get_sections is called
+    Returns a MagicMock representing a Canvas Course and registers its raw sections JSON.
+    sections: list of section dicts returned by the courses/:id/sections endpoint
+    raise_exception: Exception to raise when the sections are requested
     """
     mock_course = MagicMock()
     mock_course.id = id
     mock_course.name = name
     mock_course.enrollment_term_id = enrollment_term_id
-    if raise_exception:
-        mock_course.get_sections.side_effect = raise_exception
-    else:
-        # Accept both dicts and MagicMock sections
-        section_objs = []
-        for s in (sections):
-            if isinstance(s, dict):
-                section_objs.append(make_mock_section(s))
-            else:
-                section_objs.append(s)
-        mock_course.get_sections.return_value = section_objs
+    MOCK_SECTION_ROWS[f'courses/{id}/sections'] = raise_exception or list(sections)
     return mock_course
 
+def make_mock_async_canvas_client():
+    """
+    Returns a MagicMock AsyncCanvasClient class whose client pages through MOCK_SECTION_ROWS.
+    """
+    async def get_paginated(endpoint, **kwargs):
+        rows = MOCK_SECTION_ROWS.get(endpoint, [])
+        if isinstance(rows, Exception):
+            raise rows
+        for row in rows:
+            yield row
+
+    mock_client = MagicMock()
+    mock_client.get_paginated.side_effect = get_paginated
+    mock_client_class = MagicMock()
+    mock_client_class.from_canvas.return_value.__aenter__.return_value = mock_client
+    return mock_client_class
+
 def make_mock_account(id, parent_account_id, courses=[], raise_exception=False):
     """
     Returns a MagicMock representing a Canvas Account, with get_courses method.
@@ -84,6 +81,11 @@ class CanvasAdminSectionsAPIHandlerTests(APITestCase):
         self.client.force_authenticate(user=self.user)
         self.url = reverse('adminSections')
         self.request_factory = RequestFactory()
+        cache.clear()
+        MOCK_SECTION_ROWS.clear()
+        client_patcher = patch('backend.ccm.canvas_api.admin_sections_api_handler.AsyncCanvasClient', make_mock_async_canvas_client())
+        client_patcher.start()
+        self.addCleanup(client_patcher.stop)
 
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_get_admin_sections_by_instructor_name_success(self, mock_get_canvasapi_instance):
@@ -168,6 +170,56 @@ class CanvasAdminSectionsAPIHandlerTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, [])
 
+    @patch('backend.ccm.canvas_api.admin_sections_api_handler.Account')
+    @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
+    def test_get_admin_sections_uses_cached_accounts(self, mock_get_canvasapi_instance, mock_account_class):
+        mock_canvas = mock_get_canvasapi_instance.return_value
+        course1 = make_mock_course(1, 'Course 1', self.term_id, sections=[])
+        mock_canvas.get_accounts.return_value = [make_mock_account(10, None, courses=[course1]), make_mock_account(20, 10)]
+        mock_account_class.return_value = make_mock_account(10, None, courses=[course1])
+
+        first = self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}')
+        second = self.client.get(f'{self.url}?term_id={self.term_id}&course_name={self.course_name}')
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+        # The account tree is crawled once; the second search rebuilds the account from its cached id
+        mock_canvas.get_accounts.assert_called_once()
+        mock_account_class.assert_called_once_with(mock_canvas._Canvas__requester, {'id': 10})
+
+    @patch('backend.ccm.canvas_api.admin_sections_api_handler.Account')
+    @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
+    def test_get_admin_sections_refresh_accounts(self, mock_get_canvasapi_instance, mock_account_class):
+        mock_canvas = mock_get_canvasapi_instance.return_value
+        mock_canvas.get_accounts.return_value = [make_mock_account(10, None, courses=[])]
+        mock_account_class.return_value = make_mock_account(10, None, courses=[])
+        self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}')
+
+        course1 = make_mock_course(1, 'Course 1', self.term_id, sections=[])
+        mock_canvas.get_accounts.return_value = [make_mock_account(20, None, courses=[course1])]
+        cached = self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}')
+        refreshed = self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}&refresh_accounts=true')
+
+        self.assertEqual(cached.data, [])
+        self.assertEqual([course['id'] for course in refreshed.data], [1])
+        self.assertEqual(mock_canvas.get_accounts.call_count, 2)
+
+    @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
+    def test_get_admin_sections_no_accounts_not_cached(self, mock_get_canvasapi_instance):
+        mock_canvas = mock_get_canvasapi_instance.return_value
+        mock_canvas.get_accounts.return_value = []
+        empty = self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}')
+
+        # The admin is granted an account right after the first search, which the next search finds without refresh_accounts
+        course1 = make_mock_course(1, 'Course 1', self.term_id, sections=[])
+        mock_canvas.get_accounts.return_value = [make_mock_account(10, None, courses=[course1])]
+        granted = self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}')
+
+        self.assertEqual(empty.data, [])
+        self.assertEqual([course['id'] for course in granted.data], [1])
+        self.assertEqual(mock_canvas.get_accounts.call_count, 2)
+
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_get_admin_sections_exception_on_accounts(self, mock_get_canvasapi_instance):
         mock_canvas = mock_get_canvasapi_instance.return_value
@@ -213,6 +265,45 @@ class CanvasAdminSectionsAPIHandlerTests(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
         self.assertEqual(response.data, expected_dict)
 
+    @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
+    def test_get_admin_sections_stream(self, mock_get_canvasapi_instance):
+        mock_canvas = mock_get_canvasapi_instance.return_value
+        section1 = {'id': 111, 'name': 'Section 1', 'course_id': 1, 'nonxlist_course_id': None, 'total_students': 10}
+        section2 = {'id': 121, 'name': 'Section 2', 'course_id': 2, 'nonxlist_course_id': None, 'total_students': 3}
+        course1 = make_mock_course(1, 'Course 1', self.term_id, sections=[section1])
+        course2 = make_mock_course(2, 'Course 2', self.term_id, sections=[section2])
+        mock_canvas.get_accounts.return_value = [make_mock_account(10, None, courses=[course1, course2])]
+
+        response = self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}&stream=true')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response).decode().splitlines()]
+        resp_by_course_id = {c['id']: c for c in lines}
+        self.assertEqual(set(resp_by_course_id), {1, 2})
+        self.assertEqual(resp_by_course_id[1]['sections'], [section1])
+        self.assertEqual(resp_by_course_id[2]['sections'], [section2])
+
+    @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
+    def test_get_admin_sections_stream_exception_on_sections(self, mock_get_canvasapi_instance):
+        mock_canvas = mock_get_canvasapi_instance.return_value
+        section1 = {'id': 111, 'name': 'Section 1', 'course_id': 1, 'nonxlist_course_id': None, 'total_students': 10}
+        course1 = make_mock_course(1, 'Course 1', self.term_id, sections=[section1])
+        course2 = make_mock_course(2, 'Course 2', self.term_id, raise_exception=CanvasException('Canvas API error'))
+        mock_canvas.get_accounts.return_value = [make_mock_account(10, None, courses=[course1, course2])]
+
+        response = self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}&stream=true')
+
+        # The failed course is reported in its own line and does not stop the other courses
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = [json.loads(line) for line in b''.join(response).decode().splitlines()]
+        self.assertEqual(len(lines), 2)
+        self.assertIn({'id': 1, 'name': 'Course 1', 'enrollment_term_id': self.term_id, 'sections': [section1]}, lines)
+        self.assertIn({
+            "statusCode": 500,
+            "errors": [{"canvasStatusCode": 500, "message": "Canvas API error", "failedInput": "course id 2"}]
+        }, lines)
+
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_get_admin_sections_too_many_courses(self, mock_get_canvasapi_instance):
         mock_canvas = mock_get_canvasapi_instance.return_value
@@ -424,6 +515,32 @@ class CanvasAdminSectionsAPIHandlerTests(APITestCase):
         # In this scenario no single account should have been advanced to MAX_SEARCH_COURSES by islice
         # (we used lists so there are no generator counters); success here is the handler returning the error
 
+    @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
+    def test_too_many_across_multiple_accounts_stops_all_paginations(self, mock_get_canvasapi_instance):
+        """The course budget is shared, so accounts stop paginating once their combined total reaches MAX_SEARCH_COURSES."""
+        mock_canvas = mock_get_canvasapi_instance.return_value
+        counter = {'count': 0}
+
+        def gen_courses(aid):
+            for i in range(MAX_SEARCH_COURSES):
+                counter['count'] += 1
+                yield make_mock_course(aid * 1000 + i, f'Course {i}', self.term_id, sections=[])
+
+        accounts = []
+        for aid in range(5):
+            account = make_mock_account(100 + aid, None)
+            account.get_courses.return_value = gen_courses(aid)
+            accounts.append(account)
+        mock_canvas.get_accounts.return_value = accounts
+
+        response = self.client.get(f'{self.url}?term_id={self.term_id}&instructor_name={self.instructor_name}')
+
+        self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
+        self.assertEqual(len(response.data['errors']), 1)
+        self.assertIn(CanvasAdminSectionsAPIHandler.COURSE_LIMIT_ERROR_MESSAGE, response.data['errors'][0]['message'])
+        # Each other account reads at most one more course before it sees the exhausted budget
+        self.assertLessEqual(counter['count'], MAX_SEARCH_COURSES + len(accounts) - 1)
+
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_duplicate_too_many_errors_are_deduplicated(self, mock_get_canvasapi_instance):
         """If two accounts raise identical HTTPAPIError (same failed_input and message), the handler should dedupe them and return a single error."""
@@ -0,0 +1,152 @@
+from unittest.mock import MagicMock, patch
+from urllib.parse import parse_qsl
+
+import httpx
+from django.test import SimpleTestCase
+from canvasapi.exceptions import (
+    BadRequest, CanvasException, Forbidden, InvalidAccessToken, RateLimitExceeded, ResourceDoesNotExist, Unauthorized
+)
+
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient, get_paginated_rows
+from backend.ccm.canvas_api.canvas_credential_manager import CanvasClientRegistry, canvas_client_registry
+from backend.ccm.canvas_api.enroll_users import enroll_user_async
+from backend.ccm.canvas_api.rate_limiter import clear_rate_limiters
+
+BASE_URL = 'https://canvas.test.edu'
+
+def make_client(handler) -> AsyncCanvasClient:
+    return AsyncCanvasClient(BASE_URL, 'test_token', transport=httpx.MockTransport(handler))
+
+class AsyncCanvasClientTests(SimpleTestCase):
+
+    def setUp(self):
+        clear_rate_limiters()
+
+    async def test_request_sends_auth_header_and_form_data(self):
+        captured = {}
+        def handler(request: httpx.Request):
+            captured['request'] = request
+            return httpx.Response(200, json={'id': 1})
+
+        async with make_client(handler) as client:
+            response = await client.request('POST', 'sections/10/enrollments', enrollment={'type': 'StudentEnrollment'}, notify=False)
+
+        request = captured['request']
+        self.assertEqual(response.json(), {'id': 1})
+        self.assertEqual(str(request.url), f'{BASE_URL}/api/v1/sections/10/enrollments')
+        self.assertEqual(request.headers['Authorization'], 'Bearer test_token')
+        self.assertEqual(
+            parse_qsl(request.content.decode()),
+            [('enrollment[type]', 'StudentEnrollment'), ('notify', 'false')]
+        )
+
+    async def test_get_paginated_follows_link_header(self):
+        def handler(request: httpx.Request):
+            if request.url.params.get('page') == '2':
+                return httpx.Response(200, json=[{'id': 3}])
+            next_url = f'{BASE_URL}/api/v1/courses/1/sections?page=2&per_page=100'
+            return httpx.Response(200, json=[{'id': 1}, {'id': 2}], headers={'Link': f'<{next_url}>; rel="next"'})
+
+        async with make_client(handler) as client:
+            elements = [element async for element in client.get_paginated('courses/1/sections', include=['total_students'])]
+
+        self.assertEqual(elements, [{'id': 1}, {'id': 2}, {'id': 3}])
+
+    async def test_get_paginated_rows_projects_raw_json(self):
+        def handler(request: httpx.Request):
+            return httpx.Response(200, json=[
+                {'id': 1, 'name': 'Section 1', 'total_students': 4, 'sis_section_id': 'abc'},
+                {'id': 2, 'name': 'Section 2', 'total_students': 0, 'integration_id': None}
+            ])
+
+        async with make_client(handler) as client:
+            rows = await get_paginated_rows(client, 'courses/1/sections', {'id', 'name', 'total_students'}, include=['total_students'])
+
+        self.assertEqual(rows, [
+            {'id': 1, 'name': 'Section 1', 'total_students': 4},
+            {'id': 2, 'name': 'Section 2', 'total_students': 0}
+        ])
+
+    @patch('backend.ccm.canvas_api.async_canvas_client.CANVAS_RATE_LIMIT_RETRY_BASE_SECONDS', 0)
+    async def test_error_status_codes_raise_canvasapi_exceptions(self):
+        cases = [
+            (httpx.Response(400, text='bad'), BadRequest),
+            (httpx.Response(403, text='forbidden'), Forbidden),
+            (httpx.Response(403, text='403 Forbidden (Rate Limit Exceeded)'), RateLimitExceeded),
+            (httpx.Response(401, json={'errors': 'invalid'}, headers={'WWW-Authenticate': 'Bearer'}), InvalidAccessToken),
+            (httpx.Response(401, json={'errors': 'insufficient scopes on access token'}), Unauthorized),
+            (httpx.Response(404), ResourceDoesNotExist),
+            (httpx.Response(429, headers={'X-Rate-Limit-Remaining': '0'}), RateLimitExceeded),
+            (httpx.Response(502), CanvasException),
+        ]
+        for response, exception_class in cases:
+            async with make_client(lambda request, response=response: response) as client:
+                with self.assertRaises(exception_class):
+                    await client.request('GET', 'courses/1')
+
+    async def test_from_canvas_uses_canvas_url_and_token(self):
+        canvas_api = MagicMock()
+        canvas_api._Canvas__requester.original_url = BASE_URL
+        canvas_api._Canvas__requester.access_token = 'user_token'
+        async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+            self.assertEqual(client.base_url, f'{BASE_URL}/api/v1/')
+            self.assertEqual(client.access_token, 'user_token')
+
+    async def test_from_canvas_clients_share_pooled_http_client(self):
+        captured = []
+        def handler(request: httpx.Request):
+            captured.append(request.headers['Authorization'])
+            return httpx.Response(200, json={})
+        shared = CanvasClientRegistry.build_http_client(httpx.MockTransport(handler))
+        canvas_apis = []
+        for token in ('token_a', 'token_b'):
+            canvas_api = MagicMock()
+            canvas_api._Canvas__requester.original_url = BASE_URL
+            canvas_api._Canvas__requester.access_token = token
+            canvas_apis.append(canvas_api)
+
+        with patch.object(canvas_client_registry, 'get_http_client', return_value=shared):
+            for canvas_api in canvas_apis:
+                async with AsyncCanvasClient.from_canvas(canvas_api) as client:
+                    await client.request('GET', 'courses/1')
+
+        # Closing a client built with from_canvas leaves the shared pool open for the next request
+        self.assertFalse(shared.is_closed)
+        self.assertEqual(captured, ['Bearer token_a', 'Bearer token_b'])
+        await shared.aclose()
+
+class EnrollUserAsyncTests(SimpleTestCase):
+
+    @patch('backend.ccm.canvas_api.enroll_users.settings')
+    async def test_enroll_user_async_success(self, mock_settings):
+        mock_settings.CUSTOM_CANVAS_ROLES = {'librarian': 21}
+        captured = {}
+        def handler(request: httpx.Request):
+            captured['params'] = dict(parse_qsl(request.content.decode()))
+            return httpx.Response(200, json={
+                'id': 2, 'course_id': 20, 'course_section_id': 456, 'user_id': 305,
+                'type': 'DesignerEnrollment', 'enrollment_state': 'active'
+            })
+
+        async with make_client(handler) as client:
+            result = await enroll_user_async(client, 456, 'librarian@umich.edu', 'librarian')
+
+        self.assertEqual(result, {'id': 2, 'course_id': 20, 'course_section_id': 456, 'user_id': 305, 'type': 'DesignerEnrollment'})
+        self.assertEqual(captured['params']['enrollment[user_id]'], 'sis_login_id:librarian')
+        self.assertEqual(captured['params']['enrollment[role_id]'], '21')
+
+    async def test_enroll_user_async_with_resolved_user_id(self):
+        captured = {}
+        def handler(request: httpx.Request):
+            captured['params'] = dict(parse_qsl(request.content.decode()))
+            return httpx.Response(200, json={'id': 3, 'course_id': 20, 'course_section_id': 456, 'user_id': 305, 'type': 'StudentEnrollment'})
+
+        async with make_client(handler) as client:
+            await enroll_user_async(client, 456, 'student@umich.edu', 'student', user_id=305)
+
+        self.assertEqual(captured['params']['enrollment[user_id]'], '305')
+
+    async def test_enroll_user_async_canvas_exception(self):
+        async with make_client(lambda request: httpx.Response(404, json={})) as client:
+            with self.assertRaises(ResourceDoesNotExist):
+                await enroll_user_async(client, 999, 'fail@umich.edu', 'student')
@@ -1,9 +1,11 @@
-from django.test import TestCase
+import asyncio
+
+from django.test import SimpleTestCase, TestCase
 from unittest.mock import patch, MagicMock
 from django.contrib.auth.models import User
 from canvas_oauth.exceptions import InvalidOAuthReturnError
 from canvas_oauth.models import CanvasOAuth2Token
-from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
+from backend.ccm.canvas_api.canvas_credential_manager import CanvasClientRegistry, CanvasCredentialManager, canvas_client_registry
 from django.utils import timezone
 
 from backend.ccm.canvas_api.exceptions import CanvasAccessTokenException
@@ -11,6 +13,7 @@ from backend.ccm.canvas_api.exceptions import CanvasAccessTokenException
 
 class TestCanvasCredentialManager(TestCase):
     def setUp(self):
+        canvas_client_registry.clear()
         self.credential_manager = CanvasCredentialManager()
         self.user = User.objects.create_user(username='testuser', password='testpass')
         self.request = MagicMock()
@@ -105,3 +108,75 @@ class TestCanvasCredentialManager(TestCase):
         # Execute and Assert
         with self.assertRaises(CanvasAccessTokenException):  # Removed parentheses
             self.credential_manager.get_canvasapi_instance(self.request)
+
+    @patch('backend.ccm.canvas_api.canvas_credential_manager.get_oauth_token')
+    @patch('backend.ccm.canvas_api.canvas_credential_manager.Canvas')
+    def test_get_canvasapi_instance_reuses_client_for_same_token(self, mock_canvas, mock_get_oauth_token):
+        mock_get_oauth_token.return_value = 'valid_access_token'
+        first = self.credential_manager.get_canvasapi_instance(self.request)
+        second = CanvasCredentialManager().get_canvasapi_instance(self.request)
+
+        mock_canvas.assert_called_once_with(self.credential_manager.canvasURL, 'valid_access_token')
+        self.assertIs(first, second)
+
+    @patch('backend.ccm.canvas_api.canvas_credential_manager.get_oauth_token')
+    @patch('backend.ccm.canvas_api.canvas_credential_manager.Canvas')
+    def test_deleting_oauth_token_evicts_pooled_client(self, mock_canvas, mock_get_oauth_token):
+        mock_get_oauth_token.return_value = self.token.access_token
+        self.credential_manager.get_canvasapi_instance(self.request)
+        self.assertEqual(len(canvas_client_registry), 1)
+
+        CanvasOAuth2Token.objects.filter(user=self.user).delete()
+
+        self.assertEqual(len(canvas_client_registry), 0)
+        mock_canvas.return_value._Canvas__requester._session.close.assert_called_once()
+
+
+class TestCanvasClientRegistry(SimpleTestCase):
+
+    @patch('backend.ccm.canvas_api.canvas_credential_manager.time.monotonic')
+    @patch('backend.ccm.canvas_api.canvas_credential_manager.Canvas')
+    def test_idle_clients_are_evicted(self, mock_canvas, mock_monotonic):
+        registry = CanvasClientRegistry(idle_timeout=60, max_size=10)
+        mock_canvas.side_effect = lambda url, token: MagicMock(name=token)
+        mock_monotonic.return_value = 0
+        idle_client = registry.get('https://canvas.test', 'token_a')
+
+        mock_monotonic.return_value = 61
+        registry.get('https://canvas.test', 'token_b')
+
+        self.assertEqual(len(registry), 1)
+        idle_client._Canvas__requester._session.close.assert_called_once()
+        self.assertIsNot(registry.get('https://canvas.test', 'token_a'), idle_client)
+
+    @patch('backend.ccm.canvas_api.canvas_credential_manager.Canvas')
+    def test_least_recently_used_client_evicted_past_max_size(self, mock_canvas):
+        registry = CanvasClientRegistry(idle_timeout=60, max_size=2)
+        mock_canvas.side_effect = lambda url, token: MagicMock(name=token)
+        client_a = registry.get('https://canvas.test', 'token_a')
+        registry.get('https://canvas.test', 'token_b')
+        registry.get('https://canvas.test', 'token_a')
+        registry.get('https://canvas.test', 'token_c')
+
+        self.assertEqual(len(registry), 2)
+        self.assertIs(registry.get('https://canvas.test', 'token_a'), client_a)
+        self.assertEqual(mock_canvas.call_count, 3)
+
+    async def test_http_client_is_shared_within_an_event_loop(self):
+        registry = CanvasClientRegistry()
+        http_client = registry.get_http_client()
+        self.assertIs(registry.get_http_client(), http_client)
+        await http_client.aclose()
+        # A closed client is replaced rather than handed out again
+        self.assertIsNot(registry.get_http_client(), http_client)
+        registry.clear()
+
+    def test_http_clients_of_closed_event_loops_are_dropped(self):
+        registry = CanvasClientRegistry()
+        async def get_http_client():
+            return registry.get_http_client()
+        first = asyncio.run(get_http_client())
+        second = asyncio.run(get_http_client())
+
+        self.assertIsNot(first, second)
+        self.assertEqual(len(registry._http_clients), 1)
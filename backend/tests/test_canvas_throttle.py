@@ -0,0 +1,199 @@
+import asyncio
+import uuid
+from unittest import SkipTest
+from unittest.mock import MagicMock, patch
+
+import redis
+from django.conf import settings
+from django.test import SimpleTestCase
+from redis.exceptions import ConnectionError as RedisConnectionError, RedisError
+from requests.adapters import HTTPAdapter
+
+from backend.ccm.canvas_api.canvas_throttle import RETURN_TOKENS_SCRIPT, CanvasThrottle, ThrottledHTTPAdapter
+
+def make_mock_cache(script_result=None, script_error=None):
+    """ Returns a MagicMock cache whose Redis client runs the reserve script with the given result or error. """
+    mock_cache = MagicMock()
+    script = mock_cache._cache.get_client.return_value.register_script.return_value
+    script.return_value = script_result
+    script.side_effect = script_error
+    return mock_cache
+
+class CanvasThrottleTests(SimpleTestCase):
+
+    def test_reserve_runs_script_for_token_bucket(self):
+        mock_cache = make_mock_cache(script_result=[3, b'1.5'])
+        throttle = CanvasThrottle(rate=20, burst=40, max_wait=30)
+        with patch('backend.ccm.canvas_api.canvas_throttle.cache', mock_cache):
+            # The bucket held 1.5 tokens, so the first call goes now and the others as it refills
+            self.assertEqual(throttle.reserve('token_a', 3), ([0.0, 0.025, 0.075], 0))
+            throttle.reserve('token_b')
+
+        client = mock_cache._cache.get_client.return_value
+        client.register_script.assert_called_once()
+        calls = client.register_script.return_value.call_args_list
+        self.assertEqual(calls[0].kwargs['args'], [20, 40, 600, 3])
+        self.assertEqual(calls[1].kwargs['args'], [20, 40, 600, 1])
+        self.assertTrue(calls[0].kwargs['keys'][0].startswith('ccm:canvas_throttle:'))
+        self.assertNotIn('token_a', calls[0].kwargs['keys'][0])
+        self.assertNotEqual(calls[0].kwargs['keys'], calls[1].kwargs['keys'])
+
+    def test_reserve_is_refused_past_max_wait(self):
+        throttle = CanvasThrottle(max_wait=5)
+        with patch('backend.ccm.canvas_api.canvas_throttle.cache', make_mock_cache(script_result=[0, b'0.05'])):
+            self.assertEqual(throttle.reserve('token'), ([], 0.05))
+
+    def test_reserve_does_not_throttle_without_redis(self):
+        throttle = CanvasThrottle()
+        # The test settings use the local memory cache, which has no Redis client
+        self.assertEqual(throttle.reserve('token'), ([0.0], 0))
+        with patch('backend.ccm.canvas_api.canvas_throttle.cache', make_mock_cache(script_error=RedisConnectionError('down'))):
+            self.assertEqual(throttle.reserve('token', 2), ([0.0, 0.0], 0))
+
+    @patch('backend.ccm.canvas_api.canvas_throttle.time.sleep')
+    def test_acquire_sync_waits_for_reserved_turn(self, mock_sleep):
+        throttle = CanvasThrottle()
+        with patch.object(throttle, 'reserve', return_value=([0.5], 0)):
+            throttle.acquire_sync('token')
+        mock_sleep.assert_called_once_with(0.5)
+        mock_sleep.reset_mock()
+        with patch.object(throttle, 'reserve', return_value=([0.0], 0)):
+            throttle.acquire_sync('token')
+        mock_sleep.assert_not_called()
+
+    @patch('backend.ccm.canvas_api.canvas_throttle.time.sleep')
+    def test_acquire_sync_retries_refused_reservation(self, mock_sleep):
+        throttle = CanvasThrottle()
+        with patch.object(throttle, 'reserve', side_effect=[([], 0.05), ([0.5], 0)]) as mock_reserve:
+            throttle.acquire_sync('token')
+        self.assertEqual(mock_reserve.call_count, 2)
+        self.assertEqual([call.args[0] for call in mock_sleep.call_args_list], [0.05, 0.5])
+
+    def test_give_back_returns_unused_tokens(self):
+        mock_cache = make_mock_cache(script_result=b'12')
+        throttle = CanvasThrottle(rate=20, burst=40)
+        with patch('backend.ccm.canvas_api.canvas_throttle.cache', mock_cache):
+            throttle.give_back('token', 3)
+        client = mock_cache._cache.get_client.return_value
+        self.assertEqual(client.register_script.call_args.args[0], RETURN_TOKENS_SCRIPT)
+        self.assertEqual(client.register_script.return_value.call_args.kwargs['args'], [20, 40, 3])
+
+    @patch.object(HTTPAdapter, 'send', return_value='response')
+    @patch('backend.ccm.canvas_api.canvas_throttle.canvas_throttle')
+    def test_adapter_acquires_before_each_call(self, mock_throttle, mock_send):
+        adapter = ThrottledHTTPAdapter('user_token')
+        self.assertEqual(adapter.send('request'), 'response')
+        mock_throttle.acquire_sync.assert_called_once_with('user_token')
+        mock_send.assert_called_once_with('request')
+
+
+class ThrottleLeaseTests(SimpleTestCase):
+
+    def make_throttle(self, batch_size: int = 10) -> CanvasThrottle:
+        """ Returns a throttle whose Redis client grants every reservation in full, with no wait. """
+        throttle = CanvasThrottle(batch_size=batch_size)
+        patcher = patch.object(throttle, '_get_client', return_value=MagicMock())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        throttle.reserve = MagicMock(side_effect=lambda access_token, count=1: ([0.0] * count, 0))
+        throttle.give_back = MagicMock()
+        return throttle
+
+    async def test_single_call_reserves_a_single_turn(self):
+        throttle = self.make_throttle()
+        lease = throttle.lease('token')
+        await lease.acquire()
+        await lease.close()
+        throttle.reserve.assert_called_once_with('token', 1)
+        throttle.give_back.assert_not_called()
+
+    async def test_reservations_grow_with_the_calls_waiting(self):
+        throttle = self.make_throttle(batch_size=4)
+        lease = throttle.lease('token')
+        await asyncio.gather(*(lease.acquire() for _ in range(8)))
+        # The first call reserves alone, the rest wait on one reservation at a time that doubles up to the batch size
+        self.assertEqual([call.args[1] for call in throttle.reserve.call_args_list], [1, 2, 4, 1])
+        await lease.close()
+        throttle.give_back.assert_not_called()
+
+    async def test_close_gives_back_unused_turns(self):
+        throttle = self.make_throttle(batch_size=4)
+        lease = throttle.lease('token')
+        await asyncio.gather(*(lease.acquire() for _ in range(3)))
+        # Four calls wait on a reservation of 4 turns, then three of them are cancelled before taking theirs
+        calls = [asyncio.ensure_future(lease.acquire()) for _ in range(4)]
+        await asyncio.sleep(0)
+        for call in calls[1:]:
+            call.cancel()
+        await asyncio.gather(*calls, return_exceptions=True)
+        await lease.close()
+        self.assertEqual(throttle.reserve.call_args_list[-1].args[1], 4)
+        throttle.give_back.assert_called_once_with('token', 3)
+
+    async def test_refused_reservation_is_retried(self):
+        throttle = self.make_throttle()
+        throttle.reserve.side_effect = [([], 0.01), ([0.0], 0)]
+        lease = throttle.lease('token')
+        await lease.acquire()
+        self.assertEqual(throttle.reserve.call_count, 2)
+
+    async def test_no_reservation_without_redis(self):
+        throttle = CanvasThrottle()
+        throttle.reserve = MagicMock()
+        with patch('backend.ccm.canvas_api.canvas_throttle.cache', object()):
+            await throttle.lease('token').acquire()
+        throttle.reserve.assert_not_called()
+
+
+class CanvasThrottleRedisTests(SimpleTestCase):
+    """ Runs the Lua scripts against the Redis of the default cache, skipped when it cannot be reached. """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.redis = redis.Redis.from_url(settings.CACHES['default']['LOCATION'], socket_connect_timeout=1)
+        try:
+            cls.redis.ping()
+        except RedisError:
+            raise SkipTest('Redis is not reachable')
+
+    def setUp(self):
+        self.access_token = f'test_token_{uuid.uuid4()}'
+        self.throttle = CanvasThrottle(rate=10, burst=5, max_wait=1)
+        patcher = patch.object(self.throttle, '_get_client', return_value=lambda write: self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(self.redis.delete, CanvasThrottle._bucket_key(self.access_token))
+
+    def test_reserve_and_give_back(self):
+        # A new bucket is full, so its whole burst goes at once
+        waits, _ = self.throttle.reserve(self.access_token, 5)
+        self.assertEqual(waits, [0.0] * 5)
+
+        # Past the burst, calls go into debt up to max_wait of refill (10 turns), each due a refill interval after the last
+        waits, _ = self.throttle.reserve(self.access_token, 20)
+        self.assertEqual(len(waits), 10)
+        self.assertAlmostEqual(waits[0], 0.1, delta=0.05)
+        self.assertAlmostEqual(waits[-1], 1.0, delta=0.05)
+
+        waits, retry_after = self.throttle.reserve(self.access_token)
+        self.assertEqual(waits, [])
+        self.assertGreater(retry_after, 0)
+        self.assertLessEqual(retry_after, 0.1)
+
+        # Giving the debt back lets the next call go within one refill interval instead of being refused
+        self.throttle.give_back(self.access_token, 10)
+        waits, _ = self.throttle.reserve(self.access_token)
+        self.assertEqual(len(waits), 1)
+        self.assertLessEqual(waits[0], 0.1)
+        self.assertGreater(self.redis.pttl(CanvasThrottle._bucket_key(self.access_token)), 0)
+
+    def test_give_back_never_fills_past_burst(self):
+        self.throttle.reserve(self.access_token, 1)
+        self.throttle.give_back(self.access_token, 100)
+        tokens = float(self.redis.hget(CanvasThrottle._bucket_key(self.access_token), 'tokens'))
+        self.assertLessEqual(tokens, 5)
+
+    def test_give_back_to_expired_bucket_is_a_no_op(self):
+        self.throttle.give_back(self.access_token, 3)
+        self.assertFalse(self.redis.exists(CanvasThrottle._bucket_key(self.access_token)))
@@ -1,5 +1,6 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from canvasapi.canvas_object import CanvasObject
+from canvasapi.section import Section
 from django.test import SimpleTestCase
 
 from backend.ccm.canvas_api.canvasapi_serializer import (
@@ -77,6 +78,65 @@ class CanvasAPISerializerTests(SimpleTestCase):
         
         self.assertNotIn("__call__", data)
 
+    def test_canvas_object_projection_matches_full_conversion(self):
+        section = Section(MagicMock(), {
+            "id": 7,
+            "name": "Section 7",
+            "course_id": 999,
+            "nonxlist_course_id": None,
+            "total_students": 12,
+            "start_at": "2023-01-01T00:00:00Z",
+            "students": [{"id": 1}],
+            "sis_section_id": "abc"
+        })
+        allowed_fields = {"id", "name", "course_id", "nonxlist_course_id", "total_students", "start_at_date", "missing"}
+        full = CanvasObjectROSerializer(section).data
+        expected = {key: value for key, value in full.items() if key in allowed_fields}
+
+        with patch.object(CanvasObjectROSerializer, 'convert_canvas_object_to_primitives') as mock_convert:
+            projected = CanvasObjectROSerializer(section, allowed_fields=allowed_fields).data
+
+        mock_convert.assert_not_called()
+        self.assertEqual(projected, expected)
+        self.assertEqual(list(projected), list(expected))
+
+    def test_raw_json_projection_matches_canvas_object_projection(self):
+        raw_section = {
+            "id": 7,
+            "name": "Section 7",
+            "course_id": 999,
+            "nonxlist_course_id": None,
+            "total_students": 12,
+            "students": [{"id": 1, "name": "Student"}],
+            "sis_section_id": "abc"
+        }
+        flat_fields = {"id", "name", "course_id", "nonxlist_course_id", "total_students", "missing"}
+        section = Section(MagicMock(), raw_section)
+        self.assertEqual(
+            CanvasObjectROSerializer(raw_section, allowed_fields=flat_fields).data,
+            CanvasObjectROSerializer(section, allowed_fields=flat_fields).data
+        )
+
+        # Nested JSON is kept from raw dicts, while CanvasObject conversion reduces nested dicts to {}
+        self.assertEqual(CanvasObjectROSerializer(raw_section, allowed_fields={"students"}).data, {"students": [{"id": 1, "name": "Student"}]})
+        self.assertEqual(CanvasObjectROSerializer(section, allowed_fields={"students"}).data, {"students": [{}]})
+
+    def test_raw_json_projection_with_append_fields(self):
+        raw_sections = [
+            {"id": 1, "name": "Section 1", "course_id": 10, "total_students": 3, "students": None},
+            {"id": 2, "name": "Section 2", "course_id": 10}
+        ]
+        serializer = CanvasObjectROSerializer(
+            raw_sections, allowed_fields={"id", "name", "total_students"}, many=True
+        )
+        self.assertEqual(serializer.data, [
+            {"id": 1, "name": "Section 1", "total_students": 3},
+            {"id": 2, "name": "Section 2"}
+        ])
+
+        serializer = CanvasObjectROSerializer(raw_sections[1], allowed_fields={"id"}, append_fields={"id": 5, "course_name": "Course"})
+        self.assertEqual(serializer.data, {"id": 2, "course_name": "Course"})
+
 class EnrollRequestSerializerTests(SimpleTestCase):
     def test_single_section_enroll_valid(self):
         payload = {"users": [{"loginId": "user1", "role": "Student"}]}
@@ -162,6 +222,30 @@ class EnrollRequestSerializerTests(SimpleTestCase):
         self.assertFalse(serializer.is_valid())
         self.assertIn("non_field_errors", serializer.errors)
 
+    def test_single_section_enroll_conflicting_roles(self):
+        payload = {"users": [{"loginId": "user1", "role": "student"}, {"loginId": "User1@umich.edu", "role": "TA"}, {"loginId": "user1", "role": "Student"}]}
+        serializer = SingleSectionEnrollRequestSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        errors = serializer.errors["conflictingRoles"]
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(str(errors[0]["loginId"]), "User1@umich.edu")
+        self.assertEqual(str(errors[0]["error"]), "Conflicting role 'ta', the user is also listed with role 'student' in this section.")
+
+    def test_multi_section_enroll_conflicting_roles(self):
+        payload = {"enrollments": [
+            {"sectionId": 1, "loginId": "user1", "role": "student"},
+            {"sectionId": 2, "loginId": "user1", "role": "teacher"},
+            {"sectionId": 1, "loginId": "user1", "role": "student"},
+        ]}
+        # Different roles in different sections, and repeated rows, are not conflicts
+        self.assertTrue(MultiSectionEnrollRequestSerializer(data=payload).is_valid())
+
+        payload["enrollments"].append({"sectionId": 2, "loginId": "USER1", "role": "observer"})
+        serializer = MultiSectionEnrollRequestSerializer(data=payload)
+        self.assertFalse(serializer.is_valid())
+        errors = serializer.errors["conflictingRoles"]
+        self.assertEqual([(int(e["sectionId"]), str(e["loginId"]), str(e["role"])) for e in errors], [(2, "USER1", "observer")])
+
     def test_single_section_enroll_too_many_users(self):
         # Patch MAX_ALLOWED_ENROLLMENTS to a small value for testing
         from backend.ccm.canvas_api import canvasapi_serializer
@@ -60,14 +60,10 @@ class CanvasCourseAPIHandlerTests(APITestCase):
     @patch('backend.ccm.canvas_api.course_api_handler.Course')
     def test_put_course_success(self, mock_course_class, mock_get_canvasapi_instance):
         mock_canvas = mock_get_canvasapi_instance.return_value
-        mock_course = MagicMock(spec=Course)
-        mock_course.id = self.course_id
-        mock_course.enrollment_term_id = 1
-        mock_course.course_code = 'Old Course Name'
-        
+        mock_course = Course(MagicMock(), {'id': self.course_id, 'enrollment_term_id': 1, 'course_code': 'Old Course Name'})
+        mock_course.update = MagicMock(return_value='New Course Name')
+
         mock_course_class.return_value = mock_course
-        
-        mock_course.update.return_value = 'New Course Name'
 
         data = {'newName': 'New Course Name'}
         response = self.client.put(self.url, data, format='json')
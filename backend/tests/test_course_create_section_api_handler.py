@@ -1,6 +1,6 @@
 import asyncio
 import unittest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from http import HTTPStatus
 
 from rest_framework.test import APIRequestFactory
@@ -11,6 +11,21 @@ from backend.ccm.canvas_api.exceptions import CanvasErrorHandler, HTTPAPIError
 from canvasapi.exceptions import CanvasException
 
 
+def make_response(json_data):
+    response = MagicMock()
+    response.json.return_value = json_data
+    return response
+
+def make_mock_async_canvas_client(mock_client_class, request):
+    """
+    Configures a patched AsyncCanvasClient class so its client's request coroutine is handled by request.
+    """
+    mock_client = MagicMock()
+    mock_client.request = AsyncMock(side_effect=request)
+    mock_client_class.from_canvas.return_value.__aenter__.return_value = mock_client
+    return mock_client
+
+
 class TestCourseSectionAPIHandler(unittest.TestCase):
     def setUp(self):
         self.factory = APIRequestFactory()
@@ -23,23 +38,17 @@ class TestCourseSectionAPIHandler(unittest.TestCase):
         self.canvas_api = MagicMock()
         self.credential_manager.get_canvasapi_instance.return_value = self.canvas_api
         
-        # Mock course
-        self.course = MagicMock()
-        
         # Test data
         self.course_id = 12345
         self.section_names = ["Section A", "Section B", "Section C"]
         
-    @patch('backend.ccm.canvas_api.course_section_api_handler.Course')
-    @patch('backend.ccm.canvas_api.course_section_api_handler.asyncio.to_thread')
+    @patch('backend.ccm.canvas_api.course_section_api_handler.AsyncCanvasClient')
     @patch('backend.ccm.canvas_api.course_section_api_handler.time.perf_counter')
-    def test_create_sections_happy_path(self, mock_perf_counter, mock_to_thread, mock_course_class):
+    def test_create_sections_happy_path(self, mock_perf_counter, mock_client_class):
         """Test successful concurrent creation of multiple sections."""
         # Simplify the test by mocking the response directly
         mock_perf_counter.side_effect = [100.0, 100.5]
 
-        mock_course_class.return_value = self.course
-
         # Create request with section data
         request_data = {"sections": self.section_names}
         request = self.factory.post(
@@ -56,19 +65,16 @@ class TestCourseSectionAPIHandler(unittest.TestCase):
             mock_serializer.validated_data = request_data
             mock_serializer_class.return_value = mock_serializer
 
-            # Mock section creation results
-            section_results = [
-                {
-                    "id": 1000 + i,
-                    "name": name,
+            # Mock section JSON returned by Canvas, which has no total_students for a new section
+            async def create_section(method, endpoint, course_section):
+                return make_response({
+                    "id": 1000 + self.section_names.index(course_section["name"]),
+                    "name": course_section["name"],
                     "course_id": self.course_id,
-                    "total_students": 0,
-                    "nonxlist_course_id": None
-                } for i, name in enumerate(self.section_names)
-            ]
-
-            # Mock to_thread to return section results
-            mock_to_thread.side_effect = lambda func, *args, **kwargs: section_results.pop(0)
+                    "nonxlist_course_id": None,
+                    "sis_section_id": None
+                })
+            mock_client = make_mock_async_canvas_client(mock_client_class, create_section)
 
             # Execute the API call
             response = self.api_handler.post(request, self.course_id)
@@ -85,9 +91,12 @@ class TestCourseSectionAPIHandler(unittest.TestCase):
                 self.assertEqual(section_data["course_id"], self.course_id)
                 self.assertEqual(section_data["total_students"], 0)
                 self.assertIsNone(section_data["nonxlist_course_id"])
+                self.assertNotIn("sis_section_id", section_data)
 
-            # Verify concurrency - to_thread should be called for each section
-            self.assertEqual(mock_to_thread.call_count, len(self.section_names))
+            # Verify concurrency - one Canvas call per section on one client
+            mock_client_class.from_canvas.assert_called_once_with(self.canvas_api)
+            self.assertEqual(mock_client.request.call_count, len(self.section_names))
+            mock_client.request.assert_any_call("POST", f"courses/{self.course_id}/sections", course_section={"name": "Section A"})
             
     def test_create_sections_validation_error(self):
         """Test that serializer validates section count doesn't exceed 60."""
@@ -118,9 +127,9 @@ class TestCourseSectionAPIHandler(unittest.TestCase):
         self.assertEqual(response.status_code, HTTPStatus.INTERNAL_SERVER_ERROR.value)
         self.assertEqual(response.data, mock_error_response)
 
-    @patch('backend.ccm.canvas_api.course_section_api_handler.asyncio.to_thread')
+    @patch('backend.ccm.canvas_api.course_section_api_handler.AsyncCanvasClient')
     @patch('backend.ccm.canvas_api.course_section_api_handler.time.perf_counter')
-    def test_create_sections_partial_success(self, mock_perf_counter, mock_to_thread):
+    def test_create_sections_partial_success(self, mock_perf_counter, mock_client_class):
         """Test scenario where some sections succeed and others fail."""
         # Configure perf_counter mock
         mock_perf_counter.side_effect = [100.0, 100.5]
@@ -143,22 +152,20 @@ class TestCourseSectionAPIHandler(unittest.TestCase):
             mock_serializer_class.return_value = mock_serializer
 
             # Mock section creation results - 3 success, 3 failures
-            async def mock_async_result(func, *args, **kwargs):
-                section_name = args[2]  # Third argument is section_name
+            async def create_section(method, endpoint, course_section):
+                section_name = course_section["name"]
                 section_index = int(section_name.split()[-1])
                 
                 if section_index < 3:  # First 3 sections succeed
-                    return {
+                    return make_response({
                         "id": 1000 + section_index,
                         "name": section_name,
-                        "course_id": self.course_id,
-                        "total_students": 0
-                    }
+                        "course_id": self.course_id
+                    })
                 else:  # Last 3 sections fail
-                    canvas_error = CanvasException("Section creation failed")
-                    return HTTPAPIError(section_name, canvas_error)
+                    raise CanvasException("Section creation failed")
 
-            mock_to_thread.side_effect = mock_async_result
+            mock_client = make_mock_async_canvas_client(mock_client_class, create_section)
 
             # Mock error handler response
             mock_error_response = {
@@ -176,5 +183,7 @@ class TestCourseSectionAPIHandler(unittest.TestCase):
 
             # Verify response
             self.assertEqual(response.status_code, HTTPStatus.INTERNAL_SERVER_ERROR.value)
-            self.assertEqual(mock_to_thread.call_count, 6)  # All 6 sections were attempted
-            self.assertEqual(response.data, mock_error_response)
\ No newline at end of file
+            self.assertEqual(mock_client.request.call_count, 6)  # All 6 sections were attempted
+            self.assertEqual(response.data, mock_error_response)
+            errors = self.mock_canvas_error_handler.handle_canvas_api_exceptions.call_args.args[0]
+            self.assertEqual([error.failed_input for error in errors], [f"Section {i}" for i in range(3, 6)])
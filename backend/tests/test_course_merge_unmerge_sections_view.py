@@ -9,11 +9,7 @@ from canvasapi.exceptions import CanvasException
 from canvasapi.section import Section
 
 def mock_section(id, name, course_id):
-    mock_sec = MagicMock(spec=Section)
-    mock_sec.id = id
-    mock_sec.name = name
-    mock_sec.course_id = course_id
-    return mock_sec
+    return Section(MagicMock(), {'id': id, 'name': name, 'course_id': course_id})
 class CanvasCourseMergeSectionsViewTests(APITestCase):
     def setUp(self):
         self.client = APIClient()
@@ -23,10 +19,12 @@ class CanvasCourseMergeSectionsViewTests(APITestCase):
         self.url = reverse('mergeSections', kwargs={'course_id': self.course_id})
 
     
+    @patch('backend.ccm.canvas_api.course_section_api_handler.invalidate_course_sections')
+    @patch('backend.ccm.canvas_api.course_section_api_handler.get_cached_section_course_ids', return_value={7})
     @patch('backend.ccm.canvas_api.course_section_api_handler.Section.cross_list_section')
     @patch('backend.ccm.canvas_api.course_section_api_handler.CanvasCredentialManager.get_canvasapi_instance')
     @patch('backend.ccm.canvas_api.course_section_api_handler.CrosslistSectionsSerializer')
-    def test_merge_sections_success(self,mock_crosslist_serializer, mock_get_canvasapi_instance, mock_cross_list_section):        
+    def test_merge_sections_success(self,mock_crosslist_serializer, mock_get_canvasapi_instance, mock_cross_list_section, mock_get_cached_course_ids, mock_invalidate):        
         mock_canvas_api = MagicMock()
         mock_get_canvasapi_instance.return_value = mock_canvas_api
         request_data = {
@@ -54,6 +52,10 @@ class CanvasCourseMergeSectionsViewTests(APITestCase):
         response_dataset = {item['id']: item for item in response.data}
         expected_dataset = {data['id']: data for data in section_results_data}
         self.assertEqual(response_dataset, expected_dataset)
+
+        # Cached sections of the target course and of the courses the sections left are invalidated
+        mock_get_cached_course_ids.assert_called_once_with([101, 102, 103])
+        mock_invalidate.assert_called_once_with({7, self.course_id})
     
     def test_merge_sections_no_section_ids(self):
         request_data = {
@@ -144,10 +146,12 @@ class CanvasCourseUnmergeSectionsViewTests(APITestCase):
         self.client.force_authenticate(user=self.user)
         self.url = reverse('unmergeSections')
 
+    @patch('backend.ccm.canvas_api.course_section_api_handler.invalidate_course_sections')
+    @patch('backend.ccm.canvas_api.course_section_api_handler.get_cached_section_course_ids', return_value={1})
     @patch('backend.ccm.canvas_api.course_section_api_handler.Section.decross_list_section')
     @patch('backend.ccm.canvas_api.course_section_api_handler.CanvasCredentialManager.get_canvasapi_instance')
     @patch('backend.ccm.canvas_api.course_section_api_handler.CrosslistSectionsSerializer')
-    def test_unmerge_sections_success(self, mock_crosslist_serializer, mock_get_canvasapi_instance, mock_decross_list_section):
+    def test_unmerge_sections_success(self, mock_crosslist_serializer, mock_get_canvasapi_instance, mock_decross_list_section, mock_get_cached_course_ids, mock_invalidate):
         request_data = {
             "sectionIds": [201, 202]
         }
@@ -174,6 +178,9 @@ class CanvasCourseUnmergeSectionsViewTests(APITestCase):
         expected_dataset = {data['id']: data for data in section_results_data}
         self.assertEqual(response_dataset, expected_dataset)
 
+        # Cached sections of the course they were merged into and of the courses they return to are invalidated
+        mock_invalidate.assert_called_once_with({1, 2, 3})
+
     def test_unmerge_sections_no_section_ids(self):
         request_data = {
             "sectionIds": []
@@ -5,21 +5,6 @@ from unittest.mock import patch
 from backend.ccm.background_tasks import send_email_non_umich_user_task
 
 class SendEmailNonUmichUserTaskTests(TestCase):
-	def test_send_email_logs_error_on_smtp_exception(self):
-		from backend.ccm.canvas_api import email_users
-		from smtplib import SMTPException
-		with patch("django.core.mail.EmailMessage.send", side_effect=SMTPException("SMTP error")):
-			with patch.object(email_users.logger, "error") as mock_log_error:
-				email_users.send_email(
-					to_email="fail@example.com",
-					subject="Test",
-					body="Body",
-					attachment=None,
-					connection=None
-				)
-				mock_log_error.assert_called()
-				args, kwargs = mock_log_error.call_args
-				assert "SMTP error" in args[0]
 	def test_sending_emails_no_exception(self):
 		emails = ["test1@example.com"]
 		with patch("backend.ccm.background_tasks.send_email_non_umich_user_task.gather_email_send") as mock_gather:
@@ -34,3 +19,19 @@ class SendEmailNonUmichUserTaskTests(TestCase):
 			mock_gather.return_value = None
 			send_email_non_umich_user_task.sending_emails(emails)
 			mock_gather.assert_called_once_with(emails)
+	def test_sending_emails_records_failures(self):
+		emails = ["test1@example.com", "test2@example.com"]
+		with patch("backend.ccm.background_tasks.send_email_non_umich_user_task.gather_email_send") as mock_gather:
+			mock_gather.return_value = {"test2@example.com": "Recipient refused"}
+			result = send_email_non_umich_user_task.sending_emails(emails)
+			self.assertEqual(result, {"sent": ["test1@example.com"], "failed": {"test2@example.com": "Recipient refused"}})
+	def test_gather_email_send_bounds_connections(self):
+		emails = [f"test{i}@example.com" for i in range(7)]
+		with patch("backend.ccm.background_tasks.send_email_non_umich_user_task.EMAIL_BULK_MAX_CONNECTIONS", 3), \
+			patch("backend.ccm.background_tasks.send_email_non_umich_user_task.send_email_batch") as mock_send_batch:
+			mock_send_batch.side_effect = lambda batch, subject, body: {batch[0]: "error"}
+			failures = send_email_non_umich_user_task.gather_email_send(emails)
+		batches = [call.args[0] for call in mock_send_batch.call_args_list]
+		self.assertEqual(len(batches), 3)
+		self.assertEqual(sorted(email for batch in batches for email in batch), sorted(emails))
+		self.assertEqual(set(failures), {batch[0] for batch in batches})
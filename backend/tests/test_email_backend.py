@@ -0,0 +1,68 @@
+from unittest.mock import MagicMock, patch
+
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase, override_settings
+
+from backend.ccm.email_backend import PooledSMTPEmailBackend, smtp_connection_pool
+
+@override_settings(EMAIL_HOST='smtp.example.com', EMAIL_PORT=587, EMAIL_USE_TLS=True, EMAIL_POOL_MAX_IDLE_CONNECTIONS=1, EMAIL_POOL_IDLE_TIMEOUT=60)
+class PooledSMTPEmailBackendTests(SimpleTestCase):
+
+    def setUp(self):
+        smtp_connection_pool.close_all()
+        self.addCleanup(smtp_connection_pool.close_all)
+        patcher = patch('django.core.mail.backends.smtp.smtplib.SMTP', side_effect=self.new_session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.sessions = []
+
+    def new_session(self, *args, **kwargs):
+        session = MagicMock()
+        session.noop.return_value = (250, b'OK')
+        session.sendmail.return_value = {}
+        self.sessions.append(session)
+        return session
+
+    def send(self, to_email='to@example.com'):
+        EmailMessage('Subject', 'Body', 'from@example.com', [to_email], connection=PooledSMTPEmailBackend()).send()
+
+    def test_sends_reuse_the_session(self):
+        self.send()
+        self.send()
+
+        self.assertEqual(len(self.sessions), 1)
+        session = self.sessions[0]
+        session.starttls.assert_called_once()
+        self.assertEqual(session.sendmail.call_count, 2)
+        session.quit.assert_not_called()
+
+    def test_unhealthy_session_is_replaced(self):
+        self.send()
+        self.sessions[0].noop.side_effect = ConnectionResetError('Connection reset by peer')
+
+        self.send()
+
+        self.assertEqual(len(self.sessions), 2)
+        self.sessions[0].quit.assert_called_once()
+        self.sessions[1].sendmail.assert_called_once()
+
+    def test_idle_session_is_not_reused(self):
+        self.send()
+        with override_settings(EMAIL_POOL_IDLE_TIMEOUT=-1):
+            self.send()
+
+        self.assertEqual(len(self.sessions), 2)
+        self.sessions[0].noop.assert_not_called()
+        self.sessions[0].quit.assert_called_once()
+
+    def test_sessions_beyond_the_pool_size_are_closed(self):
+        first, second = PooledSMTPEmailBackend(), PooledSMTPEmailBackend()
+        first.open()
+        second.open()
+
+        first.close()
+        second.close()
+
+        self.assertEqual(len(self.sessions), 2)
+        self.sessions[0].quit.assert_not_called()
+        self.sessions[1].quit.assert_called_once()
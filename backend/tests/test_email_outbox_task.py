@@ -0,0 +1,108 @@
+from unittest.mock import MagicMock, patch
+
+from django.conf import settings
+from django.core import mail
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django_q.models import Schedule
+
+from backend.ccm.background_tasks import email_outbox_task
+from backend.ccm.canvas_api.email_users import queue_email
+from backend.ccm.email_backend import smtp_connection_pool
+from backend.ccm.models import EmailOutbox
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_FROM='from@example.com', EMAIL_TO_REPLY='reply@example.com')
+class EmailOutboxTests(TestCase):
+
+    def test_queue_email_dedups_by_key(self):
+        first = queue_email('to@example.com', 'Subject', 'Body', dedup_key='job-1-summary')
+        second = queue_email('to@example.com', 'Subject', 'Body', dedup_key='job-1-summary')
+        queue_email('to@example.com', 'Subject', 'Body')
+
+        self.assertEqual(first.pk, second.pk)
+        self.assertEqual(EmailOutbox.objects.count(), 2)
+
+    def test_send_outbox_emails_sends_due_emails_with_attachments(self):
+        queue_email('to@example.com', 'Subject', 'Body', attachment=('report.csv', 'a,b\n', 'text/csv'))
+        queue_email('later@example.com', 'Later', 'Body')
+        EmailOutbox.objects.filter(to_email='later@example.com').update(next_attempt_at=timezone.now() + timezone.timedelta(minutes=5))
+
+        counts = email_outbox_task.send_outbox_emails()
+
+        self.assertEqual(counts, {'sent': 1, 'failed': 0})
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['to@example.com'])
+        self.assertEqual(mail.outbox[0].attachments[0][0], 'report.csv')
+        sent = EmailOutbox.objects.get(to_email='to@example.com')
+        self.assertEqual((sent.status, sent.attempts), (EmailOutbox.Status.SENT, 1))
+        self.assertIsNotNone(sent.sent_at)
+        self.assertEqual(EmailOutbox.objects.get(to_email='later@example.com').status, EmailOutbox.Status.PENDING)
+
+    @patch('backend.ccm.background_tasks.email_outbox_task.EMAIL_OUTBOX_MAX_ATTEMPTS', 2)
+    def test_failed_email_is_retried_with_backoff_then_given_up(self):
+        email = queue_email('to@example.com', 'Subject', 'Body')
+        with patch('django.core.mail.backends.locmem.EmailBackend.send_messages', side_effect=OSError('SMTP timeout')):
+            self.assertEqual(email_outbox_task.send_outbox_emails(), {'sent': 0, 'failed': 1})
+            email.refresh_from_db()
+            self.assertEqual((email.status, email.attempts, email.last_error), (EmailOutbox.Status.PENDING, 1, 'SMTP timeout'))
+            self.assertGreater(email.next_attempt_at, timezone.now())
+            # Not due yet
+            self.assertEqual(email_outbox_task.send_outbox_emails(), {'sent': 0, 'failed': 0})
+
+            EmailOutbox.objects.filter(pk=email.pk).update(next_attempt_at=timezone.now())
+            email_outbox_task.send_outbox_emails()
+
+        email.refresh_from_db()
+        self.assertEqual((email.status, email.attempts), (EmailOutbox.Status.FAILED, 2))
+
+    def test_outbox_schedule_runs_on_the_default_cluster(self):
+        schedule = Schedule.objects.get(name='send-outbox-emails')
+
+        self.assertEqual(schedule.cluster, settings.Q_CLUSTER['name'])
+        self.assertNotEqual(schedule.cluster, settings.Q_ENROLLMENT_CLUSTER)
+
+    def test_claimed_batch_is_leased(self):
+        queue_email('to@example.com', 'Subject', 'Body')
+
+        self.assertEqual(len(email_outbox_task.claim_outbox_batch()), 1)
+        # Another drain running while the batch is sent does not claim it again
+        self.assertEqual(email_outbox_task.claim_outbox_batch(), [])
+
+@override_settings(
+    EMAIL_BACKEND='backend.ccm.email_backend.PooledSMTPEmailBackend', EMAIL_HOST='smtp.example.com', EMAIL_PORT=587,
+    EMAIL_USE_TLS=True, EMAIL_FROM='from@example.com', EMAIL_TO_REPLY='reply@example.com'
+)
+class PooledEmailOutboxTests(TestCase):
+
+    def setUp(self):
+        smtp_connection_pool.close_all()
+        self.addCleanup(smtp_connection_pool.close_all)
+        self.sessions = []
+        patcher = patch('django.core.mail.backends.smtp.smtplib.SMTP', side_effect=self.new_session)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def new_session(self, *args, **kwargs):
+        session = MagicMock()
+        session.noop.return_value = (250, b'OK')
+        session.sendmail.return_value = {}
+        self.sessions.append(session)
+        return session
+
+    def test_session_is_reused_by_the_next_scheduled_drain(self):
+        clock = MagicMock()
+        clock.monotonic.return_value = 1000.0
+        with self.settings(), patch('backend.ccm.email_backend.time', clock):
+            # Run with the backend's default idle timeout
+            del settings.EMAIL_POOL_IDLE_TIMEOUT
+            queue_email('first@example.com', 'Subject', 'Body')
+            self.assertEqual(email_outbox_task.send_outbox_emails(), {'sent': 1, 'failed': 0})
+
+            # The outbox is drained every minute, a slow drain ends a little later
+            clock.monotonic.return_value += 90
+            queue_email('second@example.com', 'Subject', 'Body')
+            self.assertEqual(email_outbox_task.send_outbox_emails(), {'sent': 1, 'failed': 0})
+
+        self.assertEqual(len(self.sessions), 1)
+        self.assertEqual(self.sessions[0].sendmail.call_count, 2)
+        self.sessions[0].quit.assert_not_called()
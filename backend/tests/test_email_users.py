@@ -2,13 +2,13 @@ from django.test import TestCase, override_settings
 from unittest.mock import patch, MagicMock
 from backend.ccm.canvas_api import email_users
 
-class SendEmailTests(TestCase):
+class BuildEmailTests(TestCase):
     @override_settings(EMAIL_FROM='from@example.com', EMAIL_TO_REPLY='reply@example.com', EMAIL_DEBUG=True)
     @patch('backend.ccm.canvas_api.email_users.EmailMessage')
-    def test_send_email_subject_prefixed_when_debugpy_enable_true(self, mock_email_message):
+    def test_build_email_subject_prefixed_when_debugpy_enable_true(self, mock_email_message):
         mock_instance = MagicMock()
         mock_email_message.return_value = mock_instance
-        email_users.send_email('to@example.com', 'Test Subject', 'Test Body')
+        email = email_users.build_email('to@example.com', 'Test Subject', 'Test Body')
         mock_email_message.assert_called_once_with(
             subject='Test Email - Test Subject',
             body='Test Body',
@@ -18,14 +18,14 @@ class SendEmailTests(TestCase):
             connection=None
         )
         self.assertEqual(mock_instance.content_subtype, "html")
-        mock_instance.send.assert_called_once()
+        self.assertIs(email, mock_instance)
         
     @override_settings(EMAIL_FROM='from@example.com', EMAIL_TO_REPLY='reply@example.com', EMAIL_DEBUG=False)
     @patch('backend.ccm.canvas_api.email_users.EmailMessage')
-    def test_send_email_no_attachment(self, mock_email_message):
+    def test_build_email_no_attachment(self, mock_email_message):
         mock_instance = MagicMock()
         mock_email_message.return_value = mock_instance
-        email_users.send_email('to@example.com', 'Test Subject', 'Test Body')
+        email = email_users.build_email('to@example.com', 'Test Subject', 'Test Body')
         mock_email_message.assert_called_once_with(
                 subject='Test Subject',
             body='Test Body',
@@ -35,29 +35,18 @@ class SendEmailTests(TestCase):
             connection=None
         )
         self.assertEqual(mock_instance.content_subtype, "html")
-        mock_instance.send.assert_called_once()
+        self.assertIs(email, mock_instance)
 
     @override_settings(EMAIL_FROM='from@example.com', EMAIL_TO_REPLY='reply@example.com')
     @patch('backend.ccm.canvas_api.email_users.EmailMessage')
-    def test_send_email_with_attachment(self, mock_email_message):
+    def test_build_email_with_attachment(self, mock_email_message):
         mock_instance = MagicMock()
         mock_email_message.return_value = mock_instance
         attachment = ('file.txt', b'content', 'text/plain')
-        email_users.send_email('to@example.com', 'Test Subject', 'Test Body', attachment=attachment)
+        email = email_users.build_email('to@example.com', 'Test Subject', 'Test Body', attachment=attachment)
         mock_instance.attach.assert_called_once_with('file.txt', b'content', 'text/plain')
         self.assertEqual(mock_instance.content_subtype, "html")
-        mock_instance.send.assert_called_once()
-
-    @override_settings(EMAIL_FROM='from@example.com', EMAIL_TO_REPLY='reply@example.com')
-    @patch('backend.ccm.canvas_api.email_users.EmailMessage')
-    @patch.object(email_users, 'logger')
-    def test_send_email_exception_logged(self, mock_logger, mock_email_message):
-        mock_instance = MagicMock()
-        mock_instance.send.side_effect = Exception('SMTP error')
-        mock_email_message.return_value = mock_instance
-        email_users.send_email('to@example.com', 'Test Subject', 'Test Body')
-        self.assertEqual(mock_instance.content_subtype, "html")
-        mock_logger.error.assert_called_once()
+        self.assertIs(email, mock_instance)
 
     @override_settings(
         EMAIL_FROM='from@example.com', 
@@ -69,10 +58,10 @@ class SendEmailTests(TestCase):
         }
     )
     @patch('backend.ccm.canvas_api.email_users.EmailMessage')
-    def test_send_email_includes_auto_reply_suppression_headers(self, mock_email_message):
+    def test_build_email_includes_auto_reply_suppression_headers(self, mock_email_message):
         mock_instance = MagicMock()
         mock_email_message.return_value = mock_instance
-        email_users.send_email('to@example.com', 'Test Subject', 'Test Body')
+        email = email_users.build_email('to@example.com', 'Test Subject', 'Test Body')
         # Verify that extra_headers are set with auto-reply suppression headers
         expected_headers = {
             "Auto-Submitted": "auto-generated",
@@ -80,7 +69,7 @@ class SendEmailTests(TestCase):
             "Precedence": "bulk",
         }
         self.assertEqual(mock_instance.extra_headers, expected_headers)
-        mock_instance.send.assert_called_once()
+        self.assertIs(email, mock_instance)
 
     @override_settings(
         EMAIL_FROM='from@example.com', 
@@ -88,10 +77,48 @@ class SendEmailTests(TestCase):
         EMAIL_EXTRA_HEADERS=None
     )
     @patch('backend.ccm.canvas_api.email_users.EmailMessage')
-    def test_send_email_handles_none_extra_headers(self, mock_email_message):
+    def test_build_email_handles_none_extra_headers(self, mock_email_message):
         mock_instance = MagicMock()
         mock_email_message.return_value = mock_instance
-        email_users.send_email('to@example.com', 'Test Subject', 'Test Body')
+        email = email_users.build_email('to@example.com', 'Test Subject', 'Test Body')
         # Verify that extra_headers falls back to empty dict when None
         self.assertEqual(mock_instance.extra_headers, {})
-        mock_instance.send.assert_called_once()
\ No newline at end of file
+        self.assertIs(email, mock_instance)
+
+class SendEmailBatchTests(TestCase):
+    @patch('backend.ccm.canvas_api.email_users.get_connection')
+    def test_batch_uses_one_session_and_records_failures(self, mock_get_connection):
+        from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+        connection = mock_get_connection.return_value
+        sent = []
+
+        def send_messages(messages):
+            to_email = messages[0].to[0]
+            if to_email == 'dropped@example.com' and to_email not in sent:
+                sent.append(to_email)
+                raise SMTPServerDisconnected('Connection unexpectedly closed')
+            if to_email == 'refused@example.com':
+                raise SMTPRecipientsRefused({to_email: (550, b'No such user')})
+            sent.append(to_email)
+            return 1
+        connection.send_messages.side_effect = send_messages
+
+        failures = email_users.send_email_batch(
+            ['a@example.com', 'dropped@example.com', 'refused@example.com', 'b@example.com'], 'Subject', 'Body'
+        )
+
+        self.assertEqual(list(failures), ['refused@example.com'])
+        self.assertEqual(sent, ['a@example.com', 'dropped@example.com', 'dropped@example.com', 'b@example.com'])
+        mock_get_connection.assert_called_once()
+        # Opened for the batch, and reopened once after the server dropped the session
+        self.assertEqual(connection.open.call_count, 2)
+        self.assertEqual(connection.close.call_count, 2)
+
+    @patch('backend.ccm.canvas_api.email_users.get_connection')
+    def test_batch_fails_every_recipient_when_connection_cannot_open(self, mock_get_connection):
+        mock_get_connection.return_value.open.side_effect = OSError('Connection refused')
+
+        failures = email_users.send_email_batch(['a@example.com', 'b@example.com'], 'Subject', 'Body')
+
+        self.assertEqual(failures, {'a@example.com': 'Connection refused', 'b@example.com': 'Connection refused'})
+        mock_get_connection.return_value.send_messages.assert_not_called()
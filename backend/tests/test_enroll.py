@@ -1,16 +1,22 @@
 from unittest.mock import patch, MagicMock
+from urllib.parse import parse_qs, parse_qsl, urlparse
+import httpx
 from django.utils import timezone
 from rest_framework.test import APITestCase, APIRequestFactory
 from django.urls import reverse
 from django.test import SimpleTestCase, TestCase
 from django.contrib.auth.models import User
+from django.conf import settings
+from django.core.cache import cache
 from canvas_oauth.models import CanvasOAuth2Token
 from backend.ccm.canvas_api.section_enrollments_api_handler import SingleSectionEnrollmentView
-from backend.ccm.canvas_api.enroll_users import process_login_id, enroll_user
-from canvasapi.section import Section
-from canvasapi import Canvas
+from backend.ccm.canvas_api.enroll_users import deduplicate_enrollments, process_login_id, enroll_user_async
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
+from backend.ccm.canvas_api.rate_limiter import clear_rate_limiters
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
 from backend.ccm.background_tasks import enroll_um_users_task
+from backend.ccm.background_tasks.enrollment_report import enrollment_report_token_grant
+from backend.ccm.models import EnrollmentJob, EnrollmentJobRow
 
 class TestEnrollUmUsersBackgroundTask(TestCase):
 
@@ -143,6 +149,11 @@ class MultiSectionEnrollmentViewTests(APITestCase):
         self.factory = APIRequestFactory()
         self.course_id = 123
         self.url = reverse('multipleSectionEnrollments', kwargs={'course_id': self.course_id})
+        cache.clear()
+        # Queue every request, the inline dispatch of small requests is tested on its own
+        inline_max_patcher = patch('backend.ccm.canvas_api.section_enrollments_api_handler.ENROLLMENT_INLINE_MAX_USERS', 0)
+        inline_max_patcher.start()
+        self.addCleanup(inline_max_patcher.stop)
 
     @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
     @patch('backend.ccm.canvas_api.section_enrollments_api_handler.reverse')
@@ -167,10 +178,163 @@ class MultiSectionEnrollmentViewTests(APITestCase):
         view = MultiSectionEnrollmentView()
         response = view.post(django_request, self.course_id)
         self.assertEqual(response.status_code, 200)
-        self.assertIn('task_id', response.data)
-        self.assertEqual(response.data['task_id'], 'mock-task-id')
+        self.assertEqual(list(response.data), ['job_id'])
         mock_async_task.assert_called_once()
         mock_reverse.assert_called_once()
+        job = EnrollmentJob.objects.get(pk=response.data['job_id'])
+        self.assertEqual(job.task_id, 'mock-task-id')
+        self.assertEqual(mock_async_task.call_args.kwargs['task'], {'job_id': job.id})
+        self.assertEqual(mock_async_task.call_args.kwargs['cluster'], settings.Q_ENROLLMENT_CLUSTER)
+        self.assertEqual(
+            list(job.rows.order_by('pk').values_list('login_id', 'section_id', 'status')),
+            [('student1', 456, 'pending'), ('student2', 789, 'pending')]
+        )
+
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.reverse')
+    def test_post_repeated_request_returns_running_job(self, mock_reverse, mock_async_task):
+        from backend.ccm.canvas_api.section_enrollments_api_handler import MultiSectionEnrollmentView
+        mock_async_task.return_value = 'mock-task-id'
+        mock_reverse.return_value = '/mock-callback-url/'
+
+        def post(enrollments):
+            req_data = {"enrollments": enrollments}
+            django_request = self.factory.post(self.url, data=req_data, format='json')
+            django_request.user = self.user
+            django_request.data = req_data
+            return MultiSectionEnrollmentView().post(django_request, self.course_id)
+
+        first = post([{"loginId": "student1", "role": "student", "sectionId": 456}, {"loginId": "student2", "role": "student", "sectionId": 789}])
+        # The same rows in another order and case are the same submission
+        repeat = post([{"loginId": "Student2", "role": "student", "sectionId": 789}, {"loginId": "student1", "role": "student", "sectionId": 456}])
+
+        self.assertEqual(repeat.data, first.data)
+        mock_async_task.assert_called_once()
+        self.assertEqual(EnrollmentJob.objects.count(), 1)
+
+        EnrollmentJob.objects.filter(pk=first.data['job_id']).update(completed_at=timezone.now())
+        after_completion = post([{"loginId": "student1", "role": "student", "sectionId": 456}, {"loginId": "student2", "role": "student", "sectionId": 789}])
+
+        self.assertNotEqual(after_completion.data['job_id'], first.data['job_id'])
+        self.assertEqual(mock_async_task.call_count, 2)
+
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.async_task')
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.reverse')
+    def test_post_repeated_request_requeues_stalled_job(self, mock_reverse, mock_async_task, mock_requeue_task):
+        from backend.ccm.canvas_api.section_enrollments_api_handler import MultiSectionEnrollmentView
+        mock_async_task.return_value = 'mock-task-id'
+        mock_reverse.return_value = '/mock-callback-url/'
+        enrollments = [{"loginId": "student1", "role": "student", "sectionId": 456}, {"loginId": "student2", "role": "student", "sectionId": 789}]
+
+        def post():
+            req_data = {"enrollments": enrollments}
+            django_request = self.factory.post(self.url, data=req_data, format='json')
+            django_request.user = self.user
+            django_request.data = req_data
+            return MultiSectionEnrollmentView().post(django_request, self.course_id)
+
+        first = post()
+        job = EnrollmentJob.objects.get(pk=first.data['job_id'])
+        # The first row succeeded and the worker running the second died more than the Q_CLUSTER timeout ago
+        stalled_at = timezone.now() - timezone.timedelta(seconds=settings.Q_CLUSTER['timeout'] + 60)
+        job.rows.filter(login_id='student1').update(status=EnrollmentJobRow.Status.SUCCEEDED, updated_at=stalled_at)
+        job.rows.filter(login_id='student2').update(status=EnrollmentJobRow.Status.RUNNING, updated_at=stalled_at)
+
+        repeat = post()
+        self.assertEqual(repeat.data, first.data)
+        mock_async_task.assert_called_once()
+        mock_requeue_task.assert_called_once()
+        self.assertEqual(mock_requeue_task.call_args.kwargs['task'], {'job_id': job.id})
+        self.assertEqual(
+            list(job.rows.order_by('pk').values_list('login_id', 'status')),
+            [('student1', 'succeeded'), ('student2', 'pending')]
+        )
+
+        # The requeued job is no longer stalled
+        post()
+        mock_requeue_task.assert_called_once()
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
+    def test_post_conflicting_roles_is_a_bad_request(self, mock_async_task):
+        from backend.ccm.canvas_api.section_enrollments_api_handler import MultiSectionEnrollmentView
+        req_data = {
+            "enrollments": [
+                {"loginId": "student1", "role": "student", "sectionId": 456},
+                {"loginId": "Student1", "role": "teacher", "sectionId": 456}
+            ]
+        }
+        django_request = self.factory.post(self.url, data=req_data, format='json')
+        django_request.user = self.user
+        django_request.data = req_data
+        response = MultiSectionEnrollmentView(credential_manager=MagicMock()).post(django_request, self.course_id)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Conflicting role 'teacher'", response.data['errors'][0]['message'])
+        mock_async_task.assert_not_called()
+        self.assertFalse(EnrollmentJob.objects.exists())
+
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.ENROLLMENT_INLINE_MAX_USERS', 2)
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.AsyncCanvasClient')
+    @patch('backend.ccm.canvas_api.login_id_resolver.enroll_user_async')
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
+    def test_post_small_request_reports_failed_and_skipped_rows(self, mock_async_task, mock_enroll_user_async, mock_client):
+        from unittest.mock import AsyncMock
+        from canvasapi.exceptions import ResourceDoesNotExist
+        from backend.ccm.canvas_api.section_enrollments_api_handler import MultiSectionEnrollmentView
+        mock_client.from_canvas.return_value.__aenter__.return_value.request = AsyncMock(side_effect=ResourceDoesNotExist('Not found'))
+
+        async def enroll(client, section_id, login_id, role, user_id):
+            if login_id == 'student2':
+                raise ResourceDoesNotExist('The specified resource does not exist.')
+            return {'id': 1, 'course_section_id': section_id}
+        mock_enroll_user_async.side_effect = enroll
+        req_data = {
+            "enrollments": [
+                {"loginId": "student1", "role": "student", "sectionId": 456},
+                {"loginId": "student2", "role": "student", "sectionId": 789},
+                {"loginId": "Student2", "role": "student", "sectionId": 789}
+            ]
+        }
+        django_request = self.factory.post(self.url, data=req_data, format='json')
+        django_request.user = self.user
+        django_request.data = req_data
+        view = MultiSectionEnrollmentView(credential_manager=MagicMock())
+        response = view.post(django_request, self.course_id)
+
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(len(response.data['errors']), 1)
+        self.assertIn('student2', response.data['errors'][0]['failedInput'])
+        self.assertEqual(response.data['errors'][0]['message'], 'The specified resource does not exist.')
+        self.assertEqual([row['loginId'] for row in response.data['skipped']], ['Student2'])
+        self.assertEqual(mock_enroll_user_async.call_count, 2)
+        # Each user is in one row, so none is looked up before enrolling
+        mock_client.from_canvas.return_value.__aenter__.return_value.request.assert_not_awaited()
+        mock_async_task.assert_not_called()
+        self.assertFalse(EnrollmentJob.objects.exists())
+
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.ENROLLMENT_INLINE_MAX_USERS', 2)
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.AsyncCanvasClient')
+    @patch('backend.ccm.canvas_api.login_id_resolver.enroll_user_async')
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
+    def test_post_small_request_success_reports_skipped_rows(self, mock_async_task, mock_enroll_user_async, mock_client):
+        from backend.ccm.canvas_api.section_enrollments_api_handler import MultiSectionEnrollmentView
+        mock_enroll_user_async.side_effect = lambda client, section_id, login_id, role, user_id: {'id': 1, 'course_section_id': section_id}
+        req_data = {
+            "enrollments": [
+                {"loginId": "student1", "role": "student", "sectionId": 456},
+                {"loginId": "Student1", "role": "student", "sectionId": 456}
+            ]
+        }
+        django_request = self.factory.post(self.url, data=req_data, format='json')
+        django_request.user = self.user
+        django_request.data = req_data
+        response = MultiSectionEnrollmentView(credential_manager=MagicMock()).post(django_request, self.course_id)
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['enrollments'], [{'id': 1, 'course_section_id': 456}])
+        self.assertEqual([row['loginId'] for row in response.data['skipped']], ['Student1'])
+        mock_async_task.assert_not_called()
+
 class SingleSectionEnrollmentViewTests(APITestCase):
     @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
     @patch('backend.ccm.canvas_api.section_enrollments_api_handler.reverse')
@@ -196,6 +360,7 @@ class SingleSectionEnrollmentViewTests(APITestCase):
         self.assertEqual(response.status_code, 500)
         self.assertIn('errors', response.data)
         self.assertIn('Async task error!', str(response.data))
+        self.assertFalse(EnrollmentJob.objects.exists())
 
     @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
     @patch('backend.ccm.canvas_api.section_enrollments_api_handler.reverse')
@@ -230,6 +395,11 @@ class SingleSectionEnrollmentViewTests(APITestCase):
         self.course_id = 123
         self.section_id = 456
         self.url = reverse('singleSectionEnrollments', kwargs={'course_id': self.course_id, 'section_id': self.section_id})
+        cache.clear()
+        # Queue every request, the inline dispatch of small requests is tested on its own
+        inline_max_patcher = patch('backend.ccm.canvas_api.section_enrollments_api_handler.ENROLLMENT_INLINE_MAX_USERS', 0)
+        inline_max_patcher.start()
+        self.addCleanup(inline_max_patcher.stop)
 
     @patch('backend.ccm.canvas_api.section_enrollments_api_handler.async_task')
     @patch('backend.ccm.canvas_api.section_enrollments_api_handler.reverse')
@@ -253,8 +423,8 @@ class SingleSectionEnrollmentViewTests(APITestCase):
         view = SingleSectionEnrollmentView()
         response = view.post(django_request, self.course_id, self.section_id)
         self.assertEqual(response.status_code, 200)
-        self.assertIn('task_id', response.data)
-        self.assertEqual(response.data['task_id'], 'mock-task-id')
+        self.assertIn('job_id', response.data)
+        self.assertEqual(EnrollmentJob.objects.get(pk=response.data['job_id']).task_id, 'mock-task-id')
         mock_async_task.assert_called_once()
         mock_reverse.assert_called_once()
 class TestEnrollUmUsersTask(TestCase):
@@ -310,6 +480,118 @@ class TestEnrollUmUsersTask(TestCase):
             # Restore the original course_manager
             enroll_task_mod.course_manager = original_course_manager
 
+class TestChunkedEnrollmentJob(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='chunkuser', password='testpass', email='ChunkUser@umich.edu')
+        self.enrollment_params = [
+            {'loginId': f'student{i}', 'role': 'student', 'sectionId': 123} for i in range(5)
+        ]
+
+    def create_job(self):
+        with patch('backend.ccm.background_tasks.enroll_um_users_task.ENROLLMENT_JOB_CHUNK_SIZE', 2):
+            return enroll_um_users_task.create_enrollment_job(self.user, 99, 'http://callback/', self.enrollment_params)
+
+    def test_create_enrollment_job_splits_rows_into_chunks(self):
+        job = self.create_job()
+        self.assertEqual(list(job.rows.order_by('pk').values_list('chunk', flat=True)), [0, 0, 1, 1, 2])
+        self.assertFalse(job.rows.exclude(status=EnrollmentJobRow.Status.PENDING).exists())
+
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.email_enrollment_summary')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.gather_enrollments')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.course_manager')
+    def test_duplicate_rows_are_skipped_and_reported(self, mock_course_manager, mock_gather_enrollments, mock_email):
+        self.enrollment_params += [
+            {'loginId': 'Student1@umich.edu', 'role': 'student', 'sectionId': 123},
+            {'loginId': 'student2', 'role': 'Student', 'sectionId': 123},
+        ]
+        job = self.create_job()
+        self.assertEqual(job.rows.filter(status=EnrollmentJobRow.Status.SKIPPED).count(), 2)
+        mock_gather_enrollments.side_effect = lambda users, canvas_api, job_id: [{'id': 1} for _ in users]
+
+        for chunk in range(3):
+            enroll_um_users_task.enroll_um_users_chunk(job.id, chunk)
+
+        enrolled = [user.loginId for call in mock_gather_enrollments.call_args_list for user in call.args[0]]
+        self.assertEqual(sorted(enrolled), [f'student{i}' for i in range(5)])
+        kwargs = mock_email.call_args.kwargs
+        self.assertEqual(kwargs['total_enrollment_count'], 5)
+        self.assertEqual([row['loginId'] for row in kwargs['skipped_enrollments']], ['Student1@umich.edu', 'student2'])
+
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.email_enrollment_summary')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.async_task')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.gather_enrollments')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.course_manager')
+    def test_enroll_um_users_queues_chunks_and_emails_once(self, mock_course_manager, mock_gather_enrollments, mock_async_task, mock_email):
+        from canvasapi.exceptions import CanvasException
+        job = self.create_job()
+        mock_gather_enrollments.side_effect = lambda users, canvas_api, job_id: [
+            CanvasException('API error') if user.loginId == 'student3' else {'id': 1} for user in users
+        ]
+
+        enroll_um_users_task.enroll_um_users({'job_id': job.id})
+
+        # The first chunk runs in the dispatching task, the others are queued for other workers
+        queued_chunks = [call.args[2] for call in mock_async_task.call_args_list]
+        self.assertEqual(queued_chunks, [1, 2])
+        self.assertEqual({call.kwargs['cluster'] for call in mock_async_task.call_args_list}, {settings.Q_ENROLLMENT_CLUSTER})
+        mock_email.assert_not_called()
+        for chunk in queued_chunks:
+            enroll_um_users_task.enroll_um_users_chunk(job.id, chunk)
+        # A redelivered chunk task finds nothing left to do
+        enroll_um_users_task.enroll_um_users_chunk(job.id, 1)
+
+        self.assertEqual(mock_gather_enrollments.call_count, 3)
+        mock_email.assert_called_once()
+        kwargs = mock_email.call_args.kwargs
+        self.assertEqual((kwargs['req_user_email'], kwargs['course_id'], kwargs['total_enrollment_count']), ('chunkuser@umich.edu', 99, 5))
+        self.assertEqual(list(kwargs['failed_enrollments']), [{'sectionId': 123, 'loginId': 'student3', 'role': 'student', 'error': 'API error'}])
+        self.assertEqual(list(kwargs['skipped_enrollments']), [])
+        self.assertEqual(kwargs['dedup_key'], f'enrollment-job-{job.id}-summary')
+        self.assertTrue(kwargs['report_url'].split('?')[0].endswith(f'/enrollment-jobs/{job.id}/report'))
+        job.refresh_from_db()
+        self.assertIsNotNone(job.completed_at)
+
+    def test_report_url_is_on_the_requesting_host(self):
+        job = self.create_job()
+        job.canvas_callback_url = 'https://ccm.example.com/oauth/oauth-callback'
+
+        report_url = enroll_um_users_task.enrollment_report_url(job)
+        path = reverse('enrollmentJobReport', kwargs={'course_id': 99, 'job_id': job.id})
+        self.assertTrue(report_url.startswith(f"https://ccm.example.com{path}?token="))
+        # The link authenticates the job's owner, since it may be opened from a mail client without a session
+        token = parse_qs(urlparse(report_url).query)['token'][0]
+        self.assertEqual(enrollment_report_token_grant(token), (job.id, job.user_id))
+
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.email_enrollment_summary')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.gather_enrollments')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.course_manager')
+    def test_retried_chunk_resumes_unfinished_rows(self, mock_course_manager, mock_gather_enrollments, mock_email):
+        job = self.create_job()
+        rows = list(job.rows.filter(chunk=0).order_by('pk'))
+        # The first worker enrolled student0 and died while enrolling student1
+        EnrollmentJobRow.objects.filter(pk=rows[0].pk).update(status=EnrollmentJobRow.Status.SUCCEEDED)
+        EnrollmentJobRow.objects.filter(pk=rows[1].pk).update(
+            status=EnrollmentJobRow.Status.RUNNING, updated_at=timezone.now() - timezone.timedelta(hours=1)
+        )
+        mock_gather_enrollments.side_effect = lambda users, canvas_api, job_id: [{'id': 1} for _ in users]
+
+        enroll_um_users_task.enroll_um_users_chunk(job.id, 0)
+
+        enrolled = [user.loginId for user in mock_gather_enrollments.call_args.args[0]]
+        self.assertEqual(enrolled, ['student1'])
+        self.assertEqual(set(job.rows.filter(chunk=0).values_list('status', flat=True)), {EnrollmentJobRow.Status.SUCCEEDED})
+
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.gather_enrollments')
+    def test_chunk_skips_rows_running_in_another_task(self, mock_gather_enrollments):
+        job = self.create_job()
+        job.rows.filter(chunk=2).update(status=EnrollmentJobRow.Status.RUNNING, updated_at=timezone.now())
+
+        enroll_um_users_task.enroll_um_users_chunk(job.id, 2)
+
+        mock_gather_enrollments.assert_not_called()
+        self.assertTrue(job.rows.filter(chunk=2, status=EnrollmentJobRow.Status.RUNNING).exists())
+
 class TestProcessLoginId(SimpleTestCase):
     def test_umich_edu(self):
         self.assertEqual(process_login_id("student@umich.edu"), "student")
@@ -330,114 +612,85 @@ class TestProcessLoginId(SimpleTestCase):
         self.assertEqual(process_login_id("student.jane@complex.domain.com"), "student.jane+complex.domain.com")
 
 
-class TestEnrollUser(SimpleTestCase):
-    @patch('backend.ccm.canvas_api.enroll_users.Section')
-    def test_enroll_user_success(self, mock_section):
-        # Setup
-        mock_canvas = MagicMock(spec=Canvas)
-        section_id = 123
-        login_id = 'student@umich.edu'
-        role = 'student'
-
-        # Add the _Canvas__requester attribute to mock_canvas
-        mock_requester = MagicMock()
-        mock_canvas._Canvas__requester = mock_requester
-
-        # Mock Section instance and its _requester
-        mock_section_instance = MagicMock(spec=Section)
-        mock_section.return_value = mock_section_instance
-        mock_section_instance._requester = mock_requester
-
-        # Mock response from Canvas API
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
-            'id': 1,
-            'course_id': 10,
-            'course_section_id': 123,
-            'user_id': '304',
-            'type': 'StudentEnrollment'
-        }
-        mock_requester.request.return_value = mock_response
+class TestDeduplicateEnrollments(SimpleTestCase):
+    def test_duplicates_after_login_id_processing_are_skipped(self):
+        kept, skipped = deduplicate_enrollments([
+            {'loginId': 'student', 'role': 'student', 'sectionId': 1},
+            {'loginId': 'STUDENT@umich.edu', 'role': 'Student', 'sectionId': 1},
+            {'loginId': 'student', 'role': 'student', 'sectionId': 2},
+        ])
+        self.assertEqual([param['sectionId'] for param in kept], [1, 2])
+        self.assertEqual(skipped, [{'loginId': 'STUDENT@umich.edu', 'role': 'Student', 'sectionId': 1, 'error': 'Duplicate of an earlier row'}])
 
-        # Patch Enrollment to just return the dict for test
-        with patch('backend.ccm.canvas_api.enroll_users.Enrollment', side_effect=lambda requester, data: data):
-            with patch('backend.ccm.canvas_api.enroll_users.CanvasObjectROSerializer', side_effect=lambda obj, allowed_fields=None: MagicMock(data=obj)):
-                result = enroll_user(mock_canvas, section_id, login_id, role)
-                print(result)
+    def test_rows_with_different_roles_are_not_duplicates(self):
+        # Conflicting roles are rejected when the request is validated
+        kept, skipped = deduplicate_enrollments([
+            {'loginId': 'student', 'role': 'ta', 'sectionId': 1},
+            {'loginId': 'student', 'role': 'student', 'sectionId': 1},
+        ])
+        self.assertEqual([param['role'] for param in kept], ['ta', 'student'])
+        self.assertEqual(skipped, [])
+
+
+class TestEnrollUser(SimpleTestCase):
 
-        # Assert
-        mock_section.assert_called_once_with(mock_canvas._Canvas__requester, {'id': section_id})
-        mock_requester.request.assert_called_once()
+    def setUp(self):
+        clear_rate_limiters()
+
+    @staticmethod
+    def make_client(handler) -> AsyncCanvasClient:
+        return AsyncCanvasClient('https://canvas.test.edu', 'test_token', transport=httpx.MockTransport(handler))
+
+    async def test_enroll_user_success(self):
+        captured = []
+        def handler(request: httpx.Request):
+            captured.append(request)
+            return httpx.Response(200, json={
+                'id': 1,
+                'course_id': 10,
+                'course_section_id': 123,
+                'user_id': '304',
+                'type': 'StudentEnrollment'
+            })
+
+        async with self.make_client(handler) as client:
+            result = await enroll_user_async(client, 123, 'student@umich.edu', 'student')
+
+        self.assertEqual(len(captured), 1)
+        self.assertEqual(captured[0].url.path, '/api/v1/sections/123/enrollments')
         self.assertEqual(result['type'], 'StudentEnrollment')
         self.assertIn('user_id', result)
 
-    @patch('backend.ccm.canvas_api.enroll_users.Section')
-    def test_enroll_user_canvas_exception(self, mock_section):
-        """Test enroll_user raises CanvasException and propagates it (unhappy path)."""
+    async def test_enroll_user_canvas_exception(self):
+        """Test enroll_user_async raises CanvasException and propagates it (unhappy path)."""
         from canvasapi.exceptions import CanvasException
-        mock_canvas = MagicMock(spec=Canvas)
-        section_id = 999
-        login_id = 'fail@umich.edu'
-        role = 'student'
-        mock_requester = MagicMock()
-        mock_canvas._Canvas__requester = mock_requester
-        mock_section_instance = MagicMock(spec=Section)
-        mock_section.return_value = mock_section_instance
-        mock_section_instance._requester = mock_requester
-        # Simulate CanvasException on request
-        mock_requester.request.side_effect = CanvasException('API error')
-        with self.assertRaises(CanvasException) as ctx:
-            enroll_user(mock_canvas, section_id, login_id, role)
-        self.assertIn('API error', str(ctx.exception))
-
-    @patch('backend.ccm.canvas_api.enroll_users.Section')
-    @patch('backend.ccm.canvas_api.enroll_users.settings')
-    def test_enroll_user_custom_role_success(self, mock_settings, mock_section):
-        # Setup
-        mock_canvas = MagicMock(spec=Canvas)
-        section_id = 456
-        login_id = 'librarian@umich.edu'
-        role = 'librarian'
-
-        # Add the _Canvas__requester attribute to mock_canvas
-        mock_requester = MagicMock()
-        mock_canvas._Canvas__requester = mock_requester
-
-        # Mock Section instance and its _requester
-        mock_section_instance = MagicMock(spec=Section)
-        mock_section.return_value = mock_section_instance
-        mock_section_instance._requester = mock_requester
-
-        # Mock response from Canvas API
-        mock_response = MagicMock()
-        mock_response.json.return_value = {
-            'id': 2,
-            'course_id': 20,
-            'course_section_id': 456,
-            'user_id': '305',
-            'type': 'DesignerEnrollment'
-        }
-        mock_requester.request.return_value = mock_response
+        async with self.make_client(lambda request: httpx.Response(500, text='API error')) as client:
+            with self.assertRaises(CanvasException):
+                await enroll_user_async(client, 999, 'fail@umich.edu', 'student')
 
-        # Mock settings.CUSTOM_CANVAS_ROLES
+    @patch('backend.ccm.canvas_api.enroll_users.settings')
+    async def test_enroll_user_custom_role_success(self, mock_settings):
         mock_settings.CUSTOM_CANVAS_ROLES = {'librarian': 21}
+        captured = []
+        def handler(request: httpx.Request):
+            captured.append(dict(parse_qsl(request.content.decode())))
+            return httpx.Response(200, json={
+                'id': 2,
+                'course_id': 20,
+                'course_section_id': 456,
+                'user_id': '305',
+                'type': 'DesignerEnrollment'
+            })
+
+        async with self.make_client(handler) as client:
+            result = await enroll_user_async(client, 456, 'librarian@umich.edu', 'librarian')
 
-        # Patch Enrollment to just return the dict for test
-        with patch('backend.ccm.canvas_api.enroll_users.Enrollment', side_effect=lambda requester, data: data):
-            with patch('backend.ccm.canvas_api.enroll_users.CanvasObjectROSerializer', side_effect=lambda obj, allowed_fields=None: MagicMock(data=obj)):
-                result = enroll_user(mock_canvas, section_id, login_id, role)
-                print(result)
-
-        # Assert
-        mock_section.assert_called_once_with(mock_canvas._Canvas__requester, {'id': section_id})
-        mock_requester.request.assert_called_once()
         self.assertTrue(result, "Result should not be empty")
         self.assertIn('type', result, "Result should contain 'type' key")
         self.assertEqual(result['type'], 'DesignerEnrollment')
         self.assertIn('user_id', result)
         # Ensure the custom role id was used
-        called_kwargs = dict(mock_requester.request.call_args.kwargs['_kwargs'])
-        self.assertEqual(called_kwargs['enrollment[role_id]'], 21)
+        self.assertEqual(captured[0]['enrollment[role_id]'], '21')
 
 
 class TestEmailEnrollmentSummary(TestCase):
@@ -449,7 +702,7 @@ class TestEmailEnrollmentSummary(TestCase):
             {'sectionId': 2, 'loginId': 'user2', 'role': 'teacher', 'error': 'Another error'}
         ]
         self.enrollment_count = 5
-    @patch('backend.ccm.background_tasks.enroll_um_users_task.send_email')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.queue_email')
     def test_email_subject_and_body(self, mock_send_email):
         enroll_um_users_task.email_enrollment_summary(
             req_user_email=self.req_user_email,
@@ -479,7 +732,7 @@ class TestEmailEnrollmentSummary(TestCase):
             {'sectionId': 2, 'loginId': 'user2', 'role': 'teacher', 'error': 'Another error'}
         ]
 
-    @patch('backend.ccm.background_tasks.enroll_um_users_task.send_email')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.queue_email')
     def test_email_enrollment_summary_calls_send_email(self, mock_send_email):
         req_user_email = 'testuser@example.com'
         course_id = 123
@@ -498,4 +751,46 @@ class TestEmailEnrollmentSummary(TestCase):
         self.assertEqual(kwargs['to_email'], req_user_email)
         self.assertIn(str(course_id), kwargs['subject'])
         self.assertIn('failures', kwargs['body'])
-        self.assertIsNotNone(kwargs['attachment'])
\ No newline at end of file
+        self.assertIsNotNone(kwargs['attachment'])
+
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.ENROLLMENT_REPORT_LINK_MIN_BYTES', 100)
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.queue_email')
+    def test_email_links_large_report_instead_of_attaching(self, mock_send_email):
+        enroll_um_users_task.email_enrollment_summary(
+            req_user_email=self.req_user_email,
+            course_id=self.course_id,
+            failed_enrollments=iter(self.failed_enrollments),
+            total_enrollment_count=self.enrollment_count,
+            report_url='https://ccm.example.com/api/course/123/enrollment-jobs/abc/report'
+        )
+        kwargs = mock_send_email.call_args.kwargs
+        self.assertEqual(kwargs['subject'], f"For course {self.course_id}, 3/5 enrollments finished successfully (2 failed)")
+        self.assertIn("<a href='https://ccm.example.com/api/course/123/enrollment-jobs/abc/report'>Download the report</a>", kwargs['body'])
+        self.assertIsNone(kwargs['attachment'])
+
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.queue_email')
+    def test_email_attaches_small_report_even_with_link(self, mock_send_email):
+        enroll_um_users_task.email_enrollment_summary(
+            req_user_email=self.req_user_email,
+            course_id=self.course_id,
+            failed_enrollments=iter(self.failed_enrollments),
+            total_enrollment_count=self.enrollment_count,
+            report_url='https://ccm.example.com/api/course/123/enrollment-jobs/abc/report'
+        )
+        kwargs = mock_send_email.call_args.kwargs
+        self.assertIn('See attachment for error list', kwargs['body'])
+        self.assertNotIn('Download the report', kwargs['body'])
+        self.assertIn('Some error', kwargs['attachment'][1])
+
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.queue_email')
+    def test_email_reports_skipped_rows(self, mock_send_email):
+        enroll_um_users_task.email_enrollment_summary(
+            req_user_email=self.req_user_email,
+            course_id=self.course_id,
+            failed_enrollments=[],
+            total_enrollment_count=self.enrollment_count,
+            skipped_enrollments=[{'sectionId': 1, 'loginId': 'user1', 'role': 'student', 'error': 'Duplicate of an earlier row'}]
+        )
+        kwargs = mock_send_email.call_args.kwargs
+        self.assertEqual(kwargs['subject'], f"For course {self.course_id}, 5/5 enrollments finished successfully (1 duplicate rows skipped)")
+        self.assertIn('Duplicate of an earlier row', kwargs['attachment'][1])
\ No newline at end of file
@@ -0,0 +1,169 @@
+import gzip
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_tracking.models import APIRequestLog
+
+from backend.ccm.background_tasks.enrollment_progress import record_enrollment_result
+from backend.ccm.background_tasks.enrollment_report import enrollment_report_token
+from backend.ccm.models import EnrollmentJob, EnrollmentJobRow
+
+class EnrollmentJobProgressAPIHandlerTests(APITestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.course_id = 99
+        self.job = EnrollmentJob.objects.create(user=self.user, course_id=self.course_id, canvas_callback_url='http://callback/', task_id='abc123')
+        statuses = [EnrollmentJobRow.Status.SUCCEEDED, EnrollmentJobRow.Status.FAILED] + [EnrollmentJobRow.Status.RUNNING] * 3 + [EnrollmentJobRow.Status.PENDING] * 5
+        EnrollmentJobRow.objects.bulk_create([
+            EnrollmentJobRow(job=self.job, chunk=index // 5, section_id=123, login_id=f'student{index}', role='student', status=row_status)
+            for index, row_status in enumerate(statuses)
+        ])
+        self.url = reverse('enrollmentJobProgress', kwargs={'course_id': self.course_id, 'job_id': self.job.id})
+
+    def test_running_job_reports_hot_counters(self):
+        # Enrollments of the running chunk finished but its rows have not been written yet
+        for succeeded in (True, True, True, False):
+            async_to_sync(record_enrollment_result)(self.job.id, succeeded)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {
+            'job_id': self.job.id, 'course_id': self.course_id, 'completed': False,
+            'total': 10, 'processed': 4, 'succeeded': 3, 'failed': 1, 'skipped': 0
+        })
+
+    def test_running_job_without_counters_reports_rows(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual((response.data['processed'], response.data['succeeded'], response.data['failed']), (2, 1, 1))
+
+    def test_completed_job_reports_rows(self):
+        self.job.rows.exclude(status=EnrollmentJobRow.Status.FAILED).update(status=EnrollmentJobRow.Status.SUCCEEDED)
+        EnrollmentJob.objects.filter(pk=self.job.pk).update(completed_at=timezone.now())
+        # Counters of a resumed chunk can exceed the rows, the rows are final once the job completes
+        cache.set(f'ccm:enrollment_job:{self.job.id}:succeeded', 12)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['completed'])
+        self.assertEqual((response.data['processed'], response.data['succeeded'], response.data['failed']), (10, 9, 1))
+
+    def test_job_of_another_user_is_not_found(self):
+        other_user = User.objects.create_user(username='otheruser', password='testpass')
+        self.client.force_authenticate(user=other_user)
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data['errors'][0]['failedInput'], str(self.job.id))
+
+    def test_job_not_queued_yet_is_found(self):
+        # A repeated request can return the job before the first request stored its task id
+        EnrollmentJob.objects.filter(pk=self.job.pk).update(task_id='')
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['job_id'], self.job.id)
+
+    def test_job_of_another_course_is_not_found(self):
+        response = self.client.get(reverse('enrollmentJobProgress', kwargs={'course_id': 100, 'job_id': self.job.id}))
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class EnrollmentJobReportAPIHandlerTests(APITestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass')
+        self.client.force_authenticate(user=self.user)
+        self.job = EnrollmentJob.objects.create(user=self.user, course_id=99, canvas_callback_url='http://callback/', task_id='abc123')
+        EnrollmentJobRow.objects.bulk_create([
+            EnrollmentJobRow(job=self.job, chunk=0, section_id=123, login_id='student0', role='student', status=EnrollmentJobRow.Status.SUCCEEDED),
+            EnrollmentJobRow(job=self.job, chunk=0, section_id=123, login_id='student1', role='student', status=EnrollmentJobRow.Status.FAILED, error='Not found'),
+            EnrollmentJobRow(job=self.job, chunk=0, section_id=123, login_id='Student1', role='student', status=EnrollmentJobRow.Status.SKIPPED, error='Duplicate of an earlier row'),
+        ])
+        self.url = reverse('enrollmentJobReport', kwargs={'course_id': 99, 'job_id': self.job.id})
+
+    def test_report_is_served_compressed_and_stored_once_completed(self):
+        EnrollmentJob.objects.filter(pk=self.job.pk).update(completed_at=timezone.now())
+
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('course_99_enrollment_report.csv', response['Content-Disposition'])
+        self.assertEqual(gzip.decompress(response.content).decode().splitlines(), [
+            'sectionId,LoginId,role,ReasonForFailure',
+            '123,student1,student,Not found',
+            '123,Student1,student,Duplicate of an earlier row',
+        ])
+        self.job.refresh_from_db()
+        self.assertEqual(bytes(self.job.report), response.content)
+
+    def test_report_of_running_job_is_not_stored(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('123,student1,student,Not found', response.content.decode())
+        self.job.refresh_from_db()
+        self.assertIsNone(self.job.report)
+
+    def test_report_of_another_user_is_not_found(self):
+        self.client.force_authenticate(user=User.objects.create_user(username='otheruser', password='testpass'))
+
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_report_download_is_not_logged(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(APIRequestLog.objects.exists())
+
+    def test_report_link_token_downloads_without_session(self):
+        self.client.force_authenticate(user=None)
+
+        response = self.client.get(self.url, {'token': enrollment_report_token(self.job)})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('123,student1,student,Not found', response.content.decode())
+
+    def test_report_link_token_is_checked(self):
+        self.client.force_authenticate(user=None)
+        other_job = EnrollmentJob.objects.create(user=self.user, course_id=99, canvas_callback_url='http://callback/')
+
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.client.get(self.url, {'token': 'tampered'}).status_code, status.HTTP_403_FORBIDDEN)
+        # A token only grants the job it was signed for
+        self.assertEqual(self.client.get(self.url, {'token': enrollment_report_token(other_job)}).status_code, status.HTTP_404_NOT_FOUND)
+        with patch('backend.ccm.background_tasks.enrollment_report.ENROLLMENT_REPORT_LINK_MAX_AGE_SECONDS', -1):
+            self.assertEqual(self.client.get(self.url, {'token': enrollment_report_token(self.job)}).status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_report_link_token_is_bound_to_the_job_owner(self):
+        other_user = User.objects.create_user(username='otheruser', password='testpass')
+        self.job.user = other_user
+        token = enrollment_report_token(self.job)
+        self.job.refresh_from_db()
+
+        # A token signed for another user does not grant the owner's job
+        self.client.force_authenticate(user=None)
+        self.assertEqual(self.client.get(self.url, {'token': token}).status_code, status.HTTP_404_NOT_FOUND)
+
+        # The session of another user does not grant the job either
+        self.client.force_authenticate(user=other_user)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,37 @@
+import gzip
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from backend.ccm.background_tasks import enrollment_report
+from backend.ccm.background_tasks.enrollment_report import EnrollmentReport
+
+def failures(count):
+    return ({'sectionId': 1, 'loginId': f'user{i}', 'role': 'student', 'error': 'Not found'} for i in range(count))
+
+class EnrollmentReportTests(SimpleTestCase):
+
+    def test_small_report_is_attached_as_csv(self):
+        with EnrollmentReport() as report:
+            for item in failures(2):
+                report.append(item)
+            filename, content, mime_type = report.attachment('course_1_failures.csv')
+
+        self.assertEqual((filename, mime_type), ('course_1_failures.csv', 'text/csv'))
+        self.assertEqual(content.splitlines(), [
+            'sectionId,LoginId,role,ReasonForFailure', '1,user0,student,Not found', '1,user1,student,Not found'
+        ])
+
+    @patch.object(enrollment_report, 'ENROLLMENT_REPORT_COMPRESS_MIN_BYTES', 1024)
+    @patch.object(enrollment_report, 'ENROLLMENT_REPORT_SPOOL_MAX_BYTES', 512)
+    def test_large_report_spills_to_disk_and_is_compressed(self):
+        with EnrollmentReport() as report:
+            for item in failures(1000):
+                report.append(item)
+            self.assertTrue(report._file._rolled)
+            filename, content, mime_type = report.attachment('course_1_failures.csv')
+
+        self.assertEqual((filename, mime_type), ('course_1_failures.csv.gz', 'application/gzip'))
+        lines = gzip.decompress(content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 1001)
+        self.assertEqual(lines[-1], '1,user999,student,Not found')
@@ -1,5 +1,6 @@
 
 from unittest.mock import patch, MagicMock
+from django.core.cache import cache
 from django.test import RequestFactory
 from django.urls import reverse
 from rest_framework.test import APITestCase
@@ -10,47 +11,34 @@ from rest_framework.exceptions import ErrorDetail
 
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
 
-def make_mock_section(section_data={}):
+# Raw Canvas JSON (or the exception to raise) served by the fake AsyncCanvasClient, keyed by endpoint
+MOCK_CANVAS_ROWS = {}
+
+def make_mock_course(course_data={}, sections=[], raise_exception=False):
     """
-    Returns a MagicMock representing a Canvas Section, or raises an exception if specified.
-    section_data: dict of section fields (id, name, course_id, ...)
-    raise_exception: Exception to raise when accessed (simulates CanvasException)
+    Returns the raw JSON of a Canvas Course and registers its raw sections JSON.
+    sections: list of section dicts returned by the courses/:id/sections endpoint
+    raise_exception: Exception to raise when the sections are requested
     """
-    mock_section = MagicMock()
-    if section_data:
-        for k, v in section_data.items():
-            setattr(mock_section, k, v)
-        # For serializer compatibility, support dict-like access
-        mock_section.__getitem__.side_effect = section_data.__getitem__
-        mock_section.get.side_effect = section_data.get
-    return mock_section
+    MOCK_CANVAS_ROWS[f"courses/{course_data.get('id')}/sections"] = raise_exception or list(sections)
+    return dict(course_data)
 
-def make_mock_course(course_data={}, sections=[], raise_exception=False):
+def make_mock_async_canvas_client():
     """
-    Returns a MagicMock representing a Canvas Course, with a get_sections method.
-    sections: list of MagicMock sections or dicts (will be wrapped)
-    raise_exception: Exception to raise when get_sections is called
+    Returns a MagicMock AsyncCanvasClient class whose client pages through MOCK_CANVAS_ROWS.
     """
-    mock_course = MagicMock()
-    if raise_exception:
-        mock_course.get_sections.side_effect = raise_exception
-    else:
-        # Accept both dicts and MagicMock sections
-        section_objs = []
-        for s in (sections):
-            if isinstance(s, dict):
-                section_objs.append(make_mock_section(s))
-            else:
-                section_objs.append(s)
-        mock_course.get_sections.return_value = section_objs
-    if course_data:
-        for k, v in course_data.items():
-            setattr(mock_course, k, v)
-        # For serializer compatibility, support dict-like access
-        mock_course.__getitem__.side_effect = course_data.__getitem__
-        mock_course.get.side_effect = course_data.get
-
-    return mock_course
+    async def get_paginated(endpoint, **kwargs):
+        rows = MOCK_CANVAS_ROWS.get(endpoint, [])
+        if isinstance(rows, Exception):
+            raise rows
+        for row in rows:
+            yield row
+
+    mock_client = MagicMock()
+    mock_client.get_paginated.side_effect = get_paginated
+    mock_client_class = MagicMock()
+    mock_client_class.from_canvas.return_value.__aenter__.return_value = mock_client
+    return mock_client_class
 
 class CanvasInstructorSectionsAPIHandlerTests(APITestCase):
     def setUp(self):
@@ -59,10 +47,14 @@ class CanvasInstructorSectionsAPIHandlerTests(APITestCase):
         self.client.force_authenticate(user=self.user)
         self.url = reverse('instructorSections')
         self.request_factory = RequestFactory()
+        cache.clear()
+        MOCK_CANVAS_ROWS.clear()
+        client_patcher = patch('backend.ccm.canvas_api.instructor_sections_api_handler.AsyncCanvasClient', make_mock_async_canvas_client())
+        self.mock_client_class = client_patcher.start()
+        self.addCleanup(client_patcher.stop)
 
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_get_instructor_sections_success(self, mock_get_canvasapi_instance):
-        mock_canvas = mock_get_canvasapi_instance.return_value
 
         section_1 = {'id': 111, 'name': 'Section 1', 'course_id': 1, 'nonxlist_course_id': None, 'total_students': 10}
         section_2 = {'id': 112, 'name': 'Section 2', 'course_id': 1, 'nonxlist_course_id': None, 'total_students': 8}
@@ -74,7 +66,7 @@ class CanvasInstructorSectionsAPIHandlerTests(APITestCase):
         course_4 = {'id': 4, 'name': 'Course 4', 'enrollment_term_id': 2}  # different term
         
         # Only courses with matching term_id should be included
-        mock_canvas.get_courses.return_value = [
+        MOCK_CANVAS_ROWS['courses'] = [
             make_mock_course(course_1, sections=[section_1, section_2]),
             make_mock_course(course_2, sections=[section_3]),
             make_mock_course(course_3, sections=[]),  # no sections
@@ -95,6 +87,13 @@ class CanvasInstructorSectionsAPIHandlerTests(APITestCase):
         self.assertEqual(resp_by_course_id[1]['sections'][0]['id'], section_1['id'])
         self.assertEqual(resp_by_course_id[1]['sections'][1]['id'], section_2['id'])
         self.assertEqual(resp_by_course_id[2]['sections'][0]['id'], section_3['id'])
+
+        # Teacher courses are read in one paginated walk, and the course for another term gets no sections request
+        mock_client = self.mock_client_class.from_canvas.return_value.__aenter__.return_value
+        mock_client.get_paginated.assert_any_call('courses', enrollment_type='teacher', per_page=100)
+        requested_endpoints = [call.args[0] for call in mock_client.get_paginated.call_args_list]
+        self.assertEqual(requested_endpoints.count('courses'), 1)
+        self.assertNotIn('courses/4/sections', requested_endpoints)
     
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_get_instructor_sections_no_term_id(self, mock_get_canvasapi_instance):
@@ -107,8 +106,7 @@ class CanvasInstructorSectionsAPIHandlerTests(APITestCase):
     
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_get_instructor_sections_no_courses(self, mock_get_canvasapi_instance):
-        mock_canvas = mock_get_canvasapi_instance.return_value
-        mock_canvas.get_courses.return_value = []
+        MOCK_CANVAS_ROWS['courses'] = []
 
         response = self.client.get(f'{self.url}?term_id={self.term_id}')
 
@@ -117,8 +115,7 @@ class CanvasInstructorSectionsAPIHandlerTests(APITestCase):
 
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_get_instructor_sections_exception_on_course(self, mock_get_canvasapi_instance):
-        mock_canvas = mock_get_canvasapi_instance.return_value
-        mock_canvas.get_courses.side_effect = CanvasException('Canvas API error')
+        MOCK_CANVAS_ROWS['courses'] = CanvasException('Canvas API error')
 
         response = self.client.get(f'{self.url}?term_id={self.term_id}')
         
@@ -137,11 +134,9 @@ class CanvasInstructorSectionsAPIHandlerTests(APITestCase):
 
     @patch.object(CanvasCredentialManager, 'get_canvasapi_instance')
     def test_get_instructor_sections_exception_on_sections(self, mock_get_canvasapi_instance):
-        mock_canvas = mock_get_canvasapi_instance.return_value
-
         # Mock a course with an exception when getting sections
         course1 = make_mock_course({'id':1, 'name':'Course 1', 'enrollment_term_id':self.term_id}, raise_exception=CanvasException('Canvas API error'))
-        mock_canvas.get_courses.return_value = [course1]
+        MOCK_CANVAS_ROWS['courses'] = [course1]
 
         response = self.client.get(f'{self.url}?term_id={self.term_id}')
 
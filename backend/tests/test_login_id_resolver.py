@@ -0,0 +1,150 @@
+import asyncio
+from unittest.mock import AsyncMock, MagicMock, patch
+from urllib.parse import parse_qsl
+
+import httpx
+from canvasapi.exceptions import ResourceDoesNotExist
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from backend.ccm.background_tasks.enroll_um_users_task import EnrollmentUser, gather_enrollments
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
+from backend.ccm.canvas_api.login_id_resolver import (
+    LoginIdResolution, enroll_resolving_login_id, load_login_id_resolution, save_login_id_resolution
+)
+from backend.ccm.canvas_api.rate_limiter import clear_rate_limiters
+
+BASE_URL = 'https://canvas.test.edu'
+CANVAS_USERS = {'sis_login_id:student1': 101, 'sis_login_id:guest+gmail.com': 102}
+
+class EnrollResolvingLoginIdTests(SimpleTestCase):
+
+    def setUp(self):
+        cache.clear()
+        clear_rate_limiters()
+        self.requests = []
+
+    def handler(self, request: httpx.Request):
+        if request.method == 'GET':
+            user = request.url.path.rsplit('/', 1)[-1]
+            self.requests.append(('GET', user))
+            if user == 'sis_login_id:hidden':
+                return httpx.Response(401, json={'errors': [{'message': 'user not authorized to perform that action'}]})
+            if user not in CANVAS_USERS:
+                return httpx.Response(404, json={'errors': [{'message': 'The specified resource does not exist.'}]})
+            return httpx.Response(200, json={'id': CANVAS_USERS[user], 'login_id': user.split(':', 1)[1]})
+        user = dict(parse_qsl(request.content.decode()))['enrollment[user_id]']
+        self.requests.append(('POST', user))
+        user_id = CANVAS_USERS.get(user, int(user) if user.isdigit() else None)
+        if user_id is None:
+            return httpx.Response(404, json={'errors': [{'message': 'The specified resource does not exist.'}]})
+        return httpx.Response(200, json={'id': 1, 'course_section_id': 456, 'user_id': user_id, 'type': 'StudentEnrollment'})
+
+    async def enroll(self, login_ids, section_ids=(456,)):
+        rows = [(section_id, login_id) for section_id in section_ids for login_id in login_ids]
+        results = []
+        async with AsyncCanvasClient(BASE_URL, 'user_token', transport=httpx.MockTransport(self.handler)) as client:
+            resolution = await load_login_id_resolution(client, [login_id for _, login_id in rows])
+            for section_id, login_id in rows:
+                try:
+                    results.append(await enroll_resolving_login_id(client, resolution, section_id, login_id, 'student'))
+                except ResourceDoesNotExist as e:
+                    results.append(e)
+        await save_login_id_resolution(resolution)
+        return results
+
+    async def test_single_row_users_are_enrolled_without_lookups(self):
+        results = await self.enroll(['student1', 'guest@gmail.com', 'nobody'])
+
+        self.assertEqual(self.requests, [
+            ('POST', 'sis_login_id:student1'), ('POST', 'sis_login_id:guest+gmail.com'), ('POST', 'sis_login_id:nobody')
+        ])
+        self.assertEqual([result['user_id'] for result in results[:2]], [101, 102])
+        self.assertIsInstance(results[2], ResourceDoesNotExist)
+
+    async def test_user_ids_learned_from_enrollments_are_cached(self):
+        await self.enroll(['student1'])
+        self.requests.clear()
+
+        await self.enroll(['student1@umich.edu'], section_ids=[456, 789])
+
+        self.assertEqual(self.requests, [('POST', '101'), ('POST', '101')])
+
+    async def test_repeated_login_ids_are_looked_up_once_before_enrolling(self):
+        results = await self.enroll(['student1', 'guest@gmail.com'], section_ids=[456, 789])
+
+        self.assertEqual(sorted(self.requests[:2]), [('GET', 'sis_login_id:guest+gmail.com'), ('GET', 'sis_login_id:student1')])
+        self.assertEqual(self.requests[2:], [('POST', '101'), ('POST', '102')] * 2)
+        self.assertEqual([result['user_id'] for result in results], [101, 102] * 2)
+
+    async def test_repeated_unknown_login_id_fails_without_enrollment_call(self):
+        results = await self.enroll(['nobody'], section_ids=[456, 789])
+
+        self.assertEqual(self.requests, [('GET', 'sis_login_id:nobody')])
+        self.assertIsInstance(results[0], ResourceDoesNotExist)
+        self.assertIsInstance(results[1], ResourceDoesNotExist)
+
+        # Unknown login IDs are not cached, they may be created before the next job
+        self.requests.clear()
+        await self.enroll(['nobody'])
+        self.assertEqual(self.requests, [('POST', 'sis_login_id:nobody')])
+
+    async def test_failed_lookup_falls_back_to_sis_login_id(self):
+        # The instructor cannot see the user yet, but can enroll them
+        with patch.dict(CANVAS_USERS, {'sis_login_id:hidden': 103}):
+            results = await self.enroll(['hidden'], section_ids=[456, 789])
+
+        # The user id returned by the first enrollment is used for the user's next section
+        self.assertEqual(self.requests, [('GET', 'sis_login_id:hidden'), ('POST', 'sis_login_id:hidden'), ('POST', '103')])
+        self.assertEqual([result['user_id'] for result in results], [103, 103])
+        self.assertEqual(cache.get('ccm:canvas_user_id:hidden'), 103)
+
+    @patch('backend.ccm.canvas_api.login_id_resolver.LOGIN_ID_RESOLUTION_BATCH_SIZE', 2)
+    async def test_lookups_are_sent_in_bounded_batches(self):
+        in_flight = max_in_flight = 0
+
+        async def look_up(method, endpoint):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0)
+            in_flight -= 1
+            response = MagicMock()
+            response.json.return_value = {'id': int(endpoint.rsplit('user', 1)[-1])}
+            return response
+        client = MagicMock()
+        client.request = AsyncMock(side_effect=look_up)
+
+        resolution = await load_login_id_resolution(client, [f'user{index}' for index in range(5)] * 2 + ['single'])
+
+        self.assertEqual(client.request.call_count, 5)
+        self.assertEqual(max_in_flight, 2)
+        self.assertEqual(resolution.learned_user_ids, {f'user{index}': index for index in range(5)})
+
+class GatherEnrollmentsResolutionTests(SimpleTestCase):
+
+    @patch('backend.ccm.canvas_api.login_id_resolver.enroll_user_async', new_callable=AsyncMock)
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.AsyncCanvasClient')
+    @patch('backend.ccm.background_tasks.enroll_um_users_task.load_login_id_resolution', new_callable=AsyncMock)
+    def test_unknown_users_fail_without_enrollment_call(self, mock_load, mock_client_class, mock_enroll_user_async):
+        cache.clear()
+        mock_load.return_value = LoginIdResolution(user_ids={'student1': 101}, unknown_login_ids={'nobody'})
+        mock_client = MagicMock()
+        mock_client_class.from_canvas.return_value.__aenter__.return_value = mock_client
+        mock_enroll_user_async.return_value = {'id': 1, 'user_id': 103}
+
+        results = gather_enrollments([
+            EnrollmentUser(loginId='Student1', role='Student', sectionId=123),
+            EnrollmentUser(loginId='nobody', role='student', sectionId=123),
+            EnrollmentUser(loginId='other', role='student', sectionId=123),
+        ], MagicMock())
+
+        self.assertEqual(results[0], {'id': 1, 'user_id': 103})
+        self.assertIsInstance(results[1], ResourceDoesNotExist)
+        self.assertEqual(results[2], {'id': 1, 'user_id': 103})
+        self.assertEqual(mock_load.call_args.args[0], mock_client)
+        self.assertEqual(
+            [call.args for call in mock_enroll_user_async.call_args_list],
+            [(mock_client, 123, 'student1', 'student', 101), (mock_client, 123, 'other', 'student', None)]
+        )
+        self.assertEqual(cache.get('ccm:canvas_user_id:other'), 103)
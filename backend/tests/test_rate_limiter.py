@@ -0,0 +1,112 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+from django.test import SimpleTestCase
+from canvasapi.exceptions import RateLimitExceeded
+
+from backend.ccm.canvas_api.async_canvas_client import AsyncCanvasClient
+from backend.ccm.canvas_api.rate_limiter import AdaptiveConcurrencyLimiter, clear_rate_limiters, get_rate_limiter
+
+BASE_URL = 'https://canvas.test.edu'
+
+class AdaptiveConcurrencyLimiterTests(SimpleTestCase):
+
+    def test_limit_grows_while_bucket_is_healthy(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=10, max_limit=12)
+        for _ in range(10):
+            limiter.on_response(650.0)
+        self.assertAlmostEqual(limiter.limit, 11, delta=0.1)
+        for _ in range(100):
+            limiter.on_response(None)
+        self.assertEqual(limiter.limit, 12)
+
+    def test_limit_halves_once_per_cooldown_when_bucket_drains(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=16, min_limit=2, low_watermark=300, decrease_cooldown=60)
+        limiter.on_response(120.0)
+        limiter.on_response(100.0)
+        limiter.on_throttled()
+        self.assertEqual(limiter.limit, 8)
+
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=3, min_limit=2, decrease_cooldown=0)
+        limiter.on_throttled()
+        limiter.on_throttled()
+        self.assertEqual(limiter.limit, 2)
+
+    async def test_acquire_waits_for_a_free_slot(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=2)
+        running = 0
+        max_running = 0
+
+        async def call():
+            nonlocal running, max_running
+            async with limiter.slot():
+                running += 1
+                max_running = max(max_running, running)
+                await asyncio.sleep(0.01)
+                running -= 1
+
+        await asyncio.gather(*(call() for _ in range(6)))
+        self.assertEqual(max_running, 2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_cancelled_waiter_does_not_leak_a_slot(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        limiter.release()
+        self.assertEqual(limiter.in_flight, 0)
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+    async def test_waiter_cancelled_after_grant_does_not_leak_a_slot(self):
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1)
+        await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.sleep(0)
+        # _grant() has resolved the waiter's future but the waiter has not resumed yet
+        waiter.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await waiter
+        self.assertEqual(limiter.in_flight, 0)
+        await asyncio.wait_for(limiter.acquire(), timeout=1)
+
+    def test_limiter_is_shared_per_access_token(self):
+        clear_rate_limiters()
+        self.assertIs(get_rate_limiter('token_a'), get_rate_limiter('token_a'))
+        self.assertIsNot(get_rate_limiter('token_a'), get_rate_limiter('token_b'))
+
+@patch('backend.ccm.canvas_api.async_canvas_client.CANVAS_RATE_LIMIT_RETRY_BASE_SECONDS', 0)
+class AsyncCanvasClientRateLimitTests(SimpleTestCase):
+
+    async def test_throttled_call_is_retried(self):
+        responses = [
+            httpx.Response(403, text='403 Forbidden (Rate Limit Exceeded)', headers={'X-Rate-Limit-Remaining': '0.0'}),
+            httpx.Response(200, json={'id': 1}, headers={'X-Rate-Limit-Remaining': '500.0'}),
+        ]
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=10)
+        transport = httpx.MockTransport(lambda request: responses.pop(0))
+        async with AsyncCanvasClient(BASE_URL, 'test_token', transport=transport, rate_limiter=limiter) as client:
+            response = await client.request('POST', 'sections/10/enrollments', enrollment={'type': 'StudentEnrollment'})
+
+        self.assertEqual(response.json(), {'id': 1})
+        self.assertEqual(responses, [])
+        # Halved by the throttled call, then increased by the successful retry
+        self.assertAlmostEqual(limiter.limit, 5.2)
+        self.assertEqual(limiter.in_flight, 0)
+
+    async def test_rate_limit_exceeded_after_retries(self):
+        calls = []
+        def handler(request: httpx.Request):
+            calls.append(request)
+            return httpx.Response(403, text='403 Forbidden (Rate Limit Exceeded)')
+
+        async with AsyncCanvasClient(BASE_URL, 'test_token', transport=httpx.MockTransport(handler), max_retries=2) as client:
+            with self.assertRaises(RateLimitExceeded):
+                await client.request('GET', 'courses/1')
+        self.assertEqual(len(calls), 3)
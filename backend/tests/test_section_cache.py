@@ -0,0 +1,74 @@
+from unittest.mock import MagicMock, patch
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+
+from backend.ccm.canvas_api.section_cache import (
+    get_cached_section_course_ids, get_course_section_rows, invalidate_course_sections
+)
+
+SECTION_FIELDS = {"id", "name", "course_id", "nonxlist_course_id", "total_students"}
+
+def make_mock_client(sections_by_course: dict, access_token='token_a'):
+    async def get_paginated(endpoint, **kwargs):
+        course_id = int(endpoint.split('/')[1])
+        for section in sections_by_course[course_id]:
+            yield section
+
+    mock_client = MagicMock()
+    mock_client.access_token = access_token
+    mock_client.get_paginated.side_effect = get_paginated
+    return mock_client
+
+class SectionCacheTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.sections_by_course = {
+            1: [{'id': 11, 'name': 'Section 11', 'course_id': 1, 'nonxlist_course_id': None, 'total_students': 3, 'sis_section_id': 'x'}],
+            2: [{'id': 21, 'name': 'Section 21', 'course_id': 2, 'nonxlist_course_id': None, 'total_students': 5}],
+        }
+
+    async def test_rows_are_read_from_cache_after_first_fetch(self):
+        client = make_mock_client(self.sections_by_course)
+        first = await get_course_section_rows(client, 1, SECTION_FIELDS)
+        second = await get_course_section_rows(client, 1, SECTION_FIELDS)
+
+        self.assertEqual(first, [{'course_id': 1, 'id': 11, 'name': 'Section 11', 'nonxlist_course_id': None, 'total_students': 3}])
+        self.assertEqual(second, first)
+        client.get_paginated.assert_called_once_with('courses/1/sections', include=['total_students'])
+
+    async def test_rows_are_cached_per_access_token(self):
+        await get_course_section_rows(make_mock_client(self.sections_by_course), 1, SECTION_FIELDS)
+        other_client = make_mock_client(self.sections_by_course, access_token='token_b')
+        await get_course_section_rows(other_client, 1, SECTION_FIELDS)
+
+        other_client.get_paginated.assert_called_once()
+
+    async def test_invalidation_refetches_only_the_invalidated_course(self):
+        client = make_mock_client(self.sections_by_course)
+        await get_course_section_rows(client, 1, SECTION_FIELDS)
+        await get_course_section_rows(client, 2, SECTION_FIELDS)
+
+        invalidate_course_sections([1, None])
+        self.sections_by_course[1].append({'id': 12, 'name': 'Section 12', 'course_id': 1, 'nonxlist_course_id': None, 'total_students': 0})
+        rows = await get_course_section_rows(client, 1, SECTION_FIELDS)
+        await get_course_section_rows(client, 2, SECTION_FIELDS)
+
+        self.assertEqual([row['id'] for row in rows], [11, 12])
+        self.assertEqual(client.get_paginated.call_count, 3)
+
+    async def test_cached_section_course_ids(self):
+        client = make_mock_client(self.sections_by_course)
+        await get_course_section_rows(client, 1, SECTION_FIELDS)
+
+        self.assertEqual(get_cached_section_course_ids([11, 21]), {1})
+
+    @patch('backend.ccm.canvas_api.section_cache.cache')
+    async def test_cache_errors_fall_back_to_canvas(self, mock_cache):
+        mock_cache.aget.side_effect = ConnectionError('Redis unavailable')
+        client = make_mock_client(self.sections_by_course)
+
+        rows = await get_course_section_rows(client, 2, SECTION_FIELDS)
+
+        self.assertEqual([row['id'] for row in rows], [21])
+        mock_cache.aset_many.assert_not_called()
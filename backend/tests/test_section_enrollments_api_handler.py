@@ -1,16 +1,13 @@
+import asyncio
 from unittest.mock import MagicMock, patch
 from django.test import RequestFactory
 from django.urls import reverse
 from rest_framework.test import APITestCase
 from rest_framework import status
-from canvasapi.section import Section
-from canvasapi.enrollment import Enrollment
-from canvasapi.paginated_list import PaginatedList
 from django.contrib.auth.models import User
 from canvasapi.exceptions import CanvasException
 
 from backend.ccm.canvas_api.canvas_credential_manager import CanvasCredentialManager
-from backend.ccm.canvas_api.exceptions import CanvasErrorHandler, HTTPAPIError
 from backend.ccm.canvas_api.section_enrollments_api_handler import CanvasSectionEnrollmentsAPIHandler
 
 class CanvasSectionEnrollmentsAPIHandlerTests(APITestCase):
@@ -21,31 +18,31 @@ class CanvasSectionEnrollmentsAPIHandlerTests(APITestCase):
         self.request_factory = RequestFactory()
     
     # Mock Section Enrollment API handler view for testing
-    def get_mocked_view(self, mock_get_enrollments, enrollment_data=[], canvasException=None):
+    def get_mocked_view(self, mock_client_class, enrollment_data=[], canvasException=None):
         mock_canvas = MagicMock()
         mock_manager = MagicMock(spec=CanvasCredentialManager)
-        mock_canvas_error_handler = MagicMock(spec=CanvasErrorHandler)
 
-        if canvasException:
-            def side_effect(*args, **kwargs):
-                raise canvasException
-            mock_get_enrollments.side_effect = side_effect
-        else:
-            section_id_to_enrollments = {}
+        # Raw enrollment JSON served per section endpoint
+        section_id_to_enrollments = {}
+        if not canvasException:
             for section_id in self.section_ids: # hacky, only 3 sections & assuming section IDs start from 1
-                matched_enrollments = enrollment_data[section_id - 1] 
-                enrollments = [Enrollment(mock_canvas._Canvas__requester, data) for data in matched_enrollments]
-                mock_paginated = MagicMock(spec=PaginatedList)
-                mock_paginated.__iter__.return_value = iter(enrollments)
-                section_id_to_enrollments[str(section_id)] = mock_paginated
+                section_id_to_enrollments[f'sections/{section_id}/enrollments'] = enrollment_data[section_id - 1]
+
+        async def get_paginated(endpoint, **kwargs):
+            if canvasException:
+                raise canvasException
+            for enrollment in section_id_to_enrollments[endpoint]:
+                yield enrollment
 
-            mock_get_enrollments.side_effect = [section_id_to_enrollments[str(id)] for id in self.section_ids]
+        mock_client = MagicMock()
+        mock_client.get_paginated.side_effect = get_paginated
+        mock_client_class.from_canvas.return_value.__aenter__.return_value = mock_client
 
         mock_manager.get_canvasapi_instance.return_value = mock_canvas
         return CanvasSectionEnrollmentsAPIHandler(credential_manager=mock_manager)
     
-    @patch('canvasapi.section.Section.get_enrollments')
-    def test_get_section_enrollments_success(self, mock_get_enrollments):
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.AsyncCanvasClient')
+    def test_get_section_enrollments_success(self, mock_client_class):
         request = self.request_factory.get(self.url)
         request.user = self.user
         request.query_params = {'section_ids': ','.join(map(str, self.section_ids))}
@@ -102,7 +99,7 @@ class CanvasSectionEnrollmentsAPIHandlerTests(APITestCase):
                 }
             ]
         ]
-        view = self.get_mocked_view(mock_get_enrollments, enrollment_data=test_enrollments)
+        view = self.get_mocked_view(mock_client_class, enrollment_data=test_enrollments)
         response = view.get(request)
         # Assert the response
         self.assertEqual(response.status_code, status.HTTP_200_OK)
@@ -111,26 +108,26 @@ class CanvasSectionEnrollmentsAPIHandlerTests(APITestCase):
         self.assertIn('test_student_2', response.data)
         self.assertIn('test_student_3', response.data)
     
-    @patch('canvasapi.section.Section.get_enrollments')
-    def test_get_section_enrollments_empty(self, mock_get_enrollments):
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.AsyncCanvasClient')
+    def test_get_section_enrollments_empty(self, mock_client_class):
         request = self.request_factory.get(self.url)
         request.user = self.user
         request.query_params = {'section_ids': ','.join(map(str, self.section_ids))}
 
         empty_enrollments = [[],[],[]]
-        view = self.get_mocked_view(mock_get_enrollments, enrollment_data=empty_enrollments)
+        view = self.get_mocked_view(mock_client_class, enrollment_data=empty_enrollments)
         response = view.get(request)
         # Assert the response
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(response.data, [])
 
-    @patch('canvasapi.section.Section.get_enrollments')
-    def test_get_section_enrollments_exception(self, mock_get_enrollments):
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.AsyncCanvasClient')
+    def test_get_section_enrollments_exception(self, mock_client_class):
         request = self.request_factory.get(self.url)
         request.user = self.user
         request.query_params = {'section_ids': str(self.section_ids[0])}
 
-        view = self.get_mocked_view(mock_get_enrollments, canvasException=CanvasException('Canvas API error getting section enrollments'))
+        view = self.get_mocked_view(mock_client_class, canvasException=CanvasException('Canvas API error getting section enrollments'))
         response = view.get(request)
         # Assert the response
         expected_dict = {
@@ -144,4 +141,32 @@ class CanvasSectionEnrollmentsAPIHandlerTests(APITestCase):
             ]
         }
         self.assertEqual(response.status_code, status.HTTP_500_INTERNAL_SERVER_ERROR)
-        self.assertEqual(response.data, expected_dict)
\ No newline at end of file
+        self.assertEqual(response.data, expected_dict)
+
+    @patch('backend.ccm.canvas_api.section_enrollments_api_handler.AsyncCanvasClient')
+    def test_get_section_enrollments_fetches_sections_concurrently(self, mock_client_class):
+        request = self.request_factory.get(self.url)
+        request.user = self.user
+        request.query_params = {'section_ids': ','.join(map(str, self.section_ids))}
+
+        in_flight = {'current': 0, 'max': 0}
+        async def get_paginated(endpoint, **kwargs):
+            in_flight['current'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['current'])
+            await asyncio.sleep(0.01)
+            in_flight['current'] -= 1
+            section_id = endpoint.split('/')[1]
+            yield {'id': int(section_id), 'user': {'login_id': 'shared_student'}}
+            yield {'id': int(section_id) + 10, 'user': {'login_id': f'student_{section_id}'}}
+
+        mock_client = MagicMock()
+        mock_client.get_paginated.side_effect = get_paginated
+        mock_client_class.from_canvas.return_value.__aenter__.return_value = mock_client
+        mock_manager = MagicMock(spec=CanvasCredentialManager)
+        view = CanvasSectionEnrollmentsAPIHandler(credential_manager=mock_manager)
+
+        response = view.get(request)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(sorted(response.data), ['shared_student', 'student_1', 'student_2', 'student_3'])
+        self.assertEqual(in_flight['max'], len(self.section_ids))
@@ -86,6 +86,17 @@ interface AddEnrollmentWithSectionId extends AddSectionEnrollment {
   sectionId: number
 }
 
+// Returned when the request was enrolled right away, with the duplicate rows of the request that were skipped
+export interface InlineEnrollmentResult {
+  enrollments: CanvasEnrollment[]
+  skipped: Array<AddEnrollmentWithSectionId & { error: string }>
+}
+
+// Returned instead of the enrollments when the request was queued as a background enrollment job
+export interface EnrollmentJobSubmission {
+  job_id: number
+}
+
 export const getStudentsEnrolledInSections = async (sectionIds: number[]): Promise<string[]> => {
   const request = getGet()
   const queryParam = sectionIds.join(',')
@@ -95,7 +106,7 @@ export const getStudentsEnrolledInSections = async (sectionIds: number[]): Promi
 }
 
 export const addSectionEnrollments = async (
-  sectionId: number, enrollments: AddSectionEnrollment[]): Promise<CanvasEnrollment[]> => {
+  sectionId: number, enrollments: AddSectionEnrollment[]): Promise<InlineEnrollmentResult> => {
   const body = JSON.stringify({ users: enrollments })
   const request = getPost(body)
   const resp = await fetch(`/api/sections/${sectionId}/enroll`, request)
@@ -104,7 +115,7 @@ export const addSectionEnrollments = async (
 }
 
 export const addSingleSectionEnrollments = async (
-  courseId: number, sectionId: number, enrollments: AddSectionEnrollment[]): Promise<CanvasEnrollment[]> => {
+  courseId: number, sectionId: number, enrollments: AddSectionEnrollment[]): Promise<InlineEnrollmentResult | EnrollmentJobSubmission> => {
   const body = JSON.stringify({ users: enrollments })
   const request = getPost(body)
   const resp = await fetch(`/api/course/${courseId}/sections/${sectionId}/enroll`, request)
@@ -112,7 +123,7 @@ export const addSingleSectionEnrollments = async (
   return await resp.json()
 }
 
-export const addEnrollmentsToSections = async (courseId: number, enrollments: AddEnrollmentWithSectionId[]): Promise<CanvasEnrollment[]> => {
+export const addEnrollmentsToSections = async (courseId: number, enrollments: AddEnrollmentWithSectionId[]): Promise<InlineEnrollmentResult | EnrollmentJobSubmission> => {
   const body = JSON.stringify({ enrollments })
   const request = getPost(body)
   const resp = await fetch(`/api/course/${courseId}/sections/enroll`, request)
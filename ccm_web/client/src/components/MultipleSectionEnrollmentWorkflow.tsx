@@ -109,6 +109,7 @@ export default function MultipleSectionEnrollmentWorkflow (props: MultipleSectio
   
   const [workflowState, setWorkflowState] = useState<CSVWorkflowState>(CSVWorkflowState.Upload)
   const [file, setFile] = useState<File | undefined>(undefined)
+  const [enrollmentsQueued, setEnrollmentsQueued] = useState(true)
   const [validEnrollments, setValidEnrollments] = useState<RowNumberedAddEnrollmentWithSectionId[] | undefined>(undefined)
 
   const [schemaInvalidations, setSchemaInvalidations] = useState<SchemaInvalidation[] | undefined>(undefined)
@@ -116,9 +117,11 @@ export default function MultipleSectionEnrollmentWorkflow (props: MultipleSectio
 
   const [doAddEnrollments, isAddEnrollmentsLoading, addEnrollmentsError, clearAddEnrollmentsError] = usePromise(
     async (enrollments: AddEnrollmentWithSectionId[]) => {
-      await api.addEnrollmentsToSections(courseId,
+      const result = await api.addEnrollmentsToSections(courseId,
         enrollments.map(e => ({ loginId: e.loginId, role: e.role, sectionId: e.sectionId }))
       )
+      // Small requests are enrolled right away, larger ones are queued and reported by email
+      setEnrollmentsQueued('job_id' in result)
     },
     () => setWorkflowState(CSVWorkflowState.Confirmation)
   )
@@ -328,7 +331,9 @@ export default function MultipleSectionEnrollmentWorkflow (props: MultipleSectio
 
   const renderConfirm = (): JSX.Element => {
     const settingsLink = <Link href={props.settingsURL} target='_parent'>Canvas Settings page</Link>
-    const message = <Typography>Adding new users is currently in progress. Please check your email for confirmation of success or notification of any issues.</Typography>
+    const message = enrollmentsQueued
+      ? <Typography>Adding new users is currently in progress. Please check your email for confirmation of success or notification of any issues.</Typography>
+      : <Typography>The users were added to the course.</Typography>
     const nextAction = (
       <span>
         See the users in the course&apos;s sections on the {settingsLink} for your course.
@@ -89,6 +89,7 @@ export default function SingleSectionEnrollmentWorkflow (props: SingleSectionEnr
   const [activeStep, setActiveStep] = useState(CSVWorkflowStep.Select)
   const [selectedSection, setSelectedSection] = useState<CanvasCourseSectionWithCourseName | undefined>(undefined)
   const [file, setFile] = useState<File | undefined>(undefined)
+  const [enrollmentsQueued, setEnrollmentsQueued] = useState(true)
   const [enrollments, setEnrollments] = useState<RowNumberedAddEnrollment[] | undefined>(undefined)
   const [schemaInvalidations, setSchemaInvalidations] = useState<SchemaInvalidation[] | undefined>(undefined)
   const [rowInvalidations, setRowInvalidations] = useState<RowValidationError[] | undefined>(undefined)
@@ -96,7 +97,9 @@ export default function SingleSectionEnrollmentWorkflow (props: SingleSectionEnr
   const [doAddEnrollments, isAddEnrollmentsLoading, addEnrollmentsError, clearAddEnrollmentsError] = usePromise(
     async (section: CanvasCourseSectionWithCourseName, enrollments: RowNumberedAddEnrollment[]) => {
       const apiEnrollments = enrollments.map(e => ({ loginId: e.loginId, role: e.role }))
-      await api.addSingleSectionEnrollments(section.course_id,section.id, apiEnrollments)
+      const result = await api.addSingleSectionEnrollments(section.course_id,section.id, apiEnrollments)
+      // Small requests are enrolled right away, larger ones are queued and reported by email
+      setEnrollmentsQueued('job_id' in result)
     },
     () => { setActiveStep(CSVWorkflowStep.Confirmation) }
   )
@@ -298,7 +301,9 @@ export default function SingleSectionEnrollmentWorkflow (props: SingleSectionEnr
 
   const getSuccessContent = (): JSX.Element => {
     const settingsLink = <Link href={props.settingsURL} target='_parent'>Canvas Settings page</Link>
-    const message = <Typography>Adding new users is currently in progress. Please check your email for confirmation of success or notification of any issues.</Typography>
+    const message = enrollmentsQueued
+      ? <Typography>Adding new users is currently in progress. Please check your email for confirmation of success or notification of any issues.</Typography>
+      : <Typography>The users were added to the course.</Typography>
     const nextAction = (
       <span>
         See the users in the course&apos;s sections on the {settingsLink} for your course.
@@ -8,14 +8,21 @@ while [ ! -f /tmp/backend_ready ]; do
     sleep 2
 done
 
+# One qcluster serves the default queue and another the enrollment queue, so enrollment batches do not delay other tasks.
+# If either exits the script exits with it, stopping the other, and supervisor restarts both.
+ENROLLMENT_CLUSTER="${Q_ENROLLMENT_CLUSTER:-CCM_Enrollments}"
+trap 'kill 0' EXIT
+
 # this is to ensure that the backend/DB is fully ready before starting the qworker
 echo "qworker: Backend is ready, starting qworker..."
 if [ "$RUN_QWORKER_DEV_MODE" = "true" ]; then
     echo 'qworker: Running in DEV mode'
     rm /tmp/backend_ready
-    watchfiles --filter python 'python manage.py qcluster' /code/backend
+    watchfiles --filter python 'python manage.py qcluster' /code/backend &
+    Q_CLUSTER_NAME="$ENROLLMENT_CLUSTER" watchfiles --filter python 'python manage.py qcluster' /code/backend &
 else
     echo 'qworker: Running in PROD mode'
-    python manage.py qcluster
+    python manage.py qcluster &
+    Q_CLUSTER_NAME="$ENROLLMENT_CLUSTER" python manage.py qcluster &
 fi
-
+wait -n